@@ -1,14 +1,71 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
-from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, suppress
 import uvicorn
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
+import threading
+from datetime import timedelta
 
-from database import engine, get_db
+from database import engine, get_db, SessionLocal
 from models import Base
-from routers import users, hotels, rooms, bookings, payments
+from migrations import run_migrations
+from routers import users, hotels, rooms, bookings, payments, search, events, stream, jobs
+from utils.query_cache import query_cache
+from utils.idempotency import IdempotencyMiddleware, idempotency_store
+from utils.event_broker import event_broker
+from services.job_service import JobService, JobWorker, jobs_available
+from services.scheduler import LifecycleScheduler
+from services.outbox_service import OutboxService
+from services.worker_lease_service import WorkerIdLease
+from utils.ids import configured_worker_id
+import services.job_handlers  # noqa: F401  (đăng ký handler cho job worker trong tiến trình)
+
+
+# Chu kỳ (giây) chuyển trạng thái booking + dọn idempotency key / job cũ (0 = tắt)
+BOOKING_HOLD_SWEEP_SECONDS = float(os.getenv("BOOKING_HOLD_SWEEP_SECONDS", "60"))
+# Chạy job worker trong tiến trình API (tắt khi đã chạy riêng `python -m backend.worker`)
+JOB_WORKER_IN_PROCESS = os.getenv("JOB_WORKER_IN_PROCESS", "true").lower() == "true"
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+
+def purge_finished_jobs() -> int:
+    db = SessionLocal()
+    try:
+        return JobService(db).purge_finished(timedelta(days=JOB_RETENTION_DAYS))
+    finally:
+        db.close()
+
+
+def purge_old_events() -> int:
+    db = SessionLocal()
+    try:
+        return OutboxService(db).purge(timedelta(days=OUTBOX_RETENTION_DAYS))
+    finally:
+        db.close()
+
+
+async def sweep_booking_holds():
+    """Background loop running booking lifecycle transitions and purging idempotency keys, old jobs and events"""
+    scheduler = LifecycleScheduler(SessionLocal)
+    steps = (
+        (scheduler.run_once, "chuyển trạng thái booking"),
+        (idempotency_store.purge_expired, "dọn idempotency key"),
+        (purge_finished_jobs, "dọn job cũ"),
+        (purge_old_events, "dọn sự kiện cũ"),
+    )
+    while True:
+        await asyncio.sleep(BOOKING_HOLD_SWEEP_SECONDS)
+        # Mỗi bước bắt lỗi riêng: một bước lỗi không làm bỏ qua các bước sau
+        for step, label in steps:
+            try:
+                await run_in_threadpool(step)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi {label}: {e}")
 
 
 @asynccontextmanager
@@ -20,8 +77,17 @@ async def lifespan(app: FastAPI):
     # Tạo tất cả bảng trong database (auto-migration)
     print("📊 Tạo/cập nhật bảng database...")
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("✅ Database đã sẵn sàng!")
     
+    # Worker id cho utils.ids: ID_WORKER_ID hoặc thuê từ DB
+    lease_stop = threading.Event()
+    id_lease = None
+    if configured_worker_id() is None:
+        id_lease = WorkerIdLease(SessionLocal)
+        print(f"🔑 Worker id {id_lease.acquire()} (thuê từ DB)")
+        threading.Thread(target=id_lease.run_forever, args=(lease_stop,), name="id-worker-lease", daemon=True).start()
+    
     # Tùy chọn: Chạy seed data nếu database trống
     try:
         db = next(get_db())
@@ -39,12 +105,33 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Không thể kiểm tra/seed data: {e}")
     
+    sweeper = asyncio.create_task(sweep_booking_holds()) if BOOKING_HOLD_SWEEP_SECONDS > 0 else None
+    
+    worker_stop = threading.Event()
+    worker_thread = None
+    if JOB_WORKER_IN_PROCESS:
+        worker_thread = threading.Thread(
+            target=JobWorker(SessionLocal).run_forever, args=(worker_stop,), name="job-worker", daemon=True
+        )
+        worker_thread.start()
+    
     print("✅ Khởi động hoàn tất!")
     
     yield
     
     # Shutdown
     print("🛑 Đang tắt ứng dụng...")
+    if sweeper:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    if worker_thread:
+        worker_stop.set()
+        jobs_available.set()
+        await run_in_threadpool(worker_thread.join, 10)
+    if id_lease:
+        lease_stop.set()
+        await run_in_threadpool(id_lease.release)
 
 
 # Tạo FastAPI app với metadata tiếng Việt
@@ -141,6 +228,9 @@ async def test_cors():
 app.mount("/media", StaticFiles(directory=MEDIA_ROOT), name="media")
 
 # CORS configuration
+# Idempotency-Key cho POST/PUT/PATCH/DELETE (đặt trong CORS để phản hồi phát lại vẫn có header CORS)
+app.add_middleware(IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -186,7 +276,8 @@ async def root():
                 "hotels": "/api/v1/hotels", 
                 "rooms": "/api/v1/rooms",
                 "bookings": "/api/v1/bookings",
-                "payments": "/api/v1/payments"
+                "payments": "/api/v1/payments",
+                "search": "/api/v1/search"
             }
         }
     }
@@ -212,6 +303,8 @@ async def health_check():
         "data": {
             "api": "healthy",
             "database": db_status,
+            "query_cache": query_cache.stats(),
+            "stream_subscribers": event_broker.subscriber_count(),
             "timestamp": "2024-01-01T00:00:00Z"
         }
     }
@@ -342,6 +435,59 @@ app.include_router(
     }
 )
 
+app.include_router(
+    search.router, 
+    prefix="/api/v1/search", 
+    tags=["🔎 Tìm kiếm"],
+    responses={
+        500: {"description": "Lỗi server"}
+    }
+)
+
+# Backward compatibility endpoints (without /api/v1 prefix)
+app.include_router(
+    search.router, 
+    prefix="/search", 
+    tags=["🔎 Tìm kiếm (Legacy)"],
+    responses={
+        500: {"description": "Lỗi server"}
+    }
+)
+
+app.include_router(
+    events.router, 
+    prefix="/api/v1/events", 
+    tags=["📡 Sự kiện thay đổi"],
+    responses={
+        401: {"description": "Chưa xác thực"},
+        403: {"description": "Không có quyền truy cập"},
+        500: {"description": "Lỗi server"}
+    }
+)
+
+app.include_router(
+    stream.router, 
+    prefix="/api/v1/stream", 
+    tags=["📡 Sự kiện thay đổi"],
+    responses={
+        401: {"description": "Token không hợp lệ"},
+        404: {"description": "Không tìm thấy phòng"},
+        500: {"description": "Lỗi server"}
+    }
+)
+
+app.include_router(
+    jobs.router, 
+    prefix="/api/v1/jobs", 
+    tags=["⚙️ Job nền"],
+    responses={
+        401: {"description": "Chưa xác thực"},
+        403: {"description": "Không có quyền truy cập"},
+        404: {"description": "Không tìm thấy job"},
+        500: {"description": "Lỗi server"}
+    }
+)
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,307 @@
+"""
+Schema migrations chạy lúc khởi động, ngay sau Base.metadata.create_all.
+
+create_all chỉ tạo các bảng còn thiếu; index, cột mới và dữ liệu cần chuyển đổi
+cho bảng đã tồn tại được xử lý ở đây. Mỗi bước phải idempotent vì chạy lại
+mỗi lần ứng dụng khởi động.
+
+SCHEMA_MIGRATIONS (DDL) chạy trước, DATA_MIGRATIONS (backfill) chạy sau cùng vì
+backfill có thể dùng ORM model, vốn đã phản ánh schema mới nhất.
+"""
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from utils.fulltext import ensure_fulltext_schema
+from services.allotment_service import AllotmentService
+from services.amenity_service import AmenityService
+from utils.geo import encode as geohash_encode
+from utils.money import DEFAULT_CURRENCY, currency_exponent
+from utils.textfold import HOTEL_SEARCH_COLUMNS, ROOM_SEARCH_COLUMNS, fold
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN if missing, return True if the column was added"""
+    if _has_column(conn, table, column):
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return True
+
+
+def _create_index(conn, table: str, index: str, columns: str) -> None:
+    if not any(i["name"] == index for i in inspect(conn).get_indexes(table)):
+        conn.exec_driver_sql(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+def add_hotel_search_columns(conn) -> None:
+    """Cột gấp dấu *_search trên hotels/rooms (phải có trước khi tạo FULLTEXT/FTS)"""
+    _add_column(conn, "hotels", "name_search", "VARCHAR(255)")
+    _add_column(conn, "hotels", "city_search", "VARCHAR(100)")
+    _add_column(conn, "hotels", "country_search", "VARCHAR(100)")
+    _add_column(conn, "hotels", "address_search", "VARCHAR(500)")
+    _add_column(conn, "hotels", "description_search", "TEXT")
+    _add_column(conn, "hotels", "amenities_search", "TEXT")
+    _create_index(conn, "hotels", "ix_hotels_name_search", "name_search")
+    _create_index(conn, "hotels", "ix_hotels_city_search", "city_search")
+    _create_index(conn, "hotels", "ix_hotels_country_search", "country_search")
+    _create_index(conn, "hotels", "ix_hotels_address_search", "address_search")
+    _add_column(conn, "rooms", "description_search", "TEXT")
+    _add_column(conn, "rooms", "amenities_search", "TEXT")
+    _add_column(conn, "rooms", "bed_type_search", "VARCHAR(100)")
+
+
+def add_booking_hotel_ids(conn) -> None:
+    """Bản sao hotel_id trên bookings/payments + index (hotel_id, status, ngày)"""
+    _add_column(conn, "bookings", "hotel_id", "INTEGER REFERENCES hotels(id)")
+    _add_column(conn, "payments", "hotel_id", "INTEGER REFERENCES hotels(id)")
+    _create_index(conn, "bookings", "ix_bookings_hotel_status_check_in", "hotel_id, status, check_in_date")
+    _create_index(conn, "payments", "ix_payments_hotel_status_created", "hotel_id, payment_status, created_at")
+
+
+def _rebuild_sqlite_table(conn, table: str, transform) -> None:
+    """
+    SQLite không có ALTER COLUMN: tạo bảng mới từ CREATE TABLE đã sửa bằng ``transform``,
+    chép dữ liệu, xóa bảng cũ, đổi tên rồi tạo lại index (quy trình chuẩn của SQLite).
+    """
+    create_sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).scalar()
+    index_sqls = [row[0] for row in conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    )]
+    new_sql = transform(create_sql)
+    new_sql = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f"CREATE TABLE {table}_rebuild", new_sql, count=1)
+    conn.exec_driver_sql(new_sql)
+    conn.exec_driver_sql(f"INSERT INTO {table}_rebuild SELECT * FROM {table}")
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    for index_sql in index_sqls:
+        conn.exec_driver_sql(index_sql)
+
+
+def add_booking_room_types(conn) -> None:
+    """Booking theo loại phòng: room_type + room_id cho phép NULL (bảng room_allotments do create_all tạo)"""
+    _add_column(conn, "bookings", "room_type", "VARCHAR(8)")
+    room_id = next(c for c in inspect(conn).get_columns("bookings") if c["name"] == "room_id")
+    if room_id["nullable"]:
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text("ALTER TABLE bookings MODIFY room_id INTEGER NULL"))
+    elif conn.dialect.name == "sqlite":
+        _rebuild_sqlite_table(conn, "bookings", lambda sql: re.sub(
+            r"(\broom_id\s+INTEGER)\s+NOT NULL", r"\1", sql, count=1, flags=re.IGNORECASE
+        ))
+
+
+def add_booking_hold_deadlines(conn) -> None:
+    """Hạn giữ chỗ của booking PENDING + index (status, expires_at) cho sweeper"""
+    _add_column(conn, "bookings", "expires_at", "DATETIME")
+    _create_index(conn, "bookings", "ix_bookings_status_expires_at", "status, expires_at")
+
+
+def add_booking_group_references(conn) -> None:
+    """Mã nhóm cho các booking tạo cùng một lần đặt nhiều phòng"""
+    _add_column(conn, "bookings", "group_reference", "VARCHAR(50)")
+    _create_index(conn, "bookings", "ix_bookings_group_reference", "group_reference")
+
+
+def add_booking_status_check_out_index(conn) -> None:
+    """Index cho scheduler chuyển booking đã trả phòng sang COMPLETED"""
+    _create_index(conn, "bookings", "ix_bookings_status_check_out", "status, check_out_date")
+
+
+def widen_payment_status_enum(conn) -> None:
+    """Thêm CANCELLED vào ENUM payment_status (MySQL), giữ NOT NULL DEFAULT 'PENDING'"""
+    if conn.dialect.name != "mysql":
+        return
+    column = next(c for c in inspect(conn).get_columns("payments") if c["name"] == "payment_status")
+    if "CANCELLED" in getattr(column["type"], "enums", ()) and not column["nullable"]:
+        return
+    conn.execute(text("UPDATE payments SET payment_status = 'PENDING' WHERE payment_status IS NULL"))
+    conn.execute(text(
+        "ALTER TABLE payments MODIFY payment_status "
+        "ENUM('PENDING','COMPLETED','FAILED','REFUNDED','CANCELLED') NOT NULL DEFAULT 'PENDING'"
+    ))
+
+
+def convert_money_to_minor_units(conn) -> None:
+    """
+    Tiền FLOAT -> BIGINT đơn vị nhỏ nhất + currency trên bookings/payments.
+    Dữ liệu cũ được coi là DEFAULT_CURRENCY; số dư tính lại từ payments rồi bỏ cột FLOAT.
+    """
+    factor = 10 ** currency_exponent(DEFAULT_CURRENCY)
+    _add_column(conn, "bookings", "currency", f"VARCHAR(3) NOT NULL DEFAULT '{DEFAULT_CURRENCY}'")
+    if _add_column(conn, "bookings", "total_price_minor", "BIGINT NOT NULL DEFAULT 0") \
+            and _has_column(conn, "bookings", "total_price"):
+        conn.execute(text(f"UPDATE bookings SET total_price_minor = ROUND(total_price * {factor})"))
+    if _add_column(conn, "payments", "amount_minor", "BIGINT NOT NULL DEFAULT 0") \
+            and _has_column(conn, "payments", "amount"):
+        conn.execute(text(f"UPDATE payments SET amount_minor = ROUND(amount * {factor})"))
+        conn.execute(text(
+            "UPDATE payments SET currency = (SELECT currency FROM bookings WHERE bookings.id = payments.booking_id)"
+        ))
+    added = _add_column(conn, "bookings", "amount_paid_minor", "BIGINT NOT NULL DEFAULT 0")
+    added = _add_column(conn, "bookings", "amount_pending_minor", "BIGINT NOT NULL DEFAULT 0") or added
+    if added:
+        conn.execute(text(
+            "UPDATE bookings SET "
+            "amount_paid_minor = COALESCE((SELECT SUM(amount_minor) FROM payments "
+            "WHERE payments.booking_id = bookings.id AND payment_status = 'COMPLETED'), 0), "
+            "amount_pending_minor = COALESCE((SELECT SUM(amount_minor) FROM payments "
+            "WHERE payments.booking_id = bookings.id AND payment_status = 'PENDING'), 0)"
+        ))
+    for table, column in (("bookings", "total_price"), ("bookings", "amount_paid"),
+                          ("bookings", "amount_pending"), ("payments", "amount")):
+        if _has_column(conn, table, column):
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+
+def convert_room_rates_to_minor_units(conn) -> None:
+    """Giá theo ngày FLOAT -> BIGINT đơn vị nhỏ nhất (DEFAULT_CURRENCY) trên room_rates"""
+    factor = 10 ** currency_exponent(DEFAULT_CURRENCY)
+    if _add_column(conn, "room_rates", "price_minor", "BIGINT NOT NULL DEFAULT 0") \
+            and _has_column(conn, "room_rates", "price"):
+        conn.execute(text(f"UPDATE room_rates SET price_minor = ROUND(price * {factor})"))
+    if _has_column(conn, "room_rates", "price"):
+        conn.exec_driver_sql("ALTER TABLE room_rates DROP COLUMN price")
+
+
+def add_fulltext_indexes(conn) -> None:
+    """FULLTEXT index / FTS5 cho tìm kiếm khách sạn và phòng"""
+    ensure_fulltext_schema(conn)
+
+
+def add_amenity_masks(conn) -> None:
+    """Cột amenity_mask trên hotels và rooms"""
+    _add_column(conn, "hotels", "amenity_mask", "BIGINT NOT NULL DEFAULT 0")
+    _add_column(conn, "rooms", "amenity_mask", "BIGINT NOT NULL DEFAULT 0")
+
+
+def add_hotel_coordinates(conn) -> None:
+    """Tọa độ + geohash có index cho tìm khách sạn lân cận"""
+    _add_column(conn, "hotels", "latitude", "FLOAT")
+    _add_column(conn, "hotels", "longitude", "FLOAT")
+    _add_column(conn, "hotels", "geohash", "VARCHAR(12)")
+    _create_index(conn, "hotels", "ix_hotels_geohash", "geohash")
+
+
+def add_job_results(conn) -> None:
+    """Kết quả (JSON) của job, đọc qua GET /api/v1/jobs/{id}"""
+    _add_column(conn, "jobs", "result", "TEXT")
+
+
+def add_idempotency_heartbeats(conn) -> None:
+    """Heartbeat của request đầu đang chạy (key không bị lấy lại khi request chạy lâu)"""
+    _add_column(conn, "idempotency_keys", "locked_at", "DATETIME")
+
+
+def backfill_amenities(conn) -> None:
+    """Parse chuỗi amenities cũ vào catalog + amenity_mask"""
+    db = Session(bind=conn)
+    try:
+        updated = AmenityService(db).backfill()
+        if updated:
+            print(f"🏷️ Đã chuẩn hóa tiện nghi cho {updated} khách sạn/phòng")
+    finally:
+        db.close()
+
+
+def backfill_geohash(conn) -> None:
+    """Tính geohash cho khách sạn đã có tọa độ"""
+    rows = conn.execute(text(
+        "SELECT id, latitude, longitude FROM hotels "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND geohash IS NULL"
+    )).all()
+    for hotel_id, latitude, longitude in rows:
+        conn.execute(
+            text("UPDATE hotels SET geohash = :geohash WHERE id = :id"),
+            {"geohash": geohash_encode(latitude, longitude), "id": hotel_id}
+        )
+
+
+def _backfill_search_columns(conn, table: str, search_columns: dict) -> None:
+    columns = list(search_columns)
+    missing = " OR ".join(f"({c} IS NOT NULL AND {search_columns[c]} IS NULL)" for c in columns)
+    rows = conn.execute(text(
+        f"SELECT id, {', '.join(columns)} FROM {table} WHERE {missing}"
+    )).all()
+    assignments = ", ".join(f"{search_columns[c]} = :{c}" for c in columns)
+    for row in rows:
+        params = {c: fold(v) if v is not None else None for c, v in zip(columns, row[1:])}
+        params["id"] = row[0]
+        conn.execute(text(f"UPDATE {table} SET {assignments} WHERE id = :id"), params)
+
+
+def backfill_hotel_search_columns(conn) -> None:
+    """Tính các cột *_search cho khách sạn/phòng tạo trước khi có cột"""
+    _backfill_search_columns(conn, "hotels", HOTEL_SEARCH_COLUMNS)
+    _backfill_search_columns(conn, "rooms", ROOM_SEARCH_COLUMNS)
+
+
+def backfill_booking_hotel_ids(conn) -> None:
+    """Điền hotel_id cho bookings/payments cũ từ rooms"""
+    conn.execute(text(
+        "UPDATE bookings SET hotel_id = "
+        "(SELECT rooms.hotel_id FROM rooms WHERE rooms.id = bookings.room_id) "
+        "WHERE hotel_id IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE payments SET hotel_id = "
+        "(SELECT bookings.hotel_id FROM bookings WHERE bookings.id = payments.booking_id) "
+        "WHERE hotel_id IS NULL"
+    ))
+
+
+def backfill_booking_room_types(conn) -> None:
+    """room_type cho booking theo phòng cũ, rồi đếm lại sold của allotment (mọi booking đều giữ allotment)"""
+    updated = conn.execute(text(
+        "UPDATE bookings SET room_type = "
+        "(SELECT rooms.room_type FROM rooms WHERE rooms.id = bookings.room_id) "
+        "WHERE room_type IS NULL AND room_id IS NOT NULL"
+    )).rowcount
+    if not updated:
+        return
+    db = Session(bind=conn)
+    try:
+        AllotmentService(db).recount()
+    finally:
+        db.close()
+
+
+SCHEMA_MIGRATIONS = [
+    add_hotel_search_columns,
+    add_fulltext_indexes,
+    add_amenity_masks,
+    add_hotel_coordinates,
+    add_booking_hotel_ids,
+    add_booking_room_types,
+    add_booking_hold_deadlines,
+    add_booking_group_references,
+    add_booking_status_check_out_index,
+    widen_payment_status_enum,
+    convert_money_to_minor_units,
+    convert_room_rates_to_minor_units,
+    add_job_results,
+    add_idempotency_heartbeats,
+]
+
+DATA_MIGRATIONS = [
+    backfill_amenities,
+    backfill_geohash,
+    backfill_hotel_search_columns,
+    backfill_booking_hotel_ids,
+    backfill_booking_room_types,
+]
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply every migration step in order, each in its own transaction."""
+    for step in SCHEMA_MIGRATIONS + DATA_MIGRATIONS:
+        with engine.begin() as conn:
+            step(conn)
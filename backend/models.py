@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, Boolean, Text, LargeBinary, ForeignKey, Enum, Table, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 
+from utils.money import DEFAULT_CURRENCY, to_major
+
 Base = declarative_base()
 
 
@@ -31,6 +33,7 @@ class PaymentStatus(enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     REFUNDED = "refunded"
+    CANCELLED = "cancelled"
 
 
 class PaymentMethod(enum.Enum):
@@ -41,6 +44,45 @@ class PaymentMethod(enum.Enum):
     MOMO = "momo"
 
 
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class WebhookEventStatus(enum.Enum):
+    RECEIVED = "received"
+    PROCESSED = "processed"
+    IGNORED = "ignored"
+
+
+class Amenity(Base):
+    """Normalized amenity catalog"""
+    __tablename__ = "amenities"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    code = Column(String(255), unique=True, index=True, nullable=False)  # Normalized lookup key
+    bit = Column(Integer, unique=True)  # Bit position in amenity_mask (0-62), NULL when the mask is full
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+hotel_amenities = Table(
+    "hotel_amenities",
+    Base.metadata,
+    Column("hotel_id", Integer, ForeignKey("hotels.id", ondelete="CASCADE"), primary_key=True),
+    Column("amenity_id", Integer, ForeignKey("amenities.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+room_amenities = Table(
+    "room_amenities",
+    Base.metadata,
+    Column("room_id", Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True),
+    Column("amenity_id", Integer, ForeignKey("amenities.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
 class Hotel(Base):
     """Hotel information table"""
     __tablename__ = "hotels"
@@ -55,12 +97,24 @@ class Hotel(Base):
     email = Column(String(255))
     website = Column(String(255))
     star_rating = Column(Integer, default=3)  # 1-5 stars
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String(12), index=True)  # Computed from latitude/longitude
     amenities = Column(Text)  # JSON string of amenities
+    amenity_mask = Column(BigInteger, nullable=False, default=0, server_default="0")  # Bitmask of Amenity.bit
+    # Accent-folded, lowercased copies for search (utils.textfold)
+    name_search = Column(String(255), index=True)
+    city_search = Column(String(100), index=True)
+    country_search = Column(String(100), index=True)
+    address_search = Column(String(500), index=True)
+    description_search = Column(Text)
+    amenities_search = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     rooms = relationship("Room", back_populates="hotel")
+    amenity_items = relationship("Amenity", secondary="hotel_amenities")
 
 
 class User(Base):
@@ -95,15 +149,64 @@ class Room(Base):
     price_per_night = Column(Float, nullable=False)
     description = Column(Text)
     amenities = Column(Text)  # JSON string of room amenities
+    amenity_mask = Column(BigInteger, nullable=False, default=0, server_default="0")  # Bitmask of Amenity.bit
     is_available = Column(Boolean, default=True)
     area_sqm = Column(Float)  # Room area in square meters
     bed_type = Column(String(100))  # King, Queen, Twin, etc.
+    # Accent-folded, lowercased copies for search (utils.textfold)
+    description_search = Column(Text)
+    amenities_search = Column(Text)
+    bed_type_search = Column(String(100))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     hotel = relationship("Hotel", back_populates="rooms")
     bookings = relationship("Booking", back_populates="room")
+    amenity_items = relationship("Amenity", secondary="room_amenities")
+    rates = relationship("RoomRate", back_populates="room", cascade="all, delete-orphan")
+
+
+class RoomRate(Base):
+    """Per-date price overrides of a room (falls back to Room.price_per_night)"""
+    __tablename__ = "room_rates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    price_minor = Column(BigInteger, nullable=False)  # Minor units of DEFAULT_CURRENCY
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    room = relationship("Room", back_populates="rates")
+
+    __table_args__ = (
+        UniqueConstraint("room_id", "date", name="uq_room_rates_room_date"),
+    )
+
+    # Major-unit view for API schemas
+    @property
+    def price(self) -> float:
+        return float(to_major(self.price_minor, DEFAULT_CURRENCY))
+
+
+class RoomAllotment(Base):
+    """Sellable / sold room count per hotel, room type and night"""
+    __tablename__ = "room_allotments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    hotel_id = Column(Integer, ForeignKey("hotels.id", ondelete="CASCADE"), nullable=False)
+    room_type = Column(Enum(RoomType), nullable=False)
+    date = Column(Date, nullable=False)
+    total = Column(Integer, nullable=False, default=0)  # Sellable rooms that night
+    sold = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("hotel_id", "room_type", "date", name="uq_room_allotments_hotel_type_date"),
+    )
 
 
 class Booking(Base):
@@ -112,15 +215,24 @@ class Booking(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    room_id = Column(Integer, ForeignKey("rooms.id"))  # NULL until a room is assigned (room-type bookings)
+    hotel_id = Column(Integer, ForeignKey("hotels.id"))  # Copy of room.hotel_id for hotel-scoped queries
+    room_type = Column(Enum(RoomType))  # Room type whose allotment the booking holds (every booking)
     check_in_date = Column(DateTime, nullable=False)
     check_out_date = Column(DateTime, nullable=False)
     total_nights = Column(Integer, nullable=False)
-    total_price = Column(Float, nullable=False)
+    # Tiền lưu bằng số nguyên đơn vị nhỏ nhất của currency (utils.money), không dùng FLOAT
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    total_price_minor = Column(BigInteger, nullable=False)
+    # Số dư thanh toán, cập nhật cùng transaction với mỗi lần đổi trạng thái payment
+    amount_paid_minor = Column(BigInteger, nullable=False, default=0, server_default="0")  # Sum of COMPLETED payments
+    amount_pending_minor = Column(BigInteger, nullable=False, default=0, server_default="0")  # Sum of PENDING payments
     status = Column(Enum(BookingStatus), default=BookingStatus.PENDING)
+    expires_at = Column(DateTime)  # Hold deadline of a PENDING booking (UTC); NULL = no deadline
     guest_count = Column(Integer, nullable=False, default=1)
     special_requests = Column(Text)
     booking_reference = Column(String(50), unique=True, index=True)
+    group_reference = Column(String(50), index=True)  # Shared by the bookings of one group booking
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -129,6 +241,25 @@ class Booking(Base):
     room = relationship("Room", back_populates="bookings")
     payments = relationship("Payment", back_populates="booking")
 
+    __table_args__ = (
+        Index("ix_bookings_hotel_status_check_in", "hotel_id", "status", "check_in_date"),
+        Index("ix_bookings_status_expires_at", "status", "expires_at"),
+        Index("ix_bookings_status_check_out", "status", "check_out_date"),
+    )
+
+    # Major-unit views for API schemas
+    @property
+    def total_price(self) -> float:
+        return float(to_major(self.total_price_minor or 0, self.currency or DEFAULT_CURRENCY))
+
+    @property
+    def amount_paid(self) -> float:
+        return float(to_major(self.amount_paid_minor or 0, self.currency or DEFAULT_CURRENCY))
+
+    @property
+    def amount_pending(self) -> float:
+        return float(to_major(self.amount_pending_minor or 0, self.currency or DEFAULT_CURRENCY))
+
 
 class Payment(Base):
     """Payment transactions table"""
@@ -136,15 +267,118 @@ class Payment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=False)
-    amount = Column(Float, nullable=False)
+    hotel_id = Column(Integer, ForeignKey("hotels.id"))  # Copy of booking.hotel_id for hotel-scoped queries
+    amount_minor = Column(BigInteger, nullable=False)  # Minor units of ``currency`` (= booking.currency)
     payment_method = Column(Enum(PaymentMethod), nullable=False)
-    payment_status = Column(Enum(PaymentStatus), default=PaymentStatus.PENDING)
+    payment_status = Column(Enum(PaymentStatus), nullable=False, default=PaymentStatus.PENDING, server_default="PENDING")
     transaction_id = Column(String(255), unique=True)
     payment_date = Column(DateTime)
-    currency = Column(String(3), default="USD")
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
     notes = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    booking = relationship("Booking", back_populates="payments") 
\ No newline at end of file
+    booking = relationship("Booking", back_populates="payments")
+
+    __table_args__ = (
+        Index("ix_payments_hotel_status_created", "hotel_id", "payment_status", "created_at"),
+    )
+
+    @property
+    def amount(self) -> float:
+        return float(to_major(self.amount_minor or 0, self.currency or DEFAULT_CURRENCY))
+
+
+class PaymentWebhookEvent(Base):
+    """Payment gateway webhook events, stored on receipt and applied in batches by a job"""
+    __tablename__ = "payment_webhook_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    gateway = Column(String(50), nullable=False)
+    event_id = Column(String(100), nullable=False)  # Gateway's id; duplicates of a delivery are dropped
+    event_type = Column(String(50), nullable=False)  # payment.succeeded | payment.failed
+    transaction_id = Column(String(255))
+    payload = Column(Text, nullable=False)  # JSON (normalized event)
+    status = Column(Enum(WebhookEventStatus), nullable=False, default=WebhookEventStatus.RECEIVED)
+    error = Column(Text)  # Why an event was ignored
+    created_at = Column(DateTime, nullable=False)  # UTC
+    processed_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("gateway", "event_id", name="uq_payment_webhook_events_gateway_event"),
+        Index("ix_payment_webhook_events_status_id", "status", "id"),
+    )
+
+
+class IdempotencyKey(Base):
+    """Responses of mutating requests sent with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+
+    key_hash = Column(String(64), primary_key=True)  # sha256(user, key)
+    request_hash = Column(String(64), nullable=False)  # sha256(method, path, query, body)
+    status_code = Column(Integer)  # NULL while the first request is still running
+    content_type = Column(String(100))
+    response_body = Column(LargeBinary(16 * 1024 * 1024 - 1))
+    created_at = Column(DateTime, nullable=False)  # UTC
+    locked_at = Column(DateTime)  # UTC; heartbeat of the first request while it is still running
+    expires_at = Column(DateTime, nullable=False, index=True)  # UTC
+
+
+class Job(Base):
+    """Background jobs run by the job worker after the request has committed"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False)  # UTC; not before this time (backoff)
+    locked_by = Column(String(100))
+    locked_at = Column(DateTime)  # UTC; a RUNNING job whose lease expired is run again
+    last_error = Column(Text)
+    result = Column(Text)  # JSON returned by the handler (vd. link ảnh đã lên Drive)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+
+class OutboxEvent(Base):
+    """Change events of bookings, rooms and payments, written in the transaction that made the change"""
+    __tablename__ = "outbox_events"
+
+    # Sequence of the change feed (GET /api/v1/events?after=)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity_type = Column(String(20), nullable=False)  # booking | room | payment
+    entity_id = Column(Integer, nullable=False)
+    event_type = Column(String(50), nullable=False)  # <entity_type>.created | .updated | .deleted
+    hotel_id = Column(Integer)
+    payload = Column(Text, nullable=False)  # JSON snapshot of the entity after the change
+    created_at = Column(DateTime, nullable=False)  # UTC
+
+    __table_args__ = (
+        Index("ix_outbox_events_created_at", "created_at"),
+        {"sqlite_autoincrement": True},  # id không bị dùng lại sau khi dọn sự kiện cũ
+    )
+
+
+class OutboxGap(Base):
+    """Gaps in the outbox_events id sequence and when a feed reader first saw them (shared by every process)"""
+    __tablename__ = "outbox_gaps"
+
+    first_missing_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False)
+    first_seen_at = Column(DateTime, nullable=False)  # UTC
+
+
+class IdWorkerLease(Base):
+    """Worker ids (utils.ids) leased by running processes so no two generate IDs with the same one"""
+    __tablename__ = "id_worker_leases"
+
+    worker_id = Column(Integer, primary_key=True, autoincrement=False)  # 0..MAX_WORKER_ID
+    owner = Column(String(100), nullable=False)  # host:pid:random of the holding process
+    renewed_at = Column(DateTime, nullable=False)  # UTC; lease is free again after ID_WORKER_LEASE_SECONDS
@@ -3,22 +3,21 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from typing import List, Optional
 from datetime import datetime, timedelta, date
-import uuid
-import string
-import random
 
 from database import get_db
 from models import Booking, User, Room, BookingStatus
-from schemas import BookingCreate, BookingResponse, BookingUpdate, BookingSearchFilters, PaymentResponse
+from schemas import BookingCreate, BookingResponse, BookingUpdate, BookingSearchFilters, PaymentResponse, BookingByTypeCreate, BookingAssignRoom, BookingGroupCreate, BookingGroupResponse
 from auth import get_current_active_user, get_current_admin_user, get_current_user
 from services.booking_service import BookingService
+from utils.ids import new_id
+from utils.money import to_major
 
 router = APIRouter()
 
 
 def generate_booking_reference() -> str:
-    """Generate a unique booking reference"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    """Generate a unique, time-ordered booking reference (13 ký tự Crockford base32)"""
+    return new_id()
 
 
 def calculate_total_nights(check_in: datetime, check_out: datetime) -> int:
@@ -116,7 +115,7 @@ async def get_booking(
     return {"code": 200, "message": "Thành công", "data": BookingResponse.model_validate(booking)}
 
 
-@router.put("/{booking_id}", response_model=BookingResponse)
+@router.put("/{booking_id}")
 async def update_booking(
     booking_id: int,
     booking_data: BookingUpdate,
@@ -145,6 +144,21 @@ async def cancel_booking(
     return {"code": 200, "message": "Hủy booking thành công", "data": BookingResponse.model_validate(booking)}
 
 
+@router.post("/{booking_id}/assign-room")
+async def assign_booking_room(
+    booking_id: int,
+    assign_data: BookingAssignRoom,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Gán phòng cụ thể cho booking đặt theo loại phòng (chỉ admin)
+    """
+    service = BookingService(db)
+    booking = service.assign_room(booking_id, assign_data.room_id, current_user)
+    return {"code": 200, "message": "Gán phòng thành công", "data": BookingResponse.model_validate(booking)}
+
+
 @router.post("/{booking_id}/confirm")
 async def confirm_booking(
     booking_id: int,
@@ -268,4 +282,37 @@ async def create_booking(
     
     service = BookingService(db)
     booking = service.create_booking(booking_create_data, current_user)
-    return {"code": 201, "message": "Tạo booking thành công", "data": BookingResponse.model_validate(booking)} 
\ No newline at end of file
+    return {"code": 201, "message": "Tạo booking thành công", "data": BookingResponse.model_validate(booking)} 
+
+
+@router.post("/by-type", status_code=status.HTTP_201_CREATED)
+async def create_booking_by_type(
+    booking_data: BookingByTypeCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Đặt phòng theo loại phòng (trừ quỹ phòng, phòng cụ thể được gán sau)
+    """
+    service = BookingService(db)
+    booking = service.create_booking_by_type(booking_data, current_user)
+    return {"code": 201, "message": "Tạo booking thành công", "data": BookingResponse.model_validate(booking)}
+
+
+@router.post("/group", status_code=status.HTTP_201_CREATED)
+async def create_group_booking(
+    group_data: BookingGroupCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Đặt nhiều phòng cùng ngày trong một lần (tất cả hoặc không phòng nào)
+    """
+    service = BookingService(db)
+    bookings = service.create_group_booking(group_data, current_user)
+    data = BookingGroupResponse(
+        group_reference=bookings[0].group_reference,
+        total_price=float(to_major(sum(booking.total_price_minor for booking in bookings), bookings[0].currency)),
+        bookings=[BookingResponse.model_validate(booking) for booking in bookings]
+    )
+    return {"code": 201, "message": "Đặt phòng theo nhóm thành công", "data": data}
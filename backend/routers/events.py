@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+
+from database import get_db
+from models import User
+from auth import get_current_admin_user
+from services import outbox_service
+from services.outbox_service import OutboxService, OUTBOX_POLL_SECONDS, wait_for_events
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_events(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0, description="Sequence của sự kiện cuối đã nhận (bỏ trống = chỉ lấy vị trí hiện tại)"),
+    limit: int = Query(100, ge=1, le=1000, description="Số sự kiện tối đa"),
+    timeout: float = Query(25, ge=0, le=60, description="Số giây chờ sự kiện mới (long-poll)"),
+    entity_type: Optional[str] = Query(None, pattern="^(booking|room|payment)$", description="Lọc theo loại đối tượng"),
+    hotel_id: Optional[int] = Query(None, description="Lọc theo khách sạn"),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Change feed của bookings, rooms, payments (chỉ admin).
+    Trả về các sự kiện có id > after; nếu chưa có thì giữ request tới ``timeout`` giây.
+    Gọi lại với ``after = data.last_id``.
+    """
+    service = OutboxService(db)
+    if after is None:
+        last_id = await run_in_threadpool(service.last_id)
+        return {"code": 200, "message": "Thành công", "data": {"events": [], "last_id": last_id}}
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    cursor = after
+    while True:
+        version = outbox_service.outbox_version
+        events, cursor = await run_in_threadpool(service.read, cursor, limit, entity_type, hotel_id)
+        remaining = deadline - loop.time()
+        if events or remaining <= 0 or await request.is_disconnected():
+            break
+        await wait_for_events(version, min(remaining, OUTBOX_POLL_SECONDS))
+    
+    return {"code": 200, "message": "Thành công", "data": {"events": events, "last_id": cursor}}
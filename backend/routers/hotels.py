@@ -1,23 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import date
 from pathlib import Path
 import os, uuid, datetime
 
 from database import get_db
-from models import User
-from schemas import HotelCreate, HotelUpdate, HotelResponse, RoomResponse, HotelListResponse, HotelDetailResponse, RoomListResponse
+from models import User, RoomType
+from schemas import HotelCreate, HotelUpdate, HotelResponse, HotelNearbyResponse, RoomResponse, HotelListResponse, HotelDetailResponse, RoomListResponse, RoomAllotmentUpdate, RoomAllotmentResponse, RoomTypeAvailability
 from auth import get_current_user
 from services.hotel_service import HotelService
-from utils.gdrive import ensure_folder, upload_bytes, get_or_create_root
+from services.allotment_service import AllotmentService
+from services.job_handlers import enqueue_image_upload
+from utils.query_cache import query_cache
 
 router = APIRouter()
 
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")  # still keep for legacy but not used for hotel upload
 
-# Determine parent folder ID for hotels
-GDRIVE_PARENT_HOTELS = os.getenv("GDRIVE_PARENT_HOTELS") or get_or_create_root("Hotels")
-
 # --- Upload helpers ---
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
@@ -70,16 +70,60 @@ async def get_hotels(
     """
     Lấy danh sách khách sạn với bộ lọc
     """
+    cache_key = query_cache.make_key("hotels", {
+        "skip": skip, "limit": limit, "city": city, "country": country,
+        "min_rating": min_rating, "search": search
+    })
+    data = query_cache.get(cache_key)
+    if data is None:
+        service = HotelService(db)
+        hotels = service.get_hotels(
+            skip=skip,
+            limit=limit,
+            city=city,
+            country=country,
+            min_rating=min_rating,
+            search=search
+        )
+        data = [HotelResponse.model_validate(hotel) for hotel in hotels]
+        query_cache.set(cache_key, data, tags={"hotels"} | {f"hotel:{hotel.id}" for hotel in hotels})
+    return {"code": 200, "message": "Thành công", "data": data}
+
+@router.get("/nearby")
+async def get_nearby_hotels(
+    lat: float = Query(..., ge=-90, le=90, description="Vĩ độ"),
+    lon: float = Query(..., ge=-180, le=180, description="Kinh độ"),
+    radius: float = Query(5, gt=0, le=500, description="Bán kính (km)"),
+    check_in_date: Optional[date] = Query(None, description="Chỉ khách sạn còn phòng từ ngày"),
+    check_out_date: Optional[date] = Query(None, description="Chỉ khách sạn còn phòng đến ngày"),
+    guests: Optional[int] = Query(None, ge=1, description="Số lượng khách"),
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Tìm khách sạn gần một vị trí, sắp xếp theo khoảng cách
+    """
     service = HotelService(db)
-    hotels = service.get_hotels(
-        skip=skip,
-        limit=limit,
-        city=city,
-        country=country,
-        min_rating=min_rating,
-        search=search
+    results = service.get_nearby_hotels(
+        latitude=lat,
+        longitude=lon,
+        radius_km=radius,
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        guests=guests,
+        limit=limit
     )
-    return {"code": 200, "message": "Thành công", "data": [HotelResponse.model_validate(hotel) for hotel in hotels]}
+    return {
+        "code": 200,
+        "message": "Thành công",
+        "data": [
+            HotelNearbyResponse(
+                **HotelResponse.model_validate(hotel).model_dump(),
+                distance_km=round(distance, 3)
+            )
+            for hotel, distance in results
+        ]
+    }
 
 @router.get("/{hotel_id}", response_model=HotelDetailResponse)
 async def get_hotel(
@@ -167,6 +211,64 @@ async def get_hotel_stats(
     stats = service.get_hotel_stats(hotel_id)
     return {"code": 200, "message": "Thành công", "data": stats}
 
+@router.get("/{hotel_id}/allotments")
+async def get_hotel_allotments(
+    hotel_id: int,
+    start_date: date = Query(..., description="Từ ngày"),
+    end_date: date = Query(..., description="Đến ngày (bao gồm)"),
+    room_type: Optional[RoomType] = Query(None, description="Loại phòng"),
+    db: Session = Depends(get_db)
+):
+    """
+    Quỹ phòng theo loại phòng và theo đêm
+    """
+    rows = AllotmentService(db).get_allotments(hotel_id, start_date, end_date, room_type)
+    data = [
+        RoomAllotmentResponse(
+            hotel_id=row.hotel_id,
+            room_type=row.room_type,
+            date=row.date,
+            total=row.total,
+            sold=row.sold,
+            remaining=max(row.total - row.sold, 0)
+        )
+        for row in rows
+    ]
+    return {"code": 200, "message": "Thành công", "data": data}
+
+@router.put("/{hotel_id}/allotments")
+async def set_hotel_allotments(
+    hotel_id: int,
+    allotment_data: RoomAllotmentUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mở bán quỹ phòng của một loại phòng cho mọi đêm trong khoảng (chỉ admin)
+    """
+    updated = AllotmentService(db).set_allotment(
+        hotel_id,
+        allotment_data.room_type,
+        allotment_data.start_date,
+        allotment_data.end_date,
+        allotment_data.total,
+        current_user
+    )
+    return {"code": 200, "message": "Cập nhật quỹ phòng thành công", "data": {"updated_dates": updated}}
+
+@router.get("/{hotel_id}/availability")
+async def get_hotel_availability(
+    hotel_id: int,
+    check_in_date: date = Query(..., description="Ngày check-in"),
+    check_out_date: date = Query(..., description="Ngày check-out"),
+    db: Session = Depends(get_db)
+):
+    """
+    Số phòng còn bán được theo loại phòng cho cả kỳ lưu trú
+    """
+    availability = AllotmentService(db).get_availability(hotel_id, check_in_date, check_out_date)
+    return {"code": 200, "message": "Thành công", "data": [RoomTypeAvailability(**row) for row in availability]}
+
 @router.get("/stats/overview")
 async def get_hotels_overview(
     current_user: User = Depends(get_current_user),
@@ -198,39 +300,26 @@ async def search_hotels(
     return {"code": 200, "message": "Thành công", "data": [HotelResponse.model_validate(hotel) for hotel in hotels]}
 
 # ------------------  Upload images for hotel ------------------
-@router.post("/{hotel_id}/upload-images", status_code=status.HTTP_201_CREATED)
+@router.post("/{hotel_id}/upload-images", status_code=status.HTTP_202_ACCEPTED)
 async def upload_hotel_images(
     hotel_id: int,
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """Tải nhiều ảnh cho khách sạn (chỉ admin)"""
+    """Tải nhiều ảnh cho khách sạn (chỉ admin); ảnh được đẩy lên Google Drive bởi job worker, theo dõi qua status_url"""
     if current_user.role.value != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Chỉ admin mới có quyền upload ảnh")
 
     print(f"🔄 Uploading images for hotel {hotel_id}")
     print(f"📁 Files received: {len(files)}")
     
-    saved_urls = []
-    ts = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
-
-    # Get / create subfolder in Drive for this hotel
-    drive_folder = ensure_folder(str(hotel_id), GDRIVE_PARENT_HOTELS)
-
-    for i, file in enumerate(files):
-        ext = Path(file.filename).suffix or ""
-        filename = f"{ts}_{uuid.uuid4().hex}{ext}"
+    queued = []
+    for file in files:
         content = await file.read()
         if len(content) == 0:
             continue
+        queued.append(enqueue_image_upload(db, "hotels", hotel_id, file.filename, content))
 
-        try:
-            file_id, link = upload_bytes(content, filename, drive_folder)
-            print(f"✅ Uploaded to Drive id={file_id}")
-            saved_urls.append(link)
-        except Exception as e:
-            print(f"❌ Drive upload error: {e}")
-            raise HTTPException(status_code=500, detail="Lỗi khi upload Google Drive")
-
-    print(f"🎉 Upload completed: {len(saved_urls)} files")
-    return {"code": 201, "message": "Upload ảnh thành công", "data": saved_urls} 
\ No newline at end of file
+    print(f"🎉 Queued {len(queued)} files for Drive upload")
+    return {"code": 202, "message": "Đã nhận ảnh, đang tải lên Google Drive", "data": queued}
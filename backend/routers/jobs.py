@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from auth import get_current_admin_user
+from schemas import JobResponse
+from services.job_service import JobService
+
+router = APIRouter()
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: int,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Trạng thái job nền (chỉ admin), vd. upload ảnh: khi status = done,
+    ``result.link`` là link Drive cố định của ảnh.
+    """
+    job = JobService(db).get_status(job_id)
+    return {"code": 200, "message": "Thành công", "data": JobResponse(**job)}
@@ -1,24 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Optional
 from datetime import datetime, timedelta
-import uuid
+import json
 
-from database import get_db
+from database import SessionLocal, get_db
 from models import Payment, User, Booking, PaymentStatus, PaymentMethod
-from schemas import PaymentCreate, PaymentResponse, PaymentUpdate
+from schemas import PaymentCreate, PaymentResponse, PaymentStatusBatchRequest, PaymentUpdate
 from auth import get_current_active_user, get_current_admin_user, get_current_user
+from services.payment_gateway import SIGNATURE_HEADER, get_gateway
 from services.payment_service import PaymentService
+from services.reconciliation_service import ReconciliationService
+from services.webhook_service import WebhookService
 
 router = APIRouter()
 
 
-def generate_transaction_id() -> str:
-    """Generate a unique transaction ID"""
-    return f"TXN_{uuid.uuid4().hex[:12].upper()}"
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_payment(
+    payment_data: PaymentCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Tạo thanh toán (đang chờ) cho booking đã xác nhận
+    """
+    service = PaymentService(db)
+    payment = service.create_payment(payment_data, current_user)
+    return {"code": 201, "message": "Tạo thanh toán thành công", "data": PaymentResponse.model_validate(payment)}
+
+
+@router.post("/reconcile")
+async def reconcile_statement(
+    file: UploadFile = File(..., description="Sao kê CSV: amount + transaction_id và/hoặc reference, date, currency"),
+    dry_run: bool = Query(False, description="Chỉ báo cáo, không cập nhật thanh toán"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Đối soát sao kê ngân hàng / MoMo với thanh toán (chỉ admin).
+    Trả về NDJSON từng dòng: matched / mismatch / unknown / invalid, dòng cuối là ``summary``.
+    Thanh toán đang chờ khớp được đánh dấu hoàn thành theo từng lô.
+    """
+    rows = await run_in_threadpool(ReconciliationService.open_statement, file.file)
+
+    def report():
+        db = SessionLocal()
+        try:
+            for item in ReconciliationService(db).reconcile(rows, dry_run=dry_run):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
 
+    return StreamingResponse(report(), media_type="application/x-ndjson")
 
-@router.get("/", response_model=List[PaymentResponse])
+
+@router.get("/")
 async def get_payments(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
@@ -49,7 +87,7 @@ async def get_payments(
     return {"code": 200, "message": "Thành công", "data": [PaymentResponse.model_validate(payment) for payment in payments]}
 
 
-@router.get("/my-payments", response_model=List[PaymentResponse])
+@router.get("/my-payments")
 async def get_my_payments(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -62,7 +100,7 @@ async def get_my_payments(
     return {"code": 200, "message": "Thành công", "data": [PaymentResponse.model_validate(payment) for payment in payments]}
 
 
-@router.get("/user/{user_id}", response_model=List[PaymentResponse])
+@router.get("/user/{user_id}")
 async def get_user_payments(
     user_id: int,
     current_user: User = Depends(get_current_user),
@@ -76,7 +114,7 @@ async def get_user_payments(
     return {"code": 200, "message": "Thành công", "data": [PaymentResponse.model_validate(payment) for payment in payments]}
 
 
-@router.get("/booking/{booking_id}", response_model=List[PaymentResponse])
+@router.get("/booking/{booking_id}")
 async def get_booking_payments(
     booking_id: int,
     current_user: User = Depends(get_current_user),
@@ -90,7 +128,7 @@ async def get_booking_payments(
     return {"code": 200, "message": "Thành công", "data": [PaymentResponse.model_validate(payment) for payment in payments]}
 
 
-@router.get("/{payment_id}", response_model=PaymentResponse)
+@router.get("/{payment_id}")
 async def get_payment(
     payment_id: int,
     current_user: User = Depends(get_current_user),
@@ -118,7 +156,7 @@ async def get_payment(
     return {"code": 200, "message": "Thành công", "data": PaymentResponse.model_validate(payment)}
 
 
-@router.put("/{payment_id}", response_model=PaymentResponse)
+@router.put("/{payment_id}")
 async def update_payment(
     payment_id: int,
     payment_data: PaymentUpdate,
@@ -147,6 +185,35 @@ async def process_payment(
     return {"code": 200, "message": "Xử lý thanh toán thành công", "data": PaymentResponse.model_validate(payment)}
 
 
+@router.post("/{payment_id}/charge", status_code=status.HTTP_202_ACCEPTED)
+async def charge_payment(
+    payment_id: int,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Gửi thanh toán đang chờ tới cổng thanh toán (PAYMENT_GATEWAY, chỉ admin); trạng thái cập nhật khi nhận webhook
+    """
+    service = PaymentService(db)
+    payment = service.charge_payment(payment_id, current_user, get_gateway())
+    return {"code": 202, "message": "Đã gửi yêu cầu thanh toán", "data": PaymentResponse.model_validate(payment)}
+
+
+@router.post("/webhooks/{gateway_name}", status_code=status.HTTP_202_ACCEPTED)
+async def receive_payment_webhook(
+    gateway_name: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Webhook của cổng thanh toán (xác thực bằng chữ ký). Sự kiện được lưu rồi xử lý theo lô ở worker.
+    """
+    gateway = get_gateway(gateway_name)
+    body = await request.body()
+    received = WebhookService(db).receive(gateway, body, request.headers.get(SIGNATURE_HEADER))
+    return {"code": 202, "message": "Đã nhận webhook", "data": {"received": received}}
+
+
 @router.post("/{payment_id}/fail")
 async def fail_payment(
     payment_id: int,
@@ -227,10 +294,24 @@ async def get_booking_payment_status(
     Lấy trạng thái thanh toán của booking
     """
     service = PaymentService(db)
-    status_info = service.get_booking_payment_status(booking_id)
+    status_info = service.get_booking_payment_status(booking_id, current_user)
     return {"code": 200, "message": "Thành công", "data": status_info}
 
 
+@router.post("/status/batch")
+async def get_payment_status_batch(
+    request: PaymentStatusBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Trạng thái thanh toán của nhiều booking (tối đa 500) trong một lần gọi
+    """
+    service = PaymentService(db)
+    data = service.get_payment_status_batch(request.booking_ids, current_user)
+    return {"code": 200, "message": "Thành công", "data": data}
+
+
 @router.get("/recent/list")
 async def get_recent_payments(
     days: int = Query(7, ge=1, le=30, description="Số ngày gần đây"),
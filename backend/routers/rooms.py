@@ -7,10 +7,12 @@ import os, uuid, datetime
 
 from database import get_db
 from models import User
-from schemas import RoomCreate, RoomUpdate, RoomResponse, RoomListResponse, RoomDetailResponse
+from schemas import RoomCreate, RoomUpdate, RoomResponse, RoomListResponse, RoomDetailResponse, RoomRateRangeUpdate, RoomRateResponse, RoomQuoteRequest, RoomQuoteResponse
 from auth import get_current_user
 from services.room_service import RoomService
-from utils.gdrive import ensure_folder, upload_bytes, get_or_create_root
+from services.pricing_service import PricingService
+from services.job_handlers import enqueue_image_upload
+from utils.query_cache import query_cache, room_list_tags
 
 router = APIRouter()
 
@@ -93,20 +95,30 @@ async def get_rooms(
     if guests_int and not capacity_int:
         capacity_int = guests_int
     
-    service = RoomService(db)
-    rooms = service.get_rooms(
-        skip=skip,
-        limit=limit,
-        hotel_id=hotel_id_int,
-        room_type=room_type,
-        min_price=min_price_float,
-        max_price=max_price_float,
-        capacity=capacity_int,
-        available_only=available_only,
-        check_in_date=check_in_date_obj,
-        check_out_date=check_out_date_obj
-    )
-    return {"code": 200, "message": "Thành công", "data": [RoomResponse.model_validate(room) for room in rooms]}
+    cache_key = query_cache.make_key("rooms", {
+        "skip": skip, "limit": limit, "hotel_id": hotel_id_int, "room_type": room_type,
+        "min_price": min_price_float, "max_price": max_price_float, "capacity": capacity_int,
+        "available_only": available_only, "check_in": check_in_date_obj, "check_out": check_out_date_obj
+    })
+    data = query_cache.get(cache_key)
+    if data is None:
+        service = RoomService(db)
+        rooms = service.get_rooms(
+            skip=skip,
+            limit=limit,
+            hotel_id=hotel_id_int,
+            room_type=room_type,
+            min_price=min_price_float,
+            max_price=max_price_float,
+            capacity=capacity_int,
+            available_only=available_only,
+            check_in_date=check_in_date_obj,
+            check_out_date=check_out_date_obj
+        )
+        data = [RoomResponse.model_validate(room) for room in rooms]
+        by_dates = bool(check_in_date_obj and check_out_date_obj)
+        query_cache.set(cache_key, data, tags=room_list_tags(rooms, hotel_id_int, by_dates))
+    return {"code": 200, "message": "Thành công", "data": data}
 
 @router.get("/{room_id}", response_model=RoomDetailResponse)
 async def get_room(
@@ -185,6 +197,61 @@ async def check_room_availability(
         }
     }
 
+def _get_room_or_404(db: Session, room_id: int):
+    room = RoomService(db).get_room_by_id(room_id)
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy phòng"
+        )
+    return room
+
+@router.get("/{room_id}/rates")
+async def get_room_rates(
+    room_id: int,
+    start_date: date = Query(..., description="Từ ngày"),
+    end_date: date = Query(..., description="Đến ngày (bao gồm)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Lịch giá theo ngày của phòng (giá riêng hoặc giá mặc định price_per_night)
+    """
+    room = _get_room_or_404(db, room_id)
+    calendar = PricingService(db).get_rate_calendar(room, start_date, end_date)
+    return {"code": 200, "message": "Thành công", "data": [RoomRateResponse(**day) for day in calendar]}
+
+@router.put("/{room_id}/rates")
+async def set_room_rates(
+    room_id: int,
+    rate_data: RoomRateRangeUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Đặt giá cho mọi ngày trong khoảng, có thể giới hạn theo thứ trong tuần (chỉ admin)
+    """
+    room = _get_room_or_404(db, room_id)
+    updated = PricingService(db).set_rates(
+        room, rate_data.start_date, rate_data.end_date, rate_data.price, rate_data.weekdays, current_user
+    )
+    return {"code": 200, "message": "Cập nhật giá phòng thành công", "data": {"updated_dates": updated}}
+
+@router.delete("/{room_id}/rates")
+async def clear_room_rates(
+    room_id: int,
+    start_date: date = Query(..., description="Từ ngày"),
+    end_date: date = Query(..., description="Đến ngày (bao gồm)"),
+    weekdays: Optional[List[int]] = Query(None, description="0=Thứ 2 ... 6=Chủ nhật"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Xóa giá riêng trong khoảng, trở về giá mặc định (chỉ admin)
+    """
+    room = _get_room_or_404(db, room_id)
+    cleared = PricingService(db).set_rates(room, start_date, end_date, None, weekdays, current_user)
+    return {"code": 200, "message": "Đã xóa giá theo ngày", "data": {"cleared_dates": cleared}}
+
 @router.post("/{room_id}/maintenance")
 async def set_room_maintenance(
     room_id: int,
@@ -213,9 +280,25 @@ async def search_rooms(
     """
     Tìm kiếm phòng nâng cao
     """
-    service = RoomService(db)
-    rooms = service.search_rooms(search_params)
-    return {"code": 200, "message": "Thành công", "data": [RoomResponse.model_validate(room) for room in rooms]}
+    cache_key = query_cache.make_key("rooms.search", search_params)
+    data = query_cache.get(cache_key)
+    if data is None:
+        service = RoomService(db)
+        rooms = service.search_rooms(search_params)
+        data = [RoomResponse.model_validate(room) for room in rooms]
+        query_cache.set(cache_key, data, tags=room_list_tags(rooms))
+    return {"code": 200, "message": "Thành công", "data": data}
+
+@router.post("/quotes")
+async def quote_rooms(
+    quote_request: RoomQuoteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Báo giá hàng loạt: tổng tiền, số đêm và tình trạng còn phòng cho nhiều (phòng, ngày ở)
+    """
+    quotes = PricingService(db).quote_stays(quote_request.items)
+    return {"code": 200, "message": "Thành công", "data": [RoomQuoteResponse(**quote) for quote in quotes]}
 
 @router.get("/stats/overview")
 async def get_rooms_stats(
@@ -237,14 +320,14 @@ async def get_rooms_stats(
     return {"code": 200, "message": "Thành công", "data": stats}
 
 # ------------------ Upload images for room ------------------
-@router.post("/{room_id}/upload-images", status_code=status.HTTP_201_CREATED)
+@router.post("/{room_id}/upload-images", status_code=status.HTTP_202_ACCEPTED)
 async def upload_room_images(
     room_id: int,
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Tải nhiều ảnh cho phòng (chỉ admin)"""
+    """Tải nhiều ảnh cho phòng (chỉ admin); ảnh được đẩy lên Google Drive bởi job worker, theo dõi qua status_url"""
     if current_user.role.value != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Chỉ admin mới có quyền upload ảnh")
 
@@ -254,24 +337,11 @@ async def upload_room_images(
     if not room:
         raise HTTPException(status_code=404, detail="Không tìm thấy phòng")
 
-    saved_urls = []
-    ts = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
-
-    GDRIVE_PARENT_ROOMS = os.getenv("GDRIVE_PARENT_ROOMS") or get_or_create_root("Rooms")
-
-    drive_folder = ensure_folder(str(room_id), GDRIVE_PARENT_ROOMS)
-
+    queued = []
     for file in files:
-        ext = Path(file.filename).suffix or ""
-        filename = f"{ts}_{uuid.uuid4().hex}{ext}"
         content = await file.read()
         if len(content) == 0:
             continue
+        queued.append(enqueue_image_upload(db, "rooms", room_id, file.filename, content, hotel_id=room.hotel_id))
 
-        try:
-            _, link = upload_bytes(content, filename, drive_folder)
-            saved_urls.append(link)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail="Lỗi khi upload Google Drive")
-
-    return {"code": 201, "message": "Upload ảnh thành công", "data": saved_urls} 
\ No newline at end of file
+    return {"code": 202, "message": "Đã nhận ảnh, đang tải lên Google Drive", "data": queued}
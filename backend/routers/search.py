@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import HotelSearchRequest, HotelSearchResult, SearchHotelItem, SearchRoomItem, HotelResponse, RoomResponse
+from services.search_service import SearchService
+from utils.suggest import suggest_index
+
+router = APIRouter()
+
+
+@router.get("/suggest")
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="Chuỗi người dùng đang gõ"),
+    limit: int = Query(10, ge=1, le=20, description="Số gợi ý tối đa"),
+    db: Session = Depends(get_db)
+):
+    """
+    Gợi ý điểm đến và tên khách sạn khi gõ (autocomplete)
+    """
+    suggest_index.ensure_fresh(db)
+    return {"code": 200, "message": "Thành công", "data": suggest_index.suggest(q, limit)}
+
+
+@router.post("/")
+async def search_hotels(
+    search_params: HotelSearchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Tìm khách sạn còn phòng theo địa điểm, ngày, số khách, giá, hạng sao, tiện nghi.
+    Trả về trang khách sạn kèm phòng rẻ nhất và số lượng theo từng facet.
+    """
+    service = SearchService(db)
+    result = service.search_hotels(search_params)
+    
+    items = []
+    for item in result["items"]:
+        room = item["cheapest_room"]
+        cheapest_room = None
+        if room:
+            cheapest_room = SearchRoomItem(
+                **RoomResponse.model_validate(room).model_dump(),
+                nights=item["nights"],
+                total_price=item["total_price"]
+            )
+        items.append(SearchHotelItem(
+            **HotelResponse.model_validate(item["hotel"]).model_dump(),
+            min_price=item["min_price"],
+            available_rooms=item["available_rooms"],
+            cheapest_room=cheapest_room
+        ))
+    
+    data = HotelSearchResult(
+        items=items,
+        total=result["total"],
+        page=result["page"],
+        page_size=result["page_size"],
+        facets=result["facets"]
+    )
+    return {"code": 200, "message": "Thành công", "data": data}
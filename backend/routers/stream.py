@@ -0,0 +1,80 @@
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from jose import JWTError, jwt
+from typing import Optional
+
+from auth import ALGORITHM, SECRET_KEY
+from database import SessionLocal
+from models import Room, User
+from utils.event_broker import sse_events
+
+router = APIRouter()
+
+
+def _resolve_subscriber(token: Optional[str], room_id: Optional[int]) -> dict:
+    """Role of the token owner and hotel/type of the filtered room (session đóng ngay, không giữ suốt stream)"""
+    db = SessionLocal()
+    try:
+        is_admin = False
+        if token:
+            try:
+                username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except JWTError:
+                username = None
+            user = username and db.query(User).filter(
+                (User.username == username) | (User.email == username)
+            ).first()
+            if not user or not user.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token không hợp lệ"
+                )
+            is_admin = user.role.value == "admin"
+        
+        room = None
+        if room_id is not None:
+            room = db.get(Room, room_id)
+            if room is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Không tìm thấy phòng"
+                )
+        return {
+            "is_admin": is_admin,
+            "room_hotel_id": room.hotel_id if room else None,
+            "room_type": room.room_type.value if room else None,
+        }
+    finally:
+        db.close()
+
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    hotel_id: Optional[int] = Query(None, description="Chỉ nhận thay đổi của khách sạn này"),
+    room_id: Optional[int] = Query(None, description="Chỉ nhận thay đổi của phòng này"),
+    token: Optional[str] = Query(None, description="JWT (EventSource không gửi được header Authorization)")
+):
+    """
+    Server-Sent Events: thay đổi tình trạng phòng (event ``availability``) cho mọi người;
+    booking mới / thay đổi (``booking``) và trạng thái thanh toán (``payment``) chỉ cho admin.
+    Tin ``resync`` báo client đọc chậm đã bị bỏ tin, cần tải lại danh sách.
+    """
+    scheme, _, header_token = request.headers.get("authorization", "").partition(" ")
+    if not token and scheme.lower() == "bearer":
+        token = header_token
+    subscriber = await run_in_threadpool(_resolve_subscriber, token, room_id)
+    if room_id is not None and hotel_id is None:
+        hotel_id = subscriber["room_hotel_id"]
+    
+    return StreamingResponse(
+        sse_events(
+            is_admin=subscriber["is_admin"],
+            hotel_id=hotel_id,
+            room_id=room_id,
+            room_type=subscriber["room_type"]
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
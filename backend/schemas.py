@@ -1,7 +1,8 @@
 from pydantic import BaseModel, EmailStr, ConfigDict, Field
-from typing import Optional, List
-from datetime import datetime
-from models import UserRole, RoomType, BookingStatus, PaymentStatus
+from typing import Optional, List, Dict, Annotated
+from datetime import datetime, date
+from decimal import Decimal
+from models import UserRole, RoomType, BookingStatus, PaymentStatus, JobStatus
 
 
 # Base schemas
@@ -56,6 +57,8 @@ class HotelBase(BaseSchema):
     email: Optional[str] = None
     website: Optional[str] = None
     star_rating: int = 3
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     amenities: Optional[str] = None
 
 
@@ -73,6 +76,8 @@ class HotelUpdate(BaseSchema):
     email: Optional[str] = None
     website: Optional[str] = None
     star_rating: Optional[int] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     amenities: Optional[str] = None
 
 
@@ -83,6 +88,10 @@ class HotelResponse(HotelBase):
     updated_at: Optional[datetime] = None
 
 
+class HotelNearbyResponse(HotelResponse):
+    distance_km: float
+
+
 # Room schemas
 class RoomBase(BaseSchema):
     hotel_id: int
@@ -121,10 +130,64 @@ class RoomResponse(RoomBase):
     updated_at: Optional[datetime] = None
 
 
+class RoomRateRangeUpdate(BaseSchema):
+    start_date: date
+    end_date: date  # Inclusive
+    price: float = Field(..., gt=0)
+    weekdays: Optional[List[Annotated[int, Field(ge=0, le=6)]]] = Field(
+        None, description="0=Thứ 2 ... 6=Chủ nhật, bỏ trống = mọi ngày"
+    )
+
+
+class RoomRateResponse(BaseSchema):
+    date: date
+    price: float
+    is_override: bool
+
+
+class RoomQuoteItem(BaseSchema):
+    room_id: int
+    check_in_date: date
+    check_out_date: date
+    guests: int = Field(1, ge=1)
+
+
+class RoomQuoteRequest(BaseSchema):
+    items: List[RoomQuoteItem] = Field(..., max_length=5000)
+
+
+class RoomQuoteResponse(RoomQuoteItem):
+    nights: int
+    total_price: Optional[float] = None
+    available: bool
+    reason: Optional[str] = None
+
+
+class RoomAllotmentUpdate(BaseSchema):
+    room_type: RoomType
+    start_date: date
+    end_date: date  # Inclusive
+    total: Optional[int] = Field(None, ge=0, description="Bỏ trống = số phòng đang mở bán của loại này")
+
+
+class RoomAllotmentResponse(BaseSchema):
+    hotel_id: int
+    room_type: RoomType
+    date: date
+    total: int
+    sold: int
+    remaining: int
+
+
+class RoomTypeAvailability(BaseSchema):
+    room_type: RoomType
+    available_rooms: int
+
+
 # Booking schemas
 class BookingBase(BaseSchema):
     user_id: int
-    room_id: int
+    room_id: Optional[int] = None
     check_in_date: datetime
     check_out_date: datetime
     guest_count: int = 1
@@ -139,6 +202,31 @@ class BookingCreate(BaseSchema):
     special_requests: Optional[str] = None
 
 
+class BookingByTypeCreate(BaseSchema):
+    hotel_id: int
+    room_type: RoomType
+    check_in_date: date
+    check_out_date: date
+    guest_count: int = Field(1, ge=1)
+    special_requests: Optional[str] = None
+
+
+class BookingGroupRoom(BaseSchema):
+    room_id: int
+    guest_count: int = Field(1, ge=1)
+
+
+class BookingGroupCreate(BaseSchema):
+    rooms: List[BookingGroupRoom] = Field(..., min_length=1, max_length=100)
+    check_in_date: date
+    check_out_date: date
+    special_requests: Optional[str] = None
+
+
+class BookingAssignRoom(BaseSchema):
+    room_id: int
+
+
 class BookingUpdate(BaseSchema):
     check_in_date: Optional[datetime] = None
     check_out_date: Optional[datetime] = None
@@ -149,29 +237,42 @@ class BookingUpdate(BaseSchema):
 
 class BookingResponse(BookingBase):
     id: int
+    hotel_id: Optional[int] = None
+    room_type: Optional[RoomType] = None
     total_nights: int
     total_price: float
+    currency: Optional[str] = None
+    amount_paid: float = 0
+    amount_pending: float = 0
     status: BookingStatus
+    expires_at: Optional[datetime] = None
     booking_reference: Optional[str] = None
+    group_reference: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
 
+class BookingGroupResponse(BaseSchema):
+    group_reference: str
+    total_price: float
+    bookings: List[BookingResponse]
+
+
 # Payment schemas
 class PaymentBase(BaseSchema):
     booking_id: int
-    amount: float
     payment_method: str
-    currency: str = "USD"
     notes: Optional[str] = None
 
 
 class PaymentCreate(PaymentBase):
-    pass
+    # Decimal để số tiền không bị sai số float trước khi đổi sang đơn vị nhỏ nhất
+    amount: Decimal
+    currency: Optional[str] = None  # Mặc định theo currency của booking
 
 
 class PaymentUpdate(BaseSchema):
-    amount: Optional[float] = None
+    amount: Optional[Decimal] = None
     payment_method: Optional[str] = None
     payment_status: Optional[PaymentStatus] = None
     transaction_id: Optional[str] = None
@@ -182,6 +283,8 @@ class PaymentUpdate(BaseSchema):
 
 class PaymentResponse(PaymentBase):
     id: int
+    amount: float
+    currency: str
     payment_status: PaymentStatus
     transaction_id: Optional[str] = None
     payment_date: Optional[datetime] = None
@@ -189,6 +292,23 @@ class PaymentResponse(PaymentBase):
     updated_at: Optional[datetime] = None
 
 
+class PaymentStatusBatchRequest(BaseSchema):
+    booking_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+# Job schemas
+class JobResponse(BaseSchema):
+    id: int
+    kind: str
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    result: Optional[Dict] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 # Authentication schemas
 class Token(BaseSchema):
     access_token: str
@@ -225,6 +345,46 @@ class BookingSearchFilters(BaseSchema):
     check_in_date_to: Optional[datetime] = None
 
 
+class HotelSearchRequest(BaseSchema):
+    location: Optional[str] = None
+    check_in_date: Optional[date] = None
+    check_out_date: Optional[date] = None
+    guests: Optional[int] = Field(None, ge=1)
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    min_rating: Optional[int] = Field(None, ge=1, le=5)
+    star_ratings: Optional[List[int]] = None
+    room_type: Optional[RoomType] = None
+    amenities: Optional[List[str]] = None
+    sort: str = Field("price_asc", pattern="^(price_asc|price_desc|rating_desc)$")
+    page: int = Field(1, ge=1)
+    page_size: int = Field(20, ge=1, le=50)
+
+
+class SearchRoomItem(RoomResponse):
+    nights: Optional[int] = None
+    total_price: Optional[float] = None
+
+
+class SearchHotelItem(HotelResponse):
+    min_price: float
+    available_rooms: int
+    cheapest_room: Optional[SearchRoomItem] = None
+
+
+class FacetCount(BaseSchema):
+    value: str
+    count: int
+
+
+class HotelSearchResult(BaseSchema):
+    items: List[SearchHotelItem]
+    total: int
+    page: int
+    page_size: int
+    facets: Dict[str, List[FacetCount]]
+
+
 # Password Change Request Schema
 class PasswordChangeRequest(BaseModel):
     old_password: str
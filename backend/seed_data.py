@@ -12,6 +12,11 @@ from models import (
     UserRole, RoomType, BookingStatus, PaymentStatus, PaymentMethod
 )
 from auth import get_password_hash
+from services.amenity_service import AmenityService
+from services.payment_service import balance_contribution
+from utils.geo import encode as geohash_encode
+from utils.money import DEFAULT_CURRENCY, to_minor
+from utils.textfold import fill_hotel_search_columns, fill_room_search_columns
 
 
 def create_sample_users(db: Session):
@@ -76,6 +81,9 @@ def create_sample_hotels(db: Session):
             address="123 Đường Nguyễn Huệ, Quận 1",
             city="Hồ Chí Minh",
             country="Việt Nam",
+            latitude=10.7743,
+            longitude=106.7038,
+            geohash=geohash_encode(10.7743, 106.7038),
             phone="028-3829-5678",
             email="info@quehuong.com",
             website="https://quehuong.com",
@@ -88,6 +96,9 @@ def create_sample_hotels(db: Session):
             address="15 Phố Nha Tho, Hoàn Kiếm",
             city="Hà Nội",
             country="Việt Nam",
+            latitude=21.0288,
+            longitude=105.8497,
+            geohash=geohash_encode(21.0288, 105.8497),
             phone="024-3928-5678",
             email="info@grandhanoi.com",
             website="https://grandhanoi.com",
@@ -100,6 +111,9 @@ def create_sample_hotels(db: Session):
             address="Đường Trần Phú, Bãi biển Nha Trang",
             city="Nha Trang",
             country="Việt Nam",
+            latitude=12.2388,
+            longitude=109.1967,
+            geohash=geohash_encode(12.2388, 109.1967),
             phone="0258-3829-1234",
             email="info@beachfront.com",
             website="https://beachfront.com",
@@ -109,6 +123,7 @@ def create_sample_hotels(db: Session):
     ]
     
     for hotel in hotels:
+        fill_hotel_search_columns(hotel)
         db.add(hotel)
     
     db.commit()
@@ -203,6 +218,7 @@ def create_sample_rooms(db: Session, hotels):
         
         if not existing_room:
             room = Room(**room_info)
+            fill_room_search_columns(room)
             db.add(room)
             print(f"✅ Tạo phòng {room_info['room_number']} tại hotel {room_info['hotel_id']}")
     
@@ -219,10 +235,12 @@ def create_sample_bookings(db: Session, users, rooms):
     past_booking = Booking(
         user_id=users[1].id,  # guest1
         room_id=rooms[0].id,  # Phòng 101 Quê Hương
+        hotel_id=rooms[0].hotel_id,
+        room_type=rooms[0].room_type,
         check_in_date=date.today() - timedelta(days=10),
         check_out_date=date.today() - timedelta(days=8),
         guest_count=2,
-        total_price=Decimal("1600000"),  # 2 nights * 800k
+        total_price_minor=to_minor(Decimal("1600000"), DEFAULT_CURRENCY),  # 2 nights * 800k
         status=BookingStatus.COMPLETED,
         special_requests="Giường đôi, tầng cao"
     )
@@ -231,10 +249,12 @@ def create_sample_bookings(db: Session, users, rooms):
     current_booking = Booking(
         user_id=users[2].id,  # guest2
         room_id=rooms[1].id,  # Phòng 201 Quê Hương
+        hotel_id=rooms[1].hotel_id,
+        room_type=rooms[1].room_type,
         check_in_date=date.today() - timedelta(days=1),
         check_out_date=date.today() + timedelta(days=2),
         guest_count=2,
-        total_price=Decimal("3600000"),  # 3 nights * 1.2M
+        total_price_minor=to_minor(Decimal("3600000"), DEFAULT_CURRENCY),  # 3 nights * 1.2M
         status=BookingStatus.CONFIRMED,
         special_requests="Honeymoon package"
     )
@@ -243,10 +263,12 @@ def create_sample_bookings(db: Session, users, rooms):
     future_booking = Booking(
         user_id=users[3].id,  # guest3
         room_id=rooms[4].id,  # Suite Hanoi
+        hotel_id=rooms[4].hotel_id,
+        room_type=rooms[4].room_type,
         check_in_date=date.today() + timedelta(days=5),
         check_out_date=date.today() + timedelta(days=7),
         guest_count=3,
-        total_price=Decimal("6000000"),  # 2 nights * 3M
+        total_price_minor=to_minor(Decimal("6000000"), DEFAULT_CURRENCY),  # 2 nights * 3M
         status=BookingStatus.PENDING,
         special_requests="Late check-in, airport transfer"
     )
@@ -255,10 +277,12 @@ def create_sample_bookings(db: Session, users, rooms):
     cancelled_booking = Booking(
         user_id=users[1].id,  # guest1
         room_id=rooms[6].id,  # Villa beach
+        hotel_id=rooms[6].hotel_id,
+        room_type=rooms[6].room_type,
         check_in_date=date.today() + timedelta(days=15),
         check_out_date=date.today() + timedelta(days=18),
         guest_count=4,
-        total_price=Decimal("15000000"),  # 3 nights * 5M
+        total_price_minor=to_minor(Decimal("15000000"), DEFAULT_CURRENCY),  # 3 nights * 5M
         status=BookingStatus.CANCELLED,
         special_requests="Family vacation"
     )
@@ -280,43 +304,47 @@ def create_sample_payments(db: Session, bookings):
     # Payment for past booking (completed)
     past_payment = Payment(
         booking_id=bookings[0].id,
-        amount=bookings[0].total_price,
+        hotel_id=bookings[0].hotel_id,
+        amount_minor=bookings[0].total_price_minor,
         payment_method=PaymentMethod.CREDIT_CARD,
-        status=PaymentStatus.COMPLETED,
-        payment_reference="PAY-ABCD1234",
-        paid_at=datetime.utcnow() - timedelta(days=12),
+        payment_status=PaymentStatus.COMPLETED,
+        transaction_id="TXN_ABCD1234",
+        payment_date=datetime.utcnow() - timedelta(days=12),
         notes="Thanh toán thẻ tín dụng"
     )
     
     # Payment for current booking (completed)
     current_payment = Payment(
         booking_id=bookings[1].id,
-        amount=bookings[1].total_price,
+        hotel_id=bookings[1].hotel_id,
+        amount_minor=bookings[1].total_price_minor,
         payment_method=PaymentMethod.BANK_TRANSFER,
-        status=PaymentStatus.COMPLETED,
-        payment_reference="PAY-EFGH5678",
-        paid_at=datetime.utcnow() - timedelta(days=2),
+        payment_status=PaymentStatus.COMPLETED,
+        transaction_id="TXN_EFGH5678",
+        payment_date=datetime.utcnow() - timedelta(days=2),
         notes="Chuyển khoản ngân hàng"
     )
     
     # Partial payment for future booking (pending)
     future_payment1 = Payment(
         booking_id=bookings[2].id,
-        amount=Decimal("3000000"),  # 50% deposit
+        hotel_id=bookings[2].hotel_id,
+        amount_minor=to_minor(Decimal("3000000"), DEFAULT_CURRENCY),  # 50% deposit
         payment_method=PaymentMethod.CASH,
-        status=PaymentStatus.COMPLETED,
-        payment_reference="PAY-IJKL9012",
-        paid_at=datetime.utcnow() - timedelta(days=1),
+        payment_status=PaymentStatus.COMPLETED,
+        transaction_id="TXN_IJKL9012",
+        payment_date=datetime.utcnow() - timedelta(days=1),
         notes="Đặt cọc 50%"
     )
     
     # Remaining payment for future booking (pending)
     future_payment2 = Payment(
         booking_id=bookings[2].id,
-        amount=Decimal("3000000"),  # Remaining 50%
+        hotel_id=bookings[2].hotel_id,
+        amount_minor=to_minor(Decimal("3000000"), DEFAULT_CURRENCY),  # Remaining 50%
         payment_method=PaymentMethod.CREDIT_CARD,
-        status=PaymentStatus.PENDING,
-        payment_reference="PAY-MNOP3456",
+        payment_status=PaymentStatus.PENDING,
+        transaction_id="TXN_MNOP3456",
         notes="Thanh toán phần còn lại"
     )
     
@@ -324,6 +352,11 @@ def create_sample_payments(db: Session, bookings):
     
     for payment in payments:
         db.add(payment)
+        # Số dư trên booking (xem PaymentService._apply_balance)
+        booking = next(b for b in bookings if b.id == payment.booking_id)
+        paid, pending = balance_contribution(payment.payment_status, payment.amount_minor)
+        booking.amount_paid_minor = (booking.amount_paid_minor or 0) + paid
+        booking.amount_pending_minor = (booking.amount_pending_minor or 0) + pending
     
     db.commit()
     print("✅ Tạo thanh toán mẫu thành công")
@@ -342,6 +375,7 @@ def seed_database():
         users = create_sample_users(db)
         hotels = create_sample_hotels(db)
         rooms = create_sample_rooms(db, hotels)
+        AmenityService(db).backfill()
         bookings = create_sample_bookings(db, users, rooms)
         payments = create_sample_payments(db, bookings)
         
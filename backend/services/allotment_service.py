@@ -0,0 +1,296 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, event, func, update
+from fastapi import HTTPException, status
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from models import RoomAllotment, Room, Hotel, User, RoomType, Booking, BookingStatus
+from services.pricing_service import MAX_RATE_RANGE_DAYS
+from utils.query_cache import invalidate_availability
+
+
+# Booking giữ allotment cho tới khi bị hủy / hết hạn / xóa
+HOLDING_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED)
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _touch_availability(db: Session, hotel_id: int) -> None:
+    """Invalidate the hotel's cached availability once the session commits (sold / total changed)"""
+    db.info.setdefault("allotment_hotels", set()).add(hotel_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for hotel_id in session.info.pop("allotment_hotels", ()):
+        invalidate_availability(hotel_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("allotment_hotels", None)
+
+
+class AllotmentService:
+    """
+    Room-type inventory: per (hotel, room type, night) a sellable count and a sold count.
+
+    Đặt theo loại phòng chỉ cần cộng ``sold`` cho từng đêm bằng MỘT câu UPDATE có
+    điều kiện ``sold + n <= total``; nếu số dòng được cập nhật khác số đêm thì hết phòng
+    và transaction bị rollback. Phòng cụ thể được gán sau (BookingService.assign_room).
+
+    Allotment là nguồn duy nhất cho số phòng còn bán được: booking theo từng phòng
+    cũng trừ ``sold`` (``charge``) ở những đêm đã mở quỹ, và dòng mới mở được khởi tạo
+    bằng số booking đang giữ loại phòng đó, nên ``sold`` luôn đếm MỌI booking đang giữ
+    phòng (Booking.room_type) và hai cách đặt không bán vượt nhau.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def set_allotment(
+        self,
+        hotel_id: int,
+        room_type: RoomType,
+        start_date: date,
+        end_date: date,
+        total: Optional[int],
+        current_user: User
+    ) -> int:
+        """
+        Set the sellable count of every night in [start_date, end_date].
+        total=None uses the number of available rooms of that type. Returns nights touched.
+        """
+        if current_user.role.value != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Chỉ admin mới có quyền cập nhật quỹ phòng"
+            )
+        if not self.db.query(Hotel.id).filter(Hotel.id == hotel_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy khách sạn"
+            )
+        self._validate_range(start_date, end_date + timedelta(days=1))
+
+        if total is None:
+            total = self.db.query(func.count(Room.id)).filter(
+                and_(Room.hotel_id == hotel_id, Room.room_type == room_type, Room.is_available == True)
+            ).scalar()
+
+        existing = {
+            row.date: row for row in self.db.query(RoomAllotment).filter(
+                and_(
+                    RoomAllotment.hotel_id == hotel_id,
+                    RoomAllotment.room_type == room_type,
+                    RoomAllotment.date >= start_date,
+                    RoomAllotment.date <= end_date
+                )
+            )
+        }
+        nights = (end_date - start_date).days + 1
+        booked = self._booked_nights(hotel_id, room_type, start_date, end_date + timedelta(days=1))
+        sold = {
+            night: existing[night].sold if night in existing else booked[night]
+            for night in (start_date + timedelta(days=i) for i in range(nights))
+        }
+        oversold = [d for d, count in sold.items() if count > total]
+        if oversold:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Quỹ phòng ngày {min(oversold)} đã bán nhiều hơn {total}"
+            )
+
+        for night, count in sold.items():
+            row = existing.get(night)
+            if row is None:
+                self.db.add(RoomAllotment(hotel_id=hotel_id, room_type=room_type, date=night, total=total, sold=count))
+            else:
+                row.total = total
+        _touch_availability(self.db, hotel_id)
+        self.db.commit()
+        return nights
+
+    def get_allotments(
+        self,
+        hotel_id: int,
+        start_date: date,
+        end_date: date,
+        room_type: Optional[RoomType] = None
+    ) -> List[RoomAllotment]:
+        """Allotment rows of a hotel for [start_date, end_date]"""
+        self._validate_range(start_date, end_date + timedelta(days=1))
+        query = self.db.query(RoomAllotment).filter(
+            and_(
+                RoomAllotment.hotel_id == hotel_id,
+                RoomAllotment.date >= start_date,
+                RoomAllotment.date <= end_date
+            )
+        )
+        if room_type:
+            query = query.filter(RoomAllotment.room_type == room_type)
+        return query.order_by(RoomAllotment.room_type, RoomAllotment.date).all()
+
+    def get_availability(self, hotel_id: int, check_in_date: date, check_out_date: date) -> List[dict]:
+        """Rooms left for the whole stay, per room type (min over nights of total - sold)"""
+        check_in = _as_date(check_in_date)
+        check_out = _as_date(check_out_date)
+        self._validate_range(check_in, check_out)
+        nights = (check_out - check_in).days
+
+        rows = self.db.query(
+            RoomAllotment.room_type,
+            func.count(RoomAllotment.id).label("nights"),
+            func.min(RoomAllotment.total - RoomAllotment.sold).label("remaining")
+        ).filter(
+            and_(
+                RoomAllotment.hotel_id == hotel_id,
+                RoomAllotment.date >= check_in,
+                RoomAllotment.date < check_out
+            )
+        ).group_by(RoomAllotment.room_type).all()
+
+        return [
+            {
+                "room_type": row.room_type,
+                # Đêm chưa mở bán (không có dòng allotment) coi như hết phòng
+                "available_rooms": max(row.remaining, 0) if row.nights == nights else 0,
+            }
+            for row in rows
+        ]
+
+    def reserve(self, hotel_id: int, room_type: RoomType, check_in_date, check_out_date, rooms: int = 1) -> None:
+        """Atomically take ``rooms`` from every night of the stay (caller commits)"""
+        check_in = _as_date(check_in_date)
+        check_out = _as_date(check_out_date)
+        self._validate_range(check_in, check_out)
+        nights = (check_out - check_in).days
+
+        result = self.db.execute(
+            update(RoomAllotment)
+            .where(
+                RoomAllotment.hotel_id == hotel_id,
+                RoomAllotment.room_type == room_type,
+                RoomAllotment.date >= check_in,
+                RoomAllotment.date < check_out,
+                RoomAllotment.sold + rooms <= RoomAllotment.total
+            )
+            .values(sold=RoomAllotment.sold + rooms)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != nights:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Loại phòng này đã hết trong thời gian đã chọn"
+            )
+        _touch_availability(self.db, hotel_id)
+
+    def charge(self, hotel_id: int, room_type: RoomType, check_in_date, check_out_date, rooms: int = 1) -> None:
+        """
+        Take ``rooms`` from the nights of the stay that have an allotment (caller commits).
+        Booking theo phòng cụ thể: đêm chưa mở quỹ không bị giới hạn, đêm đã mở thì phải còn chỗ.
+        """
+        check_in = _as_date(check_in_date)
+        check_out = _as_date(check_out_date)
+        in_stay = and_(
+            RoomAllotment.hotel_id == hotel_id,
+            RoomAllotment.room_type == room_type,
+            RoomAllotment.date >= check_in,
+            RoomAllotment.date < check_out
+        )
+        managed = self.db.query(func.count(RoomAllotment.id)).filter(in_stay).scalar()
+        if not managed:
+            return
+
+        result = self.db.execute(
+            update(RoomAllotment)
+            .where(in_stay, RoomAllotment.sold + rooms <= RoomAllotment.total)
+            .values(sold=RoomAllotment.sold + rooms)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != managed:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Loại phòng này đã hết trong thời gian đã chọn"
+            )
+        _touch_availability(self.db, hotel_id)
+
+    def release(self, hotel_id: int, room_type: RoomType, check_in_date, check_out_date, rooms: int = 1) -> None:
+        """Give ``rooms`` back to every night of the stay (caller commits)"""
+        self.db.execute(
+            update(RoomAllotment)
+            .where(
+                RoomAllotment.hotel_id == hotel_id,
+                RoomAllotment.room_type == room_type,
+                RoomAllotment.date >= _as_date(check_in_date),
+                RoomAllotment.date < _as_date(check_out_date),
+                RoomAllotment.sold >= rooms
+            )
+            .values(sold=RoomAllotment.sold - rooms)
+            .execution_options(synchronize_session=False)
+        )
+        _touch_availability(self.db, hotel_id)
+
+    def recount(self, since: Optional[date] = None) -> int:
+        """Recompute ``sold`` of every allotment night from ``since`` (mặc định hôm nay). Returns rows changed."""
+        since = since or date.today()
+        rows = self.db.query(RoomAllotment).filter(RoomAllotment.date >= since).all()
+        if not rows:
+            return 0
+        booked: Dict[Tuple[int, RoomType, date], int] = Counter()
+        for booking in self.db.query(
+            Booking.hotel_id, Booking.room_type, Booking.check_in_date, Booking.check_out_date
+        ).filter(
+            Booking.status.in_(HOLDING_STATUSES),
+            Booking.room_type.isnot(None),
+            Booking.check_out_date > datetime.combine(since, datetime.min.time())
+        ):
+            night = _as_date(booking.check_in_date)
+            while night < _as_date(booking.check_out_date):
+                booked[(booking.hotel_id, booking.room_type, night)] += 1
+                night += timedelta(days=1)
+
+        changed = 0
+        for row in rows:
+            count = booked[(row.hotel_id, row.room_type, row.date)]
+            if row.sold != count:
+                row.sold = count
+                changed += 1
+                _touch_availability(self.db, row.hotel_id)
+        self.db.commit()
+        return changed
+
+    def _booked_nights(self, hotel_id: int, room_type: RoomType, start_date: date, end_date: date) -> Dict[date, int]:
+        """Bookings holding ``room_type`` per night of [start_date, end_date)"""
+        booked: Dict[date, int] = Counter()
+        for check_in, check_out in self.db.query(Booking.check_in_date, Booking.check_out_date).filter(
+            Booking.hotel_id == hotel_id,
+            Booking.room_type == room_type,
+            Booking.status.in_(HOLDING_STATUSES),
+            Booking.check_in_date < datetime.combine(end_date, datetime.min.time()),
+            Booking.check_out_date > datetime.combine(start_date, datetime.min.time())
+        ):
+            night = max(_as_date(check_in), start_date)
+            while night < min(_as_date(check_out), end_date):
+                booked[night] += 1
+                night += timedelta(days=1)
+        return booked
+
+    @staticmethod
+    def _validate_range(start_date: date, end_date: date) -> None:
+        """Validate a half-open range [start_date, end_date)"""
+        if start_date >= end_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày bắt đầu phải trước ngày kết thúc"
+            )
+        if (end_date - start_date).days > MAX_RATE_RANGE_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Khoảng ngày tối đa là {MAX_RATE_RANGE_DAYS} ngày"
+            )
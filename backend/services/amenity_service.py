@@ -0,0 +1,182 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, false
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Iterable
+import json
+import re
+
+from models import Amenity, Hotel, Room
+from utils.textfold import fold
+
+# amenity_mask là BIGINT có dấu, chỉ dùng 63 bit thấp để giá trị luôn dương
+MAX_AMENITY_BITS = 63
+# Số lần thử tạo tiện nghi khi transaction khác vừa lấy cùng code / bit
+AMENITY_CREATE_ATTEMPTS = 5
+
+
+def parse_amenities(raw: Optional[str]) -> List[str]:
+    """Parse an amenities string (JSON list or comma separated) into clean names"""
+    if not raw:
+        return []
+
+    items = None
+    text = raw.strip()
+    if text.startswith("["):
+        try:
+            items = [str(item) for item in json.loads(text)]
+        except (ValueError, TypeError):
+            items = None
+    if items is None:
+        items = re.split(r"[,;\n]", text)
+
+    names = []
+    seen = set()
+    for item in items:
+        name = re.sub(r"\s+", " ", item).strip()
+        if name and amenity_code(name) not in seen:
+            seen.add(amenity_code(name))
+            names.append(name)
+    return names
+
+
+def amenity_code(name: str) -> str:
+    """Normalized lookup key of an amenity name"""
+    return re.sub(r"\s+", " ", name).strip().lower()
+
+
+class AmenityService:
+    """Service layer for the amenity catalog and amenity bitmasks"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_amenities(self) -> List[Amenity]:
+        """Get the whole amenity catalog"""
+        return self.db.query(Amenity).order_by(Amenity.name).all()
+
+    def get_or_create_amenities(self, names: Iterable[str]) -> List[Amenity]:
+        """Resolve names to catalog entries, creating missing ones with the next free bit"""
+        names = list(names)
+        codes = [amenity_code(n) for n in names]
+        if not codes:
+            return []
+
+        existing = {
+            a.code: a for a in self.db.query(Amenity).filter(Amenity.code.in_(codes)).all()
+        }
+        result = []
+        for name, code in zip(names, codes):
+            amenity = existing.get(code)
+            if amenity is None:
+                amenity = self._create_amenity(name, code)
+                existing[code] = amenity
+            result.append(amenity)
+
+        self.db.flush()
+        return result
+
+    def _create_amenity(self, name: str, code: str) -> Amenity:
+        """
+        Insert a catalog entry with the next free bit.
+
+        Bit lớn nhất được đọc bằng SELECT ... FOR UPDATE nên hai request thêm tiện nghi
+        mới chờ nhau thay vì cùng lấy max(bit)+1; nếu vẫn đụng unique (code vừa được tạo
+        ở transaction khác, hoặc SQLite không có FOR UPDATE) thì savepoint được hủy và thử lại.
+        """
+        for attempt in range(AMENITY_CREATE_ATTEMPTS):
+            top = self.db.query(Amenity.bit).filter(Amenity.bit.isnot(None)).order_by(
+                Amenity.bit.desc()
+            ).with_for_update().first()
+            bit = 0 if top is None else top.bit + 1
+            amenity = Amenity(name=name, code=code, bit=bit if bit < MAX_AMENITY_BITS else None)
+            try:
+                with self.db.begin_nested():
+                    self.db.add(amenity)
+                return amenity
+            except IntegrityError:
+                created = self.db.query(Amenity).filter(Amenity.code == code).with_for_update().first()
+                if created is not None:
+                    return created
+                if attempt == AMENITY_CREATE_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def compute_mask(amenities: Iterable[Amenity]) -> int:
+        """OR together the bits of the given amenities"""
+        mask = 0
+        for amenity in amenities:
+            if amenity.bit is not None:
+                mask |= 1 << amenity.bit
+        return mask
+
+    def sync_hotel(self, hotel: Hotel) -> None:
+        """Rebuild hotel amenity links and mask from hotel.amenities (caller commits)"""
+        items = self.get_or_create_amenities(parse_amenities(hotel.amenities))
+        hotel.amenity_items = items
+        hotel.amenity_mask = self.compute_mask(items)
+
+    def sync_room(self, room: Room) -> None:
+        """Rebuild room amenity links and mask from room.amenities (caller commits)"""
+        items = self.get_or_create_amenities(parse_amenities(room.amenities))
+        room.amenity_items = items
+        room.amenity_mask = self.compute_mask(items)
+
+    def amenity_filters(self, model, names: Iterable[str]) -> list:
+        """
+        Build filter predicates "has all of these amenities" for Hotel or Room.
+
+        Tên khớp chính xác với catalog được gộp vào một predicate bitwise duy nhất.
+        Tên không khớp chính xác được so khớp chuỗi con trên catalog (nhỏ, trong bộ nhớ)
+        và yêu cầu ít nhất một trong các bit tương ứng.
+        """
+        names = [n for n in names if n and n.strip()]
+        if not names:
+            return []
+
+        catalog = self.db.query(Amenity).all()
+        folded = [(fold(a.code), a) for a in catalog]
+        by_code = {code: a for code, a in folded}
+
+        required = 0
+        filters = []
+        for name in names:
+            # So khớp không dấu: "ho boi" khớp "Hồ bơi"
+            code = fold(name)
+            exact = by_code.get(code)
+            candidates = [exact] if exact else [a for key, a in folded if code in key]
+            if not candidates:
+                # Không có tiện nghi nào khớp -> không có kết quả
+                return [false()]
+
+            if len(candidates) == 1 and candidates[0].bit is not None:
+                required |= 1 << candidates[0].bit
+                continue
+
+            any_mask = self.compute_mask(candidates)
+            overflow_ids = [a.id for a in candidates if a.bit is None]
+            options = []
+            if any_mask:
+                options.append(model.amenity_mask.op("&")(any_mask) != 0)
+            if overflow_ids:
+                # Tiện nghi vượt quá 63 bit: tra bảng liên kết
+                options.append(model.amenity_items.any(Amenity.id.in_(overflow_ids)))
+            filters.append(or_(*options))
+
+        if required:
+            filters.insert(0, model.amenity_mask.op("&")(required) == required)
+        return filters
+
+    def backfill(self) -> int:
+        """Parse amenities strings of hotels/rooms without amenity links yet. Returns rows updated."""
+        updated = 0
+        for model, sync in ((Hotel, self.sync_hotel), (Room, self.sync_room)):
+            rows = self.db.query(model).filter(
+                model.amenities.isnot(None),
+                model.amenity_mask == 0,
+                ~model.amenity_items.any()
+            ).all()
+            for row in rows:
+                sync(row)
+                updated += 1
+        self.db.commit()
+        return updated
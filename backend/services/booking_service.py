@@ -1,13 +1,43 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, update, insert, exists
 from fastapi import HTTPException, status
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+from collections import Counter
+import os
 
 from models import Booking, User, Room, Hotel, BookingStatus, Payment, PaymentStatus
-from schemas import BookingCreate, BookingUpdate, BookingResponse
+from schemas import BookingCreate, BookingUpdate, BookingResponse, BookingByTypeCreate, BookingGroupCreate
 from services.room_service import RoomService
+from services.pricing_service import PricingService
+from services.allotment_service import AllotmentService, HOLDING_STATUSES
+from services.job_service import JobService
+from services.job_handlers import BOOKING_CONFIRMED_JOB
+from services.outbox_service import record_events
+from utils.db_retry import run_with_retry
+from utils.money import DEFAULT_CURRENCY, to_major
+from utils.query_cache import invalidate_availability
+
+# Thời gian giữ chỗ của booking PENDING trước khi sweeper trả phòng. Tắt mặc định (0 = giữ
+# tới khi admin xác nhận/hủy); chỉ bật khi có luồng tự thanh toán để khách hoàn tất kịp.
+BOOKING_HOLD_MINUTES = int(os.getenv("BOOKING_HOLD_MINUTES", "0"))
+BOOKING_HOLD_SWEEP_BATCH = int(os.getenv("BOOKING_HOLD_SWEEP_BATCH", "500"))
+
+
+def hold_deadline() -> Optional[datetime]:
+    """Expiry of a hold placed now"""
+    if BOOKING_HOLD_MINUTES <= 0:
+        return None
+    return datetime.utcnow() + timedelta(minutes=BOOKING_HOLD_MINUTES)
+
+
+def has_live_payments():
+    """Bookings with a pending or completed payment: never cancelled automatically"""
+    return exists().where(
+        Payment.booking_id == Booking.id,
+        Payment.payment_status.in_([PaymentStatus.PENDING, PaymentStatus.COMPLETED])
+    )
 
 
 class BookingService:
@@ -18,15 +48,13 @@ class BookingService:
         self.room_service = RoomService(db)
     
     def create_booking(self, booking_data: BookingCreate, current_user: User) -> Booking:
-        """Create a new booking"""
-        # Check if room exists
-        room = self.room_service.get_room_by_id(booking_data.room_id)
-        if not room:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Không tìm thấy phòng"
-            )
-        
+        """
+        Create a new booking.
+
+        Kiểm tra trùng lịch và INSERT nằm trong một transaction ngắn giữ khóa dòng
+        của phòng (RoomService.lock_room), nên hai request cùng phòng chạy tuần tự
+        còn các phòng khác không bị chặn; transaction bị hủy do deadlock được chạy lại.
+        """
         # Validate dates
         if booking_data.check_in_date >= booking_data.check_out_date:
             raise HTTPException(
@@ -40,43 +68,237 @@ class BookingService:
                 detail="Ngày check-in không thể trong quá khứ"
             )
         
-        # Check room availability
-        is_available = self.room_service.check_room_availability(
-            booking_data.room_id,
-            booking_data.check_in_date,
-            booking_data.check_out_date
-        )
+        # Generate booking reference
+        from routers.bookings import generate_booking_reference
         
-        if not is_available:
+        # Kết thúc transaction chỉ đọc để snapshot (REPEATABLE READ) bắt đầu sau khi khóa phòng
+        self.db.commit()
+        
+        def create() -> Booking:
+            # Check if room exists (and lock it until commit)
+            room = self.room_service.lock_room(booking_data.room_id)
+            if not room:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Không tìm thấy phòng"
+                )
+            
+            # Check room availability
+            if not room.is_available or self.room_service.has_overlapping_booking(
+                room.id, booking_data.check_in_date, booking_data.check_out_date
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Phòng không có sẵn trong thời gian đã chọn"
+                )
+            
+            # Validate guest count
+            if booking_data.guest_count > room.capacity:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Số lượng khách ({booking_data.guest_count}) vượt quá sức chứa của phòng ({room.capacity})"
+                )
+            
+            # Trừ allotment của loại phòng (nếu đã mở quỹ) để không bán vượt booking theo loại phòng
+            AllotmentService(self.db).charge(
+                room.hotel_id, room.room_type, booking_data.check_in_date, booking_data.check_out_date
+            )
+            
+            # Calculate total price from the rate calendar
+            nights = (booking_data.check_out_date - booking_data.check_in_date).days
+            total_price = PricingService(self.db).stay_total(
+                room, booking_data.check_in_date, booking_data.check_out_date
+            )
+            
+            # Create booking
+            db_booking = Booking(
+                user_id=current_user.id,
+                room_id=room.id,
+                hotel_id=room.hotel_id,
+                room_type=room.room_type,
+                check_in_date=booking_data.check_in_date,
+                check_out_date=booking_data.check_out_date,
+                guest_count=booking_data.guest_count,
+                total_nights=nights,
+                currency=DEFAULT_CURRENCY,
+                total_price_minor=total_price,
+                status=BookingStatus.PENDING,
+                expires_at=hold_deadline(),
+                booking_reference=generate_booking_reference(),
+                special_requests=booking_data.special_requests
+            )
+            
+            self.db.add(db_booking)
+            self.db.commit()
+            return db_booking
+        
+        db_booking = run_with_retry(self.db, create)
+        self.db.refresh(db_booking)
+        invalidate_availability(db_booking.hotel_id)
+        
+        return db_booking
+    
+    def create_group_booking(self, group_data: BookingGroupCreate, current_user: User) -> List[Booking]:
+        """
+        Book many rooms for the same dates, all or nothing.
+
+        Khóa tất cả phòng trong một truy vấn (theo thứ tự id), kiểm tra trùng lịch
+        bằng một truy vấn tập hợp, tính giá bằng một ma trận giá rồi chèn mọi booking
+        bằng một bulk INSERT dưới cùng một group_reference và commit một lần.
+        """
+        if group_data.check_in_date >= group_data.check_out_date:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Phòng không có sẵn trong thời gian đã chọn"
+                detail="Ngày check-in phải trước ngày check-out"
             )
         
-        # Validate guest count
-        if booking_data.guest_count > room.capacity:
+        if group_data.check_in_date < date.today():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Số lượng khách ({booking_data.guest_count}) vượt quá sức chứa của phòng ({room.capacity})"
+                detail="Ngày check-in không thể trong quá khứ"
             )
         
-        # Calculate total price
-        nights = (booking_data.check_out_date - booking_data.check_in_date).days
-        total_price = room.price_per_night * nights
+        guests = {item.room_id: item.guest_count for item in group_data.rooms}
+        if len(guests) != len(group_data.rooms):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Mỗi phòng chỉ được đặt một lần trong nhóm"
+            )
+        
+        from routers.bookings import generate_booking_reference
+        
+        check_in = datetime.combine(group_data.check_in_date, datetime.min.time())
+        check_out = datetime.combine(group_data.check_out_date, datetime.min.time())
+        nights = (group_data.check_out_date - group_data.check_in_date).days
+        
+        # Kết thúc transaction chỉ đọc để snapshot (REPEATABLE READ) bắt đầu sau khi khóa phòng
+        self.db.commit()
+        
+        def create() -> str:
+            rooms = self.room_service.lock_rooms(list(guests))
+            missing = sorted(set(guests) - {room.id for room in rooms})
+            if missing:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Không tìm thấy phòng: {', '.join(map(str, missing))}"
+                )
+            
+            booked = {
+                room_id for (room_id,) in self.room_service.booked_room_ids(check_in, check_out).filter(
+                    Booking.room_id.in_(list(guests))
+                ).distinct()
+            }
+            unavailable = [room.room_number for room in rooms if not room.is_available or room.id in booked]
+            if unavailable:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Phòng không có sẵn trong thời gian đã chọn: {', '.join(unavailable)}"
+                )
+            
+            too_small = [room.room_number for room in rooms if guests[room.id] > room.capacity]
+            if too_small:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Số lượng khách vượt quá sức chứa của phòng: {', '.join(too_small)}"
+                )
+            
+            allotments = AllotmentService(self.db)
+            per_type = Counter((room.hotel_id, room.room_type) for room in rooms)
+            for (hotel_id, room_type), count in sorted(per_type.items(), key=lambda item: (item[0][0], item[0][1].value)):
+                allotments.charge(hotel_id, room_type, check_in, check_out, rooms=count)
+            
+            totals = PricingService(self.db).stay_totals(rooms, check_in, check_out)
+            group_reference = "GRP-" + generate_booking_reference()
+            expires_at = hold_deadline()
+            self.db.execute(insert(Booking), [
+                {
+                    "user_id": current_user.id,
+                    "room_id": room.id,
+                    "hotel_id": room.hotel_id,
+                    "room_type": room.room_type,
+                    "check_in_date": check_in,
+                    "check_out_date": check_out,
+                    "guest_count": guests[room.id],
+                    "total_nights": nights,
+                    "currency": DEFAULT_CURRENCY,
+                    "total_price_minor": totals[room.id],
+                    "status": BookingStatus.PENDING,
+                    "expires_at": expires_at,
+                    "booking_reference": generate_booking_reference(),
+                    "group_reference": group_reference,
+                    "special_requests": group_data.special_requests,
+                }
+                for room in rooms
+            ])
+            record_events(self.db, "created", self.db.query(Booking).filter(
+                Booking.group_reference == group_reference
+            ))
+            self.db.commit()
+            return group_reference
+        
+        group_reference = run_with_retry(self.db, create)
+        bookings = self.db.query(Booking).filter(
+            Booking.group_reference == group_reference
+        ).order_by(Booking.id).all()
+        for hotel_id in {booking.hotel_id for booking in bookings}:
+            invalidate_availability(hotel_id)
+        
+        return bookings
+    
+    def create_booking_by_type(self, booking_data: BookingByTypeCreate, current_user: User) -> Booking:
+        """Book any room of a type from the hotel allotment; the room is assigned later"""
+        if booking_data.check_in_date >= booking_data.check_out_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày check-in phải trước ngày check-out"
+            )
+        
+        if booking_data.check_in_date < date.today():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày check-in không thể trong quá khứ"
+            )
+        
+        # Giá: phòng rẻ nhất của loại này đủ sức chứa
+        rooms = self.db.query(Room).filter(
+            and_(
+                Room.hotel_id == booking_data.hotel_id,
+                Room.room_type == booking_data.room_type,
+                Room.capacity >= booking_data.guest_count,
+                Room.is_available == True
+            )
+        ).all()
+        if not rooms:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Khách sạn không có loại phòng phù hợp"
+            )
+        totals = PricingService(self.db).stay_totals(rooms, booking_data.check_in_date, booking_data.check_out_date)
+        
+        AllotmentService(self.db).reserve(
+            booking_data.hotel_id,
+            booking_data.room_type,
+            booking_data.check_in_date,
+            booking_data.check_out_date
+        )
         
-        # Generate booking reference
         from routers.bookings import generate_booking_reference
         
-        # Create booking
+        check_in = datetime.combine(booking_data.check_in_date, datetime.min.time())
+        check_out = datetime.combine(booking_data.check_out_date, datetime.min.time())
         db_booking = Booking(
             user_id=current_user.id,
-            room_id=booking_data.room_id,
-            check_in_date=booking_data.check_in_date,
-            check_out_date=booking_data.check_out_date,
+            room_id=None,
+            hotel_id=booking_data.hotel_id,
+            room_type=booking_data.room_type,
+            check_in_date=check_in,
+            check_out_date=check_out,
             guest_count=booking_data.guest_count,
-            total_nights=nights,
-            total_price=total_price,
+            total_nights=(booking_data.check_out_date - booking_data.check_in_date).days,
+            currency=DEFAULT_CURRENCY,
+            total_price_minor=min(totals.values()),
             status=BookingStatus.PENDING,
+            expires_at=hold_deadline(),
             booking_reference=generate_booking_reference(),
             special_requests=booking_data.special_requests
         )
@@ -84,9 +306,166 @@ class BookingService:
         self.db.add(db_booking)
         self.db.commit()
         self.db.refresh(db_booking)
+        invalidate_availability(db_booking.hotel_id)
         
         return db_booking
     
+    def assign_room(self, booking_id: int, room_id: int, current_user: User) -> Booking:
+        """Assign a physical room to a room-type booking (admin only)"""
+        if current_user.role.value != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Chỉ admin mới có quyền gán phòng"
+            )
+        
+        booking = self.get_booking_by_id(booking_id)
+        
+        if not booking:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy booking"
+            )
+        
+        if booking.room_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chỉ gán phòng cho booking đặt theo loại phòng"
+            )
+        
+        if booking.status not in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Booking không còn hiệu lực"
+            )
+        
+        room = self.room_service.get_room_by_id(room_id)
+        if not room or room.hotel_id != booking.hotel_id or room.room_type != booking.room_type:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Phòng không thuộc khách sạn hoặc loại phòng của booking"
+            )
+        
+        if booking.guest_count > room.capacity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Số lượng khách ({booking.guest_count}) vượt quá sức chứa của phòng ({room.capacity})"
+            )
+        
+        # Kết thúc transaction chỉ đọc để snapshot (REPEATABLE READ) bắt đầu sau khi khóa phòng
+        self.db.commit()
+        
+        def assign() -> None:
+            locked = self.room_service.lock_room(room_id)
+            if not locked.is_available or self.room_service.has_overlapping_booking(
+                room_id, booking.check_in_date, booking.check_out_date, exclude_booking_id=booking_id
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Phòng không còn trống trong thời gian này"
+                )
+            
+            booking.room_id = room_id
+            booking.updated_at = datetime.utcnow()
+            self.db.commit()
+        
+        run_with_retry(self.db, assign)
+        self.db.refresh(booking)
+        invalidate_availability(booking.hotel_id)
+        
+        return booking
+    
+    def _transition_batches(
+        self,
+        from_status: BookingStatus,
+        to_status: BookingStatus,
+        due,
+        order_by,
+        batch_size: int,
+        now: datetime,
+        release_allotments: bool
+    ) -> int:
+        """
+        Move bookings matching ``due`` from one status to another, one committed batch at a time.
+
+        Mỗi lô lấy id theo index (status, ...) với FOR UPDATE SKIP LOCKED rồi chạy một
+        UPDATE có điều kiện cho cả lô, nên khóa chỉ giữ trong một lô ngắn và nhiều
+        scheduler / request chạy song song không chặn nhau. Allotment của các booking
+        đã chuyển được trả theo nhóm (hotel, room_type, khoảng ngày).
+        Returns the number of bookings moved.
+        """
+        moved = 0
+        while True:
+            if self.db.get_bind().dialect.name == "sqlite":
+                # SQLite bỏ qua FOR UPDATE: một UPDATE không đổi dữ liệu lấy write lock của DB
+                self.db.execute(
+                    update(Booking).where(Booking.status == from_status, due)
+                    .values(updated_at=Booking.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+            rows = self.db.query(Booking.id, Booking.hotel_id).filter(
+                Booking.status == from_status, due
+            ).order_by(order_by).limit(batch_size).with_for_update(skip_locked=True).all()
+            if not rows:
+                break
+            
+            ids = [row.id for row in rows]
+            moved += self.db.execute(
+                update(Booking)
+                .where(Booking.id.in_(ids), Booking.status == from_status, due)
+                .values(status=to_status, updated_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            
+            # Các dòng đã khóa ở trên nên dòng mang trạng thái mới là dòng vừa được chuyển
+            transitioned = self.db.query(Booking).filter(
+                Booking.id.in_(ids), Booking.status == to_status
+            ).populate_existing().all()
+            if release_allotments:
+                stays = Counter(
+                    (booking.hotel_id, booking.room_type, booking.check_in_date, booking.check_out_date)
+                    for booking in transitioned if booking.room_type is not None
+                )
+                allotments = AllotmentService(self.db)
+                for (hotel_id, room_type, check_in, check_out), count in stays.items():
+                    allotments.release(hotel_id, room_type, check_in, check_out, rooms=count)
+            
+            record_events(self.db, "updated", transitioned)
+            self.db.commit()
+            for hotel_id in {row.hotel_id for row in rows}:
+                invalidate_availability(hotel_id)
+            if len(rows) < batch_size:
+                break
+        return moved
+    
+    def expire_holds(self, batch_size: int = BOOKING_HOLD_SWEEP_BATCH, now: Optional[datetime] = None) -> int:
+        """Cancel PENDING bookings whose hold has expired and that have no live payment. Returns the number expired."""
+        now = now or datetime.utcnow()
+        return self._transition_batches(
+            BookingStatus.PENDING, BookingStatus.CANCELLED,
+            and_(Booking.expires_at <= now, ~has_live_payments()), Booking.expires_at,
+            batch_size, now, release_allotments=True
+        )
+    
+    def expire_stale_pending(self, batch_size: int = BOOKING_HOLD_SWEEP_BATCH, now: Optional[datetime] = None) -> int:
+        """
+        Cancel PENDING bookings whose stay is already over.
+        Bắt cả booking không có hạn giữ chỗ (expires_at NULL); bỏ qua booking đã có thanh toán.
+        """
+        now = now or datetime.utcnow()
+        return self._transition_batches(
+            BookingStatus.PENDING, BookingStatus.CANCELLED,
+            and_(Booking.check_out_date <= now, ~has_live_payments()), Booking.check_out_date,
+            batch_size, now, release_allotments=True
+        )
+    
+    def complete_stays(self, batch_size: int = BOOKING_HOLD_SWEEP_BATCH, now: Optional[datetime] = None) -> int:
+        """Mark CONFIRMED bookings as COMPLETED once their check-out date has passed"""
+        now = now or datetime.utcnow()
+        return self._transition_batches(
+            BookingStatus.CONFIRMED, BookingStatus.COMPLETED, Booking.check_out_date <= now, Booking.check_out_date,
+            batch_size, now, release_allotments=False
+        )
+    
     def get_booking_by_id(self, booking_id: int) -> Optional[Booking]:
         """Get booking by ID with related data"""
         return self.db.query(Booking).options(
@@ -121,7 +500,7 @@ class BookingService:
             query = query.filter(Booking.room_id == room_id)
         
         if hotel_id:
-            query = query.join(Room).filter(Room.hotel_id == hotel_id)
+            query = query.filter(Booking.hotel_id == hotel_id)
         
         if status:
             query = query.filter(Booking.status == status)
@@ -172,8 +551,25 @@ class BookingService:
         # Update fields
         update_data = booking_data.model_dump(exclude_unset=True)
         
+        # Trạng thái chỉ đổi qua confirm/cancel để giữ / trả allotment và kiểm tra phòng đúng một lần
+        new_status = update_data.pop('status', None)
+        if new_status is not None and new_status != booking.status and new_status not in (
+            BookingStatus.CONFIRMED, BookingStatus.CANCELLED
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chỉ có thể đổi trạng thái booking sang đã xác nhận hoặc đã hủy"
+            )
+        
         # If dates are being changed, validate and check availability
-        if 'check_in_date' in update_data or 'check_out_date' in update_data:
+        dates_changed = 'check_in_date' in update_data or 'check_out_date' in update_data
+        if dates_changed:
+            if booking.room_id is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Không thể đổi ngày booking chưa được gán phòng, hãy hủy và đặt lại"
+                )
+            
             new_check_in = update_data.get('check_in_date', booking.check_in_date)
             new_check_out = update_data.get('check_out_date', booking.check_out_date)
             
@@ -183,63 +579,67 @@ class BookingService:
                     detail="Ngày check-in phải trước ngày check-out"
                 )
             
-            if new_check_in < date.today():
+            if new_check_in.date() < date.today():
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Ngày check-in không thể trong quá khứ"
                 )
-            
-            # Check availability (excluding current booking)
-            conflicting_bookings = self.db.query(Booking).filter(
-                and_(
-                    Booking.room_id == booking.room_id,
-                    Booking.id != booking_id,
-                    Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PENDING]),
-                    or_(
-                        and_(
-                            Booking.check_in_date <= new_check_in,
-                            Booking.check_out_date > new_check_in
-                        ),
-                        and_(
-                            Booking.check_in_date < new_check_out,
-                            Booking.check_out_date >= new_check_out
-                        ),
-                        and_(
-                            Booking.check_in_date >= new_check_in,
-                            Booking.check_out_date <= new_check_out
-                        )
-                    )
-                )
-            ).count()
-            
-            if conflicting_bookings > 0:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Phòng không có sẵn trong thời gian mới"
-                )
-            
-            # Recalculate total price
-            nights = (new_check_out - new_check_in).days
-            update_data['total_price'] = booking.room.price_per_night * nights
         
         # Update guest count validation
-        if 'guest_count' in update_data:
+        if 'guest_count' in update_data and booking.room:
             if update_data['guest_count'] > booking.room.capacity:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Số lượng khách ({update_data['guest_count']}) vượt quá sức chứa của phòng ({booking.room.capacity})"
                 )
         
-        # Apply updates
-        for field, value in update_data.items():
-            if hasattr(booking, field) and value is not None:
-                setattr(booking, field, value)
-        
-        booking.updated_at = datetime.utcnow()
-        
-        self.db.commit()
-        self.db.refresh(booking)
-        
+        if dates_changed:
+            # Kết thúc transaction chỉ đọc để snapshot (REPEATABLE READ) bắt đầu sau khi khóa phòng
+            self.db.commit()
+        
+        def apply() -> None:
+            if dates_changed:
+                # Check availability (excluding current booking) while holding the room lock
+                room = self.room_service.lock_room(booking.room_id)
+                if self.room_service.has_overlapping_booking(
+                    room.id, new_check_in, new_check_out, exclude_booking_id=booking_id
+                ):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Phòng không có sẵn trong thời gian mới"
+                    )
+                
+                # Chuyển phần allotment đang giữ sang khoảng ngày mới
+                if booking.room_type is not None and booking.status in HOLDING_STATUSES:
+                    allotments = AllotmentService(self.db)
+                    allotments.release(booking.hotel_id, booking.room_type, booking.check_in_date, booking.check_out_date)
+                    allotments.charge(booking.hotel_id, booking.room_type, new_check_in, new_check_out)
+                
+                # Recalculate total price
+                update_data['total_nights'] = (new_check_out - new_check_in).days
+                update_data['total_price_minor'] = PricingService(self.db).stay_total(
+                    room, new_check_in, new_check_out
+                )
+            
+            # Apply updates
+            for field, value in update_data.items():
+                if hasattr(booking, field) and value is not None:
+                    setattr(booking, field, value)
+            
+            if booking.status != BookingStatus.PENDING:
+                booking.expires_at = None
+            booking.updated_at = datetime.utcnow()
+            self.db.commit()
+        
+        if update_data:
+            run_with_retry(self.db, apply)
+            self.db.refresh(booking)
+            invalidate_availability(booking.hotel_id)
+        
+        if new_status == BookingStatus.CANCELLED and booking.status != BookingStatus.CANCELLED:
+            return self.cancel_booking(booking_id, current_user)
+        if new_status == BookingStatus.CONFIRMED and booking.status != BookingStatus.CONFIRMED:
+            return self.confirm_booking(booking_id, current_user)
         return booking
     
     def cancel_booking(self, booking_id: int, current_user: User) -> Booking:
@@ -267,17 +667,36 @@ class BookingService:
             )
         
         # Can't cancel bookings that have already started
-        if booking.check_in_date <= date.today():
+        if booking.check_in_date.date() <= date.today():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Không thể hủy booking đã bắt đầu"
             )
         
-        booking.status = BookingStatus.CANCELLED
-        booking.updated_at = datetime.utcnow()
+        # UPDATE có điều kiện: chỉ một trong request hủy / sweeper chuyển được booking và trả allotment
+        cancelled = self.db.execute(
+            update(Booking)
+            .where(Booking.id == booking_id, Booking.status.in_(HOLDING_STATUSES))
+            .values(status=BookingStatus.CANCELLED, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not cancelled:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Booking không còn ở trạng thái có thể hủy"
+            )
         
+        if booking.room_type is not None:
+            AllotmentService(self.db).release(
+                booking.hotel_id, booking.room_type, booking.check_in_date, booking.check_out_date
+            )
+        
+        self.db.refresh(booking)
+        record_events(self.db, "updated", [booking])
         self.db.commit()
         self.db.refresh(booking)
+        invalidate_availability(booking.hotel_id)
         
         return booking
     
@@ -303,8 +722,14 @@ class BookingService:
                 detail="Chỉ có thể xác nhận booking đang chờ"
             )
         
-        # Check if room is still available
-        is_available = self.room_service.check_room_availability(
+        if booking.expires_at is not None and booking.expires_at <= datetime.utcnow():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Booking đã hết hạn giữ chỗ"
+            )
+        
+        # Check if room is still available (room-type bookings hold their allotment)
+        is_available = booking.room_id is None or self.room_service.check_room_availability(
             booking.room_id,
             booking.check_in_date,
             booking.check_out_date,
@@ -318,10 +743,13 @@ class BookingService:
             )
         
         booking.status = BookingStatus.CONFIRMED
+        booking.expires_at = None
         booking.updated_at = datetime.utcnow()
         
         self.db.commit()
         self.db.refresh(booking)
+        invalidate_availability(booking.hotel_id)
+        JobService(self.db).enqueue(BOOKING_CONFIRMED_JOB, {"booking_id": booking.id})
         
         return booking
     
@@ -350,8 +778,14 @@ class BookingService:
                 detail="Không thể xóa booking có thanh toán. Hãy hủy booking thay vì xóa."
             )
         
+        hotel_id = booking.hotel_id
+        if booking.room_type is not None and booking.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
+            AllotmentService(self.db).release(
+                booking.hotel_id, booking.room_type, booking.check_in_date, booking.check_out_date
+            )
         self.db.delete(booking)
         self.db.commit()
+        invalidate_availability(hotel_id)
         
         return True
     
@@ -360,7 +794,7 @@ class BookingService:
         query = self.db.query(Booking)
         
         if hotel_id:
-            query = query.join(Room).filter(Room.hotel_id == hotel_id)
+            query = query.filter(Booking.hotel_id == hotel_id)
         
         total_bookings = query.count()
         confirmed_bookings = query.filter(Booking.status == BookingStatus.CONFIRMED).count()
@@ -370,7 +804,8 @@ class BookingService:
         # Total revenue
         total_revenue = query.filter(
             Booking.status == BookingStatus.CONFIRMED
-        ).with_entities(func.sum(Booking.total_price)).scalar() or 0
+        ).with_entities(func.sum(Booking.total_price_minor)).scalar() or 0
+        total_revenue = to_major(total_revenue, DEFAULT_CURRENCY)
         
         # Monthly bookings
         current_month = date.today().replace(day=1)
@@ -1,12 +1,19 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from fastapi import HTTPException, status
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Tuple
+from datetime import datetime, date
 import os
 from pathlib import Path
 
 from utils.gdrive import ensure_folder, list_files
+from utils.fulltext import hotel_match
+from services.amenity_service import AmenityService
+from utils.suggest import suggest_index
+from utils.query_cache import invalidate_hotel
+from utils.textfold import fill_hotel_search_columns, prefix_pattern
+from utils.geo import encode as geohash_encode, covering_prefixes, haversine_km
+from services.room_service import RoomService, sold_out_clause
 from models import Hotel, User, Room
 from schemas import HotelCreate, HotelUpdate, HotelResponse
 from utils.gdrive import get_or_create_root
@@ -52,12 +59,19 @@ class HotelService:
             email=hotel_data.email,
             website=hotel_data.website,
             star_rating=hotel_data.star_rating,
+            latitude=hotel_data.latitude,
+            longitude=hotel_data.longitude,
             amenities=hotel_data.amenities
         )
+        self._update_geohash(db_hotel)
+        fill_hotel_search_columns(db_hotel)
         
         self.db.add(db_hotel)
+        AmenityService(self.db).sync_hotel(db_hotel)
         self.db.commit()
         self.db.refresh(db_hotel)
+        suggest_index.upsert_hotel(db_hotel)
+        invalidate_hotel(db_hotel.id)
         
         return db_hotel
     
@@ -83,26 +97,22 @@ class HotelService:
         
         # Apply filters
         if city:
-            query = query.filter(Hotel.city.ilike(f"%{city}%"))
+            query = query.filter(Hotel.city_search.like(prefix_pattern(city), escape="\\"))
         
         if country:
-            query = query.filter(Hotel.country.ilike(f"%{country}%"))
+            query = query.filter(Hotel.country_search.like(prefix_pattern(country), escape="\\"))
         
         if min_rating:
             query = query.filter(Hotel.star_rating >= min_rating)
         
+        order_by = [Hotel.id.desc()]
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Hotel.name.ilike(search_term),
-                    Hotel.description.ilike(search_term),
-                    Hotel.city.ilike(search_term),
-                    Hotel.address.ilike(search_term)
-                )
-            )
+            # Full-text index, sắp xếp theo độ liên quan
+            ranked = hotel_match(self.db, search)
+            query = query.join(ranked, ranked.c.id == Hotel.id)
+            order_by.insert(0, ranked.c.score.desc())
         
-        hotels = query.order_by(Hotel.id.desc()).offset(skip).limit(limit).all()
+        hotels = query.order_by(*order_by).offset(skip).limit(limit).all()
         
         # Add images to each hotel
         for hotel in hotels:
@@ -150,10 +160,20 @@ class HotelService:
             if hasattr(hotel, field) and value is not None:
                 setattr(hotel, field, value)
         
+        if update_data.get("amenities") is not None:
+            AmenityService(self.db).sync_hotel(hotel)
+        
+        if "latitude" in update_data or "longitude" in update_data:
+            self._update_geohash(hotel)
+        
+        fill_hotel_search_columns(hotel)
+        
         hotel.updated_at = datetime.utcnow()
         
         self.db.commit()
         self.db.refresh(hotel)
+        suggest_index.upsert_hotel(hotel)
+        invalidate_hotel(hotel.id)
         
         return hotel
     
@@ -185,9 +205,69 @@ class HotelService:
         
         self.db.delete(hotel)
         self.db.commit()
+        suggest_index.remove_hotel(hotel_id)
+        invalidate_hotel(hotel_id)
         
         return True
     
+    @staticmethod
+    def _update_geohash(hotel: Hotel) -> None:
+        """Recompute hotel.geohash from its coordinates"""
+        if hotel.latitude is not None and hotel.longitude is not None:
+            hotel.geohash = geohash_encode(hotel.latitude, hotel.longitude)
+        else:
+            hotel.geohash = None
+    
+    def get_nearby_hotels(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float = 5,
+        check_in_date: Optional[date] = None,
+        check_out_date: Optional[date] = None,
+        guests: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Tuple[Hotel, float]]:
+        """Get hotels within radius_km of a point, sorted by distance"""
+        query = self.db.query(Hotel).filter(Hotel.geohash.isnot(None))
+        
+        # Range scan trên index geohash cho các ô phủ vòng tròn
+        prefixes = covering_prefixes(latitude, longitude, radius_km)
+        if prefixes != [""]:
+            query = query.filter(or_(*[Hotel.geohash.like(f"{prefix}%") for prefix in prefixes]))
+        
+        # Chỉ khách sạn còn phòng trống trong khoảng ngày
+        if check_in_date and check_out_date:
+            if check_in_date >= check_out_date:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Ngày check-in phải trước ngày check-out"
+                )
+            
+            booked_room_ids = RoomService(self.db).booked_room_ids(check_in_date, check_out_date)
+            available_rooms = self.db.query(Room.hotel_id).filter(
+                Room.is_available == True,
+                ~Room.id.in_(booked_room_ids),
+                ~sold_out_clause(check_in_date, check_out_date)
+            )
+            if guests:
+                available_rooms = available_rooms.filter(Room.capacity >= guests)
+            query = query.filter(Hotel.id.in_(available_rooms))
+        
+        results = []
+        for hotel in query.all():
+            distance = haversine_km(latitude, longitude, hotel.latitude, hotel.longitude)
+            if distance <= radius_km:
+                results.append((hotel, distance))
+        
+        results.sort(key=lambda item: item[1])
+        results = results[:limit]
+        
+        for hotel, _ in results:
+            hotel.images = self._get_hotel_images(hotel.id)
+        
+        return results
+    
     def _get_hotel_images(self, hotel_id: int) -> List[str]:
         """Get hotel images from media directory"""
         parent = os.getenv("GDRIVE_PARENT_HOTELS") or get_or_create_root("Hotels")
@@ -252,17 +332,19 @@ class HotelService:
     def search_hotels(self, search_params: dict) -> List[Hotel]:
         """Advanced hotel search"""
         query = self.db.query(Hotel)
+        order_by = [Hotel.id.desc()]
         
         # Location search
         if search_params.get("location"):
-            location = f"%{search_params['location']}%"
-            query = query.filter(
-                or_(
-                    Hotel.city.ilike(location),
-                    Hotel.country.ilike(location),
-                    Hotel.address.ilike(location)
-                )
-            )
+            ranked = hotel_match(self.db, search_params["location"], location_only=True)
+            query = query.join(ranked, ranked.c.id == Hotel.id)
+            order_by.insert(0, ranked.c.score.desc())
+        
+        # Free-text search
+        if search_params.get("search"):
+            ranked_text = hotel_match(self.db, search_params["search"])
+            query = query.join(ranked_text, ranked_text.c.id == Hotel.id)
+            order_by.insert(0, ranked_text.c.score.desc())
         
         # Rating filter
         if search_params.get("min_rating"):
@@ -270,7 +352,8 @@ class HotelService:
         
         # Amenities filter
         if search_params.get("amenities"):
-            for amenity in search_params["amenities"]:
-                query = query.filter(Hotel.amenities.ilike(f"%{amenity}%"))
+            query = query.filter(
+                *AmenityService(self.db).amenity_filters(Hotel, search_params["amenities"])
+            )
         
-        return query.all() 
\ No newline at end of file
+        return query.order_by(*order_by).all() 
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""Handlers of background jobs (đăng ký bằng @job_handler, chạy bởi JobWorker).
+
+Ảnh upload được ghi tạm vào MEDIA_ROOT/pending rồi mới đẩy lên Google Drive
+trong job, nên request upload chỉ tốn thời gian ghi đĩa + INSERT job. File tạm
+bị xóa khi job xong: client theo dõi job (GET /api/v1/jobs/{id}) và lấy link
+Drive cố định trong ``result``. Worker chạy riêng (python -m backend.worker) cần
+dùng chung thư mục MEDIA_ROOT.
+"""
+from pathlib import Path
+from typing import Optional
+import os
+import uuid
+import datetime
+
+from sqlalchemy.orm import Session
+
+from models import Booking, User
+from services.job_service import JobService, job_handler
+from services.payment_service import PaymentService
+from utils.query_cache import invalidate_hotel, invalidate_room
+
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+PENDING_UPLOADS_DIR = "pending"
+
+DRIVE_UPLOAD_JOB = "drive.upload_image"
+BOOKING_CONFIRMED_JOB = "booking.confirmed"
+PAYMENT_BALANCE_VERIFY_JOB = "payments.verify_balances"
+PAYMENT_WEBHOOK_JOB = "payments.process_webhooks"
+
+
+def enqueue_image_upload(
+    db: Session,
+    scope: str,
+    target_id: int,
+    original_name: Optional[str],
+    content: bytes,
+    hotel_id: Optional[int] = None
+) -> dict:
+    """
+    Spool an uploaded image to disk and enqueue its Drive upload.
+    scope is "hotels" or "rooms". Returns the job id and the URL to poll for the Drive link.
+    """
+    ts = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    filename = f"{ts}_{uuid.uuid4().hex}{Path(original_name or '').suffix}"
+    relative = Path(PENDING_UPLOADS_DIR) / scope / str(target_id) / filename
+    path = Path(MEDIA_ROOT) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+    job = JobService(db).enqueue(DRIVE_UPLOAD_JOB, {
+        "scope": scope,
+        "target_id": target_id,
+        "hotel_id": hotel_id,
+        "path": str(relative),
+        "filename": filename,
+    })
+    return {"job_id": job.id, "filename": filename, "status_url": f"/api/v1/jobs/{job.id}"}
+
+
+@job_handler(DRIVE_UPLOAD_JOB)
+def upload_image_to_drive(db: Session, payload: dict) -> dict:
+    """Upload a spooled image to the Drive folder of its hotel/room, then delete the spool file"""
+    from utils.gdrive import ensure_folder, upload_bytes, list_files, get_or_create_root
+
+    path = Path(MEDIA_ROOT) / payload["path"]
+    if payload["scope"] == "hotels":
+        parent = os.getenv("GDRIVE_PARENT_HOTELS") or get_or_create_root("Hotels")
+    else:
+        parent = os.getenv("GDRIVE_PARENT_ROOMS") or get_or_create_root("Rooms")
+    folder = ensure_folder(str(payload["target_id"]), parent)
+
+    # At-least-once: lần chạy trước có thể đã upload xong nhưng chưa kịp ghi DONE
+    link = next((f["link"] for f in list_files(folder) if f["name"] == payload["filename"]), None)
+    if link is None:
+        if not path.exists():
+            raise FileNotFoundError(f"Không còn file tạm {payload['path']}")
+        _, link = upload_bytes(path.read_bytes(), payload["filename"], folder)
+    path.unlink(missing_ok=True)
+
+    if payload["scope"] == "hotels":
+        invalidate_hotel(payload["target_id"])
+    else:
+        invalidate_room(payload["hotel_id"], payload["target_id"])
+    return {"link": link}
+
+
+@job_handler(BOOKING_CONFIRMED_JOB)
+def notify_booking_confirmed(db: Session, payload: dict) -> None:
+    """Confirmation notice for the guest (điểm nối gửi email xác nhận)"""
+    booking = db.get(Booking, payload["booking_id"])
+    if booking is None:
+        return
+    user = db.get(User, booking.user_id)
+    print(f"📧 Booking {booking.booking_reference} đã được xác nhận, thông báo tới {user.email if user else booking.user_id}")
+
+
+@job_handler(PAYMENT_BALANCE_VERIFY_JOB)
+def verify_payment_balances(db: Session, payload: dict) -> None:
+    """Walk all bookings in batches and repair amount_paid / amount_pending that drifted from payments"""
+    service = PaymentService(db)
+    after_id, fixed = payload.get("after_id", 0), 0
+    while after_id is not None:
+        batch_fixed, after_id = service.verify_balances(after_id)
+        fixed += batch_fixed
+    if fixed:
+        print(f"🧾 Đã sửa số dư thanh toán của {fixed} booking")
+
+
+@job_handler(PAYMENT_WEBHOOK_JOB)
+def process_payment_webhooks(db: Session, payload: dict) -> None:
+    """Apply received gateway webhook events in batches"""
+    from services.webhook_service import WebhookService
+
+    handled = WebhookService(db).process_pending()
+    if handled:
+        print(f"💳 Đã xử lý {handled} sự kiện webhook thanh toán")
@@ -0,0 +1,207 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from fastapi import HTTPException, status
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import socket
+import threading
+import traceback
+
+from models import Job, JobStatus
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+# Job RUNNING quá thời hạn này (worker chết giữa chừng) được chạy lại
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+
+JobHandler = Callable[[Session, dict], Optional[dict]]
+_handlers: Dict[str, JobHandler] = {}
+
+# Báo cho worker trong cùng tiến trình có job mới, khỏi chờ hết chu kỳ poll
+jobs_available = threading.Event()
+
+
+def job_handler(kind: str):
+    """Register the function running jobs of this kind: handler(db, payload) -> optional JSON result"""
+    def register(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds before retry number ``attempts`` (exponential, capped, with jitter)"""
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobService:
+    """
+    DB-backed job queue (bảng jobs).
+
+    Service gọi ``enqueue`` SAU khi commit dữ liệu chính; worker lấy job bằng
+    FOR UPDATE SKIP LOCKED theo index (status, run_at). Ngữ nghĩa at-least-once:
+    job lỗi được chạy lại với backoff, job của worker chết được chạy lại khi hết
+    lease, nên handler phải idempotent.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        run_at: Optional[datetime] = None,
+        max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> Job:
+        """Insert and commit a job"""
+        job = Job(
+            kind=kind,
+            payload=json.dumps(payload, ensure_ascii=False, default=str),
+            status=JobStatus.QUEUED,
+            attempts=0,
+            max_attempts=max_attempts,
+            run_at=run_at or datetime.utcnow()
+        )
+        self.db.add(job)
+        self.db.commit()
+        jobs_available.set()
+        return job
+
+    def get_status(self, job_id: int) -> dict:
+        """Status of a job with its decoded result (theo dõi job từ client)"""
+        job = self.db.get(Job, job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy job"
+            )
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "last_error": job.last_error.splitlines()[-1] if job.last_error else None,
+            "result": json.loads(job.result) if job.result else None,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at,
+        }
+
+    def claim(self, worker_id: str, limit: int = JOB_BATCH_SIZE) -> List[Job]:
+        """Take up to ``limit`` due jobs (queued, or running with an expired lease) for this worker"""
+        now = datetime.utcnow()
+        jobs = self.db.query(Job).filter(
+            or_(
+                and_(Job.status == JobStatus.QUEUED, Job.run_at <= now),
+                and_(Job.status == JobStatus.RUNNING, Job.locked_at <= now - timedelta(seconds=JOB_LEASE_SECONDS))
+            )
+        ).order_by(Job.run_at).limit(limit).with_for_update(skip_locked=True).all()
+        for job in jobs:
+            job.status = JobStatus.RUNNING
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.attempts += 1
+        self.db.commit()
+        return jobs
+
+    def run(self, job: Job) -> bool:
+        """Run one claimed job and record the outcome. Returns True on success."""
+        handler = _handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"Không có handler cho job '{job.kind}'")
+            result = handler(self.db, json.loads(job.payload))
+        except Exception:
+            self.db.rollback()
+            self._fail(job, traceback.format_exc(limit=5), permanent=handler is None)
+            return False
+        # Thay đổi DB của handler và trạng thái DONE được commit cùng nhau
+        job.status = JobStatus.DONE
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        job.result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        self.db.commit()
+        return True
+
+    def _fail(self, job: Job, error: str, permanent: bool = False) -> None:
+        job.last_error = error[-4000:]
+        if permanent or job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff_delay(job.attempts))
+        job.locked_by = None
+        job.locked_at = None
+        self.db.commit()
+
+    def purge_finished(self, older_than: timedelta, batch_size: int = 1000) -> int:
+        """Delete DONE jobs finished before now - older_than. Returns the number deleted."""
+        cutoff = datetime.utcnow() - older_than
+        ids = [job_id for (job_id,) in self.db.query(Job.id).filter(
+            Job.status == JobStatus.DONE, Job.finished_at <= cutoff
+        ).limit(batch_size)]
+        if not ids:
+            return 0
+        deleted = self.db.query(Job).filter(Job.id.in_(ids)).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
+
+
+class JobWorker:
+    """Polls the jobs table and runs due jobs; used by ``python -m backend.worker`` and in-process"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        worker_id: Optional[str] = None,
+        batch_size: int = JOB_BATCH_SIZE,
+        poll_seconds: float = JOB_POLL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+
+    def run_once(self) -> int:
+        """
+        Run up to ``batch_size`` due jobs. Returns the number of jobs run.
+        Mỗi job được claim ngay trước khi chạy, nên lease của job sau không bị job chậm
+        phía trước ăn mất.
+        """
+        db = self.session_factory()
+        try:
+            service = JobService(db)
+            ran = 0
+            while ran < self.batch_size:
+                jobs = service.claim(self.worker_id, 1)
+                if not jobs:
+                    break
+                job = jobs[0]
+                if service.run(job):
+                    print(f"✅ Job {job.id} ({job.kind}) xong")
+                else:
+                    print(f"⚠️ Job {job.id} ({job.kind}) lỗi lần {job.attempts}: {job.last_error.splitlines()[-1]}")
+                ran += 1
+            return ran
+        finally:
+            db.close()
+
+    def run_forever(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Lỗi job worker: {e}")
+                ran = 0
+            if ran < self.batch_size:
+                jobs_available.wait(self.poll_seconds)
+                jobs_available.clear()
@@ -0,0 +1,257 @@
+"""Transactional outbox + change feed of bookings, rooms and payments.
+
+Mỗi lần flush có Booking / Room / Payment được tạo, sửa hoặc xóa qua ORM, listener
+``after_flush`` ghi thêm một dòng outbox_events trong CÙNG transaction, nên sự
+kiện có khi và chỉ khi thay đổi được commit. Các UPDATE/INSERT hàng loạt (không
+đi qua unit of work) gọi ``record_events`` trước khi commit.
+
+id tự tăng của outbox_events là sequence của feed. Transaction commit không theo
+thứ tự id, nên ``read`` dừng trước "lỗ" id (transaction giữ id đó có thể chưa
+commit). Tuổi của lỗ được tính từ lúc một reader THẤY nó lần đầu (lưu trong
+outbox_gaps nên mọi tiến trình dùng chung), không từ created_at của dòng sau nó:
+mọi id trong lỗ đã được cấp trước lúc đó, nên sau OUTBOX_GAP_SECONDS (lớn hơn
+transaction ghi dài nhất) transaction giữ id chắc chắn đã kết thúc và lỗ còn lại
+là do rollback, được bỏ qua.
+
+Sau commit, sự kiện còn được đẩy vào event_broker cho SSE stream của tiến trình này.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, date, timedelta
+import asyncio
+import enum
+import json
+import os
+
+from models import Booking, Room, Payment, OutboxEvent, OutboxGap
+from utils.event_broker import StreamMessage, event_broker
+
+# Phải lớn hơn thời gian của transaction ghi dài nhất (các transaction ghi sự kiện đều ngắn)
+OUTBOX_GAP_SECONDS = float(os.getenv("OUTBOX_GAP_SECONDS", "10"))
+# Long-poll kiểm tra DB ít nhất mỗi chừng này giây (thay đổi từ tiến trình khác)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+_WAKE_SECONDS = 0.05
+
+ENTITY_TYPES = {Booking: "booking", Room: "room", Payment: "payment"}
+
+# Tăng sau mỗi commit có sự kiện trong tiến trình này, để long-poll trả lời ngay
+outbox_version = 0
+
+def _gaps_settled(db: Session, first_missing_ids: List[int]) -> Dict[int, bool]:
+    """
+    Whether each gap (keyed by its first missing id) has been seen for longer than OUTBOX_GAP_SECONDS.
+    Lỗ mới được ghi vào outbox_gaps trong transaction riêng (caller không còn dùng snapshot cũ).
+    """
+    if not first_missing_ids:
+        return {}
+    now = datetime.utcnow()
+
+    def first_seen() -> Dict[int, datetime]:
+        return dict(db.query(OutboxGap.first_missing_id, OutboxGap.first_seen_at).filter(
+            OutboxGap.first_missing_id.in_(first_missing_ids)
+        ).all())
+
+    seen = first_seen()
+    new = [gap_id for gap_id in first_missing_ids if gap_id not in seen]
+    if new:
+        db.rollback()
+        try:
+            db.execute(insert(OutboxGap), [{"first_missing_id": gap_id, "first_seen_at": now} for gap_id in new])
+            db.commit()
+        except IntegrityError:
+            # Reader khác vừa ghi cùng lỗ: dùng thời điểm của nó
+            db.rollback()
+        seen = first_seen()
+    limit = timedelta(seconds=OUTBOX_GAP_SECONDS)
+    return {gap_id: now - seen.get(gap_id, now) >= limit for gap_id in first_missing_ids}
+
+
+def _json_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def snapshot(obj) -> dict:
+    """Loaded column values of an entity, JSON-ready (không phát SELECT giữa lúc flush)"""
+    state = inspect(obj)
+    return {
+        attr.key: _json_value(state.dict[attr.key])
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+def _event_row(obj, action: str, now: datetime) -> dict:
+    entity_type = ENTITY_TYPES[type(obj)]
+    return {
+        "entity_type": entity_type,
+        "entity_id": obj.id,
+        "event_type": f"{entity_type}.{action}",
+        "hotel_id": getattr(obj, "hotel_id", None),
+        "payload": json.dumps(snapshot(obj), ensure_ascii=False),
+        "created_at": now,
+    }
+
+
+def record_events(db: Session, action: str, entities: Iterable) -> None:
+    """Append events for entities changed outside the ORM unit of work (bulk INSERT/UPDATE)"""
+    now = datetime.utcnow()
+    rows = [_event_row(obj, action, now) for obj in entities]
+    if rows:
+        db.execute(insert(OutboxEvent), rows)
+        db.info.setdefault("outbox_rows", []).extend(rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_changes(session: Session, flush_context) -> None:
+    now = datetime.utcnow()
+    rows = []
+    for obj in session.new:
+        if type(obj) in ENTITY_TYPES:
+            rows.append(_event_row(obj, "created", now))
+    for obj in session.dirty:
+        if type(obj) in ENTITY_TYPES and session.is_modified(obj, include_collections=False):
+            rows.append(_event_row(obj, "updated", now))
+    for obj in session.deleted:
+        if type(obj) in ENTITY_TYPES:
+            rows.append(_event_row(obj, "deleted", now))
+    if rows:
+        session.connection().execute(insert(OutboxEvent), rows)
+        session.info.setdefault("outbox_rows", []).extend(rows)
+
+
+def stream_messages(row: dict) -> List[StreamMessage]:
+    """SSE messages for one committed outbox row (GET /api/v1/stream)"""
+    entity_type = row["entity_type"]
+    payload = json.loads(row["payload"])
+    if entity_type == "payment":
+        return [StreamMessage("payment", {"event_type": row["event_type"], "payment": payload},
+                              hotel_id=row["hotel_id"], admin_only=True)]
+    
+    # Mọi thay đổi booking/phòng đều có thể đổi tình trạng trống của phòng
+    availability = {
+        "event_type": row["event_type"],
+        "hotel_id": row["hotel_id"],
+        "room_id": payload.get("id") if entity_type == "room" else payload.get("room_id"),
+        "room_type": payload.get("room_type"),
+    }
+    if entity_type == "room":
+        availability["is_available"] = payload.get("is_available")
+    else:
+        availability.update(
+            status=payload.get("status"),
+            check_in_date=payload.get("check_in_date"),
+            check_out_date=payload.get("check_out_date"),
+        )
+    messages = [StreamMessage("availability", availability, hotel_id=row["hotel_id"],
+                              room_id=availability["room_id"], room_type=availability["room_type"])]
+    if entity_type == "booking":
+        messages.append(StreamMessage("booking", {"event_type": row["event_type"], "booking": payload},
+                                      hotel_id=row["hotel_id"], room_id=payload.get("room_id"),
+                                      room_type=payload.get("room_type"), admin_only=True))
+    return messages
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed(session: Session) -> None:
+    global outbox_version
+    rows = session.info.pop("outbox_rows", None)
+    if rows:
+        outbox_version += 1
+        if event_broker.subscriber_count():
+            event_broker.publish([message for row in rows for message in stream_messages(row)])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("outbox_rows", None)
+
+
+def event_to_dict(row: OutboxEvent) -> dict:
+    return {
+        "id": row.id,
+        "entity_type": row.entity_type,
+        "entity_id": row.entity_id,
+        "event_type": row.event_type,
+        "hotel_id": row.hotel_id,
+        "payload": json.loads(row.payload),
+        "created_at": row.created_at,
+    }
+
+
+class OutboxService:
+    """Reading and pruning of the outbox"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def read(
+        self,
+        after: int,
+        limit: int = 100,
+        entity_type: Optional[str] = None,
+        hotel_id: Optional[int] = None
+    ) -> Tuple[List[dict], int]:
+        """
+        Committed events after ``after``, in sequence order.
+        Returns (events, cursor): truyền cursor làm ``after`` của lần gọi sau. Với bộ lọc,
+        cursor vẫn tiến qua các sự kiện bị lọc nên lần sau không đọc lại chúng.
+        """
+        try:
+            rows = [event_to_dict(row) for row in self.db.query(OutboxEvent).filter(
+                OutboxEvent.id > after
+            ).order_by(OutboxEvent.id).limit(limit)]
+            # Ghi nhận mọi lỗ của trang ngay, để đồng hồ của các lỗ phía sau chạy song song
+            gap_starts = {
+                row["id"]: previous + 1
+                for previous, row in zip([after] + [r["id"] for r in rows], rows)
+                if row["id"] != previous + 1
+            }
+            settled = _gaps_settled(self.db, list(gap_starts.values()))
+            events = []
+            cursor = after
+            for row in rows:
+                if row["id"] in gap_starts and not settled[gap_starts[row["id"]]]:
+                    break
+                cursor = row["id"]
+                if entity_type and row["entity_type"] != entity_type:
+                    continue
+                if hotel_id is not None and row["hotel_id"] != hotel_id:
+                    continue
+                events.append(row)
+            return events, cursor
+        finally:
+            # Kết thúc snapshot (REPEATABLE READ) và trả kết nối về pool giữa các lần poll
+            self.db.rollback()
+
+    def last_id(self) -> int:
+        try:
+            return self.db.query(OutboxEvent.id).order_by(OutboxEvent.id.desc()).limit(1).scalar() or 0
+        finally:
+            self.db.rollback()
+
+    def purge(self, older_than: timedelta, batch_size: int = 1000) -> int:
+        """Delete events (and recorded gaps) older than now - older_than. Returns the number of events deleted."""
+        cutoff = datetime.utcnow() - older_than
+        self.db.query(OutboxGap).filter(OutboxGap.first_seen_at <= cutoff).delete(synchronize_session=False)
+        ids = [event_id for (event_id,) in self.db.query(OutboxEvent.id).filter(
+            OutboxEvent.created_at <= cutoff
+        ).limit(batch_size)]
+        deleted = 0
+        if ids:
+            deleted = self.db.query(OutboxEvent).filter(OutboxEvent.id.in_(ids)).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
+
+
+async def wait_for_events(version: int, seconds: float) -> None:
+    """Sleep up to ``seconds``, waking early when this process commits new events"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    while outbox_version == version and loop.time() < deadline:
+        await asyncio.sleep(min(_WAKE_SECONDS, max(deadline - loop.time(), 0)))
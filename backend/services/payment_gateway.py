@@ -0,0 +1,182 @@
+"""Payment gateway adapters.
+
+Mỗi cổng thanh toán là một ``PaymentGateway``: gửi yêu cầu thu tiền (``charge``), kiểm tra
+chữ ký và chuẩn hóa webhook (``parse_events``) về dạng chung
+
+    {"event_id", "event_type", "transaction_id", "amount_minor", "currency", "occurred_at"}
+
+với event_type là payment.succeeded hoặc payment.failed. Kết quả thu tiền chỉ đến qua
+webhook (POST /api/v1/payments/webhooks/{gateway}), không đổi trạng thái đồng bộ.
+
+``SimulatedGateway`` là cổng giả lập chạy trong tiến trình: sau độ trễ ngẫu nhiên gửi
+webhook đã ký tới PAYMENT_WEBHOOK_URL, với tỷ lệ thất bại và tỷ lệ gửi trùng cấu hình
+được, để thử tải luồng thanh toán khi không có cổng thật. Nó "thanh toán" mà không thu
+tiền nên chỉ được đăng ký khi bật rõ ràng PAYMENT_SIMULATOR_ENABLED=true (không bao giờ
+bật trên production). Không có PAYMENT_WEBHOOK_SECRET thì mọi webhook đều bị từ chối.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import urllib.request
+
+from fastapi import HTTPException, status
+
+from models import Payment
+from utils.ids import new_id
+
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "simulator")
+PAYMENT_WEBHOOK_SECRET = os.getenv("PAYMENT_WEBHOOK_SECRET", "")
+PAYMENT_WEBHOOK_URL = os.getenv("PAYMENT_WEBHOOK_URL", "http://127.0.0.1:8000/api/v1/payments/webhooks/simulator")
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+PAYMENT_SIMULATOR_ENABLED = os.getenv("PAYMENT_SIMULATOR_ENABLED", "false").lower() == "true"
+SIMULATOR_MIN_LATENCY_MS = float(os.getenv("PAYMENT_SIMULATOR_MIN_LATENCY_MS", "50"))
+SIMULATOR_MAX_LATENCY_MS = float(os.getenv("PAYMENT_SIMULATOR_MAX_LATENCY_MS", "500"))
+SIMULATOR_FAILURE_RATE = float(os.getenv("PAYMENT_SIMULATOR_FAILURE_RATE", "0.1"))
+SIMULATOR_DUPLICATE_RATE = float(os.getenv("PAYMENT_SIMULATOR_DUPLICATE_RATE", "0.05"))
+SIMULATOR_WORKERS = int(os.getenv("PAYMENT_SIMULATOR_WORKERS", "8"))
+
+EVENT_TYPES = ("payment.succeeded", "payment.failed")
+
+Delivery = Tuple[bytes, Dict[str, str]]  # (body, headers) of one webhook request
+
+
+class PaymentGateway:
+    """Base adapter: HMAC-SHA256 signed JSON webhooks ``{"events": [...]}``"""
+
+    name = "base"
+
+    def __init__(self, secret: str = PAYMENT_WEBHOOK_SECRET):
+        self.secret = secret
+
+    def sign(self, body: bytes) -> str:
+        return "sha256=" + hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def verify(self, body: bytes, signature: Optional[str]) -> bool:
+        return bool(self.secret) and bool(signature) and hmac.compare_digest(self.sign(body), signature)
+
+    def charge(self, payment: Payment) -> None:
+        """Submit a pending payment; the outcome arrives later as a webhook"""
+        raise NotImplementedError
+
+    def parse_events(self, body: bytes, signature: Optional[str]) -> List[dict]:
+        """Verified, normalized events of one webhook request"""
+        if not self.secret:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Chưa cấu hình PAYMENT_WEBHOOK_SECRET, không nhận webhook"
+            )
+        if not self.verify(body, signature):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Chữ ký webhook không hợp lệ"
+            )
+        try:
+            events = json.loads(body)["events"]
+            return [
+                {
+                    "event_id": str(event["id"]),
+                    "event_type": event["type"],
+                    "transaction_id": event["transaction_id"],
+                    "amount_minor": int(event["amount_minor"]),
+                    "currency": event["currency"],
+                    "occurred_at": event["occurred_at"],
+                }
+                for event in events
+                if event["type"] in EVENT_TYPES
+            ]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Nội dung webhook không hợp lệ"
+            )
+
+
+def _post_webhook(body: bytes, headers: Dict[str, str]) -> None:
+    request = urllib.request.Request(PAYMENT_WEBHOOK_URL, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=10):
+        pass
+
+
+class SimulatedGateway(PaymentGateway):
+    """Local gateway: answers each charge with signed webhooks after a random latency"""
+
+    name = "simulator"
+
+    def __init__(
+        self,
+        secret: str = PAYMENT_WEBHOOK_SECRET,
+        deliver: Callable[[bytes, Dict[str, str]], None] = _post_webhook,
+        latency_ms: Tuple[float, float] = (SIMULATOR_MIN_LATENCY_MS, SIMULATOR_MAX_LATENCY_MS),
+        failure_rate: float = SIMULATOR_FAILURE_RATE,
+        duplicate_rate: float = SIMULATOR_DUPLICATE_RATE,
+        rng: Optional[random.Random] = None
+    ):
+        super().__init__(secret)
+        self.deliver = deliver
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.duplicate_rate = duplicate_rate
+        self.rng = rng or random.Random()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def webhooks(self, payment: Payment) -> List[Delivery]:
+        """Signed webhook request(s) for one charge: one event, sometimes delivered twice"""
+        failed = self.rng.random() < self.failure_rate
+        event = {
+            "id": f"evt_{new_id()}",
+            "type": "payment.failed" if failed else "payment.succeeded",
+            "transaction_id": payment.transaction_id,
+            "amount_minor": payment.amount_minor,
+            "currency": payment.currency,
+            "occurred_at": datetime.utcnow().isoformat(),
+        }
+        body = json.dumps({"events": [event]}).encode()
+        delivery = (body, {"Content-Type": "application/json", SIGNATURE_HEADER: self.sign(body)})
+        return [delivery, delivery] if self.rng.random() < self.duplicate_rate else [delivery]
+
+    def charge(self, payment: Payment) -> None:
+        deliveries = self.webhooks(payment)
+        latency = self.rng.uniform(*self.latency_ms) / 1000
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(SIMULATOR_WORKERS, thread_name_prefix="gateway-simulator")
+        self._executor.submit(self._send, deliveries, latency)
+
+    def _send(self, deliveries: List[Delivery], latency: float) -> None:
+        time.sleep(latency)
+        for body, headers in deliveries:
+            try:
+                self.deliver(body, headers)
+            except Exception as e:
+                print(f"⚠️ Gateway giả lập không gửi được webhook: {e}")
+
+
+_gateways: Dict[str, PaymentGateway] = {}
+
+
+def register_gateway(gateway: PaymentGateway) -> PaymentGateway:
+    _gateways[gateway.name] = gateway
+    return gateway
+
+
+def get_gateway(name: str = PAYMENT_GATEWAY) -> PaymentGateway:
+    gateway = _gateways.get(name)
+    if gateway is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Không hỗ trợ cổng thanh toán: {name}"
+        )
+    return gateway
+
+
+if PAYMENT_SIMULATOR_ENABLED:
+    if PAYMENT_WEBHOOK_SECRET:
+        register_gateway(SimulatedGateway())
+    else:
+        print("⚠️ PAYMENT_SIMULATOR_ENABLED cần PAYMENT_WEBHOOK_SECRET, cổng giả lập không được bật")
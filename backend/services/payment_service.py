@@ -1,13 +1,83 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, case, update
 from fastapi import HTTPException, status
-from typing import List, Optional
-from datetime import datetime
-from decimal import Decimal
-import uuid
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import os
 
 from models import Payment, User, Booking, PaymentStatus, PaymentMethod, BookingStatus
 from schemas import PaymentCreate, PaymentUpdate, PaymentResponse
+from services.outbox_service import record_events
+from utils.ids import new_id
+from utils.money import DEFAULT_CURRENCY, Money, to_major
+
+PAYMENT_VERIFY_BATCH = int(os.getenv("PAYMENT_VERIFY_BATCH", "500"))
+
+
+def generate_transaction_id() -> str:
+    """Generate a unique transaction ID"""
+    return f"TXN_{new_id()}"
+
+
+def balance_contribution(payment_status: Optional[PaymentStatus], amount_minor: int) -> Tuple[int, int]:
+    """(paid, pending) share of a payment in its booking's balance, in minor units"""
+    if payment_status == PaymentStatus.COMPLETED:
+        return amount_minor, 0
+    if payment_status == PaymentStatus.PENDING:
+        return 0, amount_minor
+    return 0, 0
+
+
+def _payment_method(value) -> PaymentMethod:
+    try:
+        return PaymentMethod(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Phương thức thanh toán không hợp lệ: {value}"
+        )
+
+
+def _check_currency(currency: Optional[str], booking: Booking) -> None:
+    """Payments are in the booking's currency (không quy đổi tỷ giá)"""
+    if currency is not None and currency.upper() != booking.currency:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tiền tệ thanh toán phải là {booking.currency}"
+        )
+
+
+def _payment_amount(amount, currency: Optional[str], booking: Booking) -> Money:
+    """Parse a request amount (major units) into minor units of the booking's currency"""
+    _check_currency(currency, booking)
+    money = Money.from_major(amount, booking.currency)
+    if money.minor <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Số tiền thanh toán phải lớn hơn 0"
+        )
+    return money
+
+
+def _check_within_total(booking: Booking, amount: Money, counted_minor: int = 0) -> None:
+    """
+    amount_paid + amount_pending + amount must not exceed the booking total (booking đã khóa).
+    ``counted_minor``: phần của payment này đã nằm trong amount_paid/amount_pending.
+    """
+    committed = Money(
+        (booking.amount_paid_minor or 0) + (booking.amount_pending_minor or 0) - counted_minor, booking.currency
+    )
+    total = Money(booking.total_price_minor, booking.currency)
+    if committed + amount > total:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Số tiền thanh toán vượt quá tổng booking (đã thanh toán và đang chờ: {committed}, tổng: {total})"
+        )
+
+
+def _exceeds_total(booking: Booking, amount_minor: int) -> bool:
+    """Whether completing ``amount_minor`` more would push amount_paid past the total"""
+    return (booking.amount_paid_minor or 0) + amount_minor > booking.total_price_minor
 
 
 class PaymentService:
@@ -16,10 +86,56 @@ class PaymentService:
     def __init__(self, db: Session):
         self.db = db
     
+    def _lock_booking(self, booking_id: int) -> Optional[Booking]:
+        """Lock the booking row carrying the payment balance (mọi thay đổi số dư đi qua khóa này)"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            # SQLite bỏ qua FOR UPDATE: một UPDATE không đổi dữ liệu lấy write lock của DB
+            self.db.execute(
+                update(Booking).where(Booking.id == booking_id).values(updated_at=Booking.updated_at)
+            )
+        return self.db.query(Booking).filter(
+            Booking.id == booking_id
+        ).with_for_update().populate_existing().first()
+    
+    def _lock_payment(self, payment_id: int) -> Tuple[Payment, Booking]:
+        """Lock a payment and its booking (booking first, same order as create_payment) and reread both"""
+        booking_id = self.db.query(Payment.booking_id).filter(Payment.id == payment_id).scalar()
+        if booking_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy thanh toán"
+            )
+        booking = self._lock_booking(booking_id)
+        payment = self.db.query(Payment).filter(
+            Payment.id == payment_id
+        ).with_for_update().populate_existing().first()
+        if payment is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy thanh toán"
+            )
+        return payment, booking
+    
+    @staticmethod
+    def _apply_balance(
+        booking: Booking,
+        old_status: Optional[PaymentStatus],
+        old_amount: int,
+        new_status: Optional[PaymentStatus],
+        new_amount: int
+    ) -> None:
+        """Move a payment's share (minor units) of the locked booking's balance from its old to its new state"""
+        old_paid, old_pending = balance_contribution(old_status, old_amount)
+        new_paid, new_pending = balance_contribution(new_status, new_amount)
+        if new_paid != old_paid:
+            booking.amount_paid_minor = (booking.amount_paid_minor or 0) + new_paid - old_paid
+        if new_pending != old_pending:
+            booking.amount_pending_minor = (booking.amount_pending_minor or 0) + new_pending - old_pending
+    
     def create_payment(self, payment_data: PaymentCreate, current_user: User) -> Payment:
         """Create a new payment"""
-        # Check if booking exists
-        booking = self.db.query(Booking).filter(Booking.id == payment_data.booking_id).first()
+        # Check if booking exists (khóa dòng booking: kiểm tra số dư + cập nhật trong một transaction)
+        booking = self._lock_booking(payment_data.booking_id)
         if not booking:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -40,43 +156,24 @@ class PaymentService:
                 detail="Chỉ có thể thanh toán cho booking đã được xác nhận"
             )
         
-        # Check if amount is valid
-        if payment_data.amount <= 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Số tiền thanh toán phải lớn hơn 0"
-            )
-        
-        # Check if amount doesn't exceed booking total
-        existing_payments = self.db.query(Payment).filter(
-            and_(
-                Payment.booking_id == payment_data.booking_id,
-                Payment.status == PaymentStatus.COMPLETED
-            )
-        ).all()
-        
-        total_paid = sum(payment.amount for payment in existing_payments)
-        
-        if total_paid + payment_data.amount > booking.total_price:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Số tiền thanh toán vượt quá tổng booking (đã thanh toán: {total_paid}, tổng: {booking.total_price})"
-            )
-        
-        # Generate payment reference
-        payment_reference = f"PAY-{uuid.uuid4().hex[:8].upper()}"
+        # Check if amount is valid and doesn't exceed booking total
+        amount = _payment_amount(payment_data.amount, payment_data.currency, booking)
+        _check_within_total(booking, amount)
         
         # Create payment
         db_payment = Payment(
             booking_id=payment_data.booking_id,
-            amount=payment_data.amount,
-            payment_method=payment_data.payment_method,
-            status=PaymentStatus.PENDING,
-            payment_reference=payment_reference,
+            hotel_id=booking.hotel_id,
+            amount_minor=amount.minor,
+            payment_method=_payment_method(payment_data.payment_method),
+            payment_status=PaymentStatus.PENDING,
+            transaction_id=generate_transaction_id(),
+            currency=booking.currency,
             notes=payment_data.notes
         )
         
         self.db.add(db_payment)
+        self._apply_balance(booking, None, 0, PaymentStatus.PENDING, db_payment.amount_minor)
         self.db.commit()
         self.db.refresh(db_payment)
         
@@ -112,7 +209,7 @@ class PaymentService:
             query = query.join(Booking).filter(Booking.user_id == user_id)
         
         if status:
-            query = query.filter(Payment.status == status)
+            query = query.filter(Payment.payment_status == status)
         
         if payment_method:
             query = query.filter(Payment.payment_method == payment_method)
@@ -151,23 +248,17 @@ class PaymentService:
     
     def update_payment(self, payment_id: int, payment_data: PaymentUpdate, current_user: User) -> Payment:
         """Update payment information"""
-        payment = self.get_payment_by_id(payment_id)
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Không tìm thấy thanh toán"
-            )
+        payment, booking = self._lock_payment(payment_id)
         
         # Check permissions
-        if current_user.role.value != "admin" and current_user.id != payment.booking.user_id:
+        if current_user.role.value != "admin" and current_user.id != booking.user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Không có quyền chỉnh sửa thanh toán này"
             )
         
         # Can't update completed or failed payments
-        if payment.status in [PaymentStatus.COMPLETED, PaymentStatus.FAILED]:
+        if payment.payment_status in [PaymentStatus.COMPLETED, PaymentStatus.FAILED]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Không thể chỉnh sửa thanh toán đã hoàn thành hoặc thất bại"
@@ -176,36 +267,35 @@ class PaymentService:
         # Update fields
         update_data = payment_data.model_dump(exclude_unset=True)
         
+        if update_data.get('payment_status') is not None and current_user.role.value != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Chỉ admin mới có quyền đổi trạng thái thanh toán"
+            )
+        
+        if update_data.get('payment_method') is not None:
+            update_data['payment_method'] = _payment_method(update_data['payment_method'])
+        
         # If amount is being changed, validate
-        if 'amount' in update_data:
-            if update_data['amount'] <= 0:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Số tiền thanh toán phải lớn hơn 0"
-                )
-            
-            # Check if new amount doesn't exceed booking total
-            existing_payments = self.db.query(Payment).filter(
-                and_(
-                    Payment.booking_id == payment.booking_id,
-                    Payment.status == PaymentStatus.COMPLETED,
-                    Payment.id != payment_id
-                )
-            ).all()
-            
-            total_paid = sum(p.amount for p in existing_payments)
-            
-            if total_paid + update_data['amount'] > payment.booking.total_price:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Số tiền thanh toán vượt quá tổng booking (đã thanh toán: {total_paid}, tổng: {payment.booking.total_price})"
-                )
+        _check_currency(update_data.pop('currency', None), booking)
+        amount = update_data.pop('amount', None)
+        if amount is not None:
+            update_data['amount_minor'] = _payment_amount(amount, None, booking).minor
+        
+        old_status, old_amount = payment.payment_status, payment.amount_minor
+        counted = sum(balance_contribution(old_status, old_amount))
+        new_share = sum(balance_contribution(
+            update_data.get('payment_status') or old_status, update_data.get('amount_minor', old_amount)
+        ))
+        if new_share > counted:
+            _check_within_total(booking, Money(new_share, booking.currency), counted_minor=counted)
         
         # Apply updates
         for field, value in update_data.items():
             if hasattr(payment, field) and value is not None:
                 setattr(payment, field, value)
         
+        self._apply_balance(booking, old_status, old_amount, payment.payment_status, payment.amount_minor)
         payment.updated_at = datetime.utcnow()
         
         self.db.commit()
@@ -215,14 +305,6 @@ class PaymentService:
     
     def process_payment(self, payment_id: int, current_user: User) -> Payment:
         """Process a payment (mark as completed)"""
-        payment = self.get_payment_by_id(payment_id)
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Không tìm thấy thanh toán"
-            )
-        
         # Check permissions (only admin can process payments)
         if current_user.role.value != "admin":
             raise HTTPException(
@@ -230,15 +312,24 @@ class PaymentService:
                 detail="Chỉ admin mới có quyền xử lý thanh toán"
             )
         
-        if payment.status != PaymentStatus.PENDING:
+        payment, booking = self._lock_payment(payment_id)
+        
+        if payment.payment_status != PaymentStatus.PENDING:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Chỉ có thể xử lý thanh toán đang chờ"
             )
         
+        if _exceeds_total(booking, payment.amount_minor):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Thanh toán vượt quá số tiền còn lại của booking"
+            )
+        
         # Simulate payment processing
-        payment.status = PaymentStatus.COMPLETED
-        payment.paid_at = datetime.utcnow()
+        self._apply_balance(booking, payment.payment_status, payment.amount_minor, PaymentStatus.COMPLETED, payment.amount_minor)
+        payment.payment_status = PaymentStatus.COMPLETED
+        payment.payment_date = datetime.utcnow()
         payment.updated_at = datetime.utcnow()
         
         self.db.commit()
@@ -246,16 +337,101 @@ class PaymentService:
         
         return payment
     
-    def fail_payment(self, payment_id: int, reason: str, current_user: User) -> Payment:
-        """Mark payment as failed"""
-        payment = self.get_payment_by_id(payment_id)
+    def charge_payment(self, payment_id: int, current_user: User, gateway) -> Payment:
+        """
+        Submit a pending payment to a gateway; its status changes when the gateway's webhook arrives.
+        Chỉ admin: cổng duy nhất hiện có là cổng giả lập, hoàn thành thanh toán mà không thu tiền.
+        """
+        if current_user.role.value != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Chỉ admin mới có quyền gửi thanh toán tới cổng"
+            )
         
+        payment = self.db.query(Payment).filter(Payment.id == payment_id).first()
         if not payment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Không tìm thấy thanh toán"
             )
         
+        if payment.payment_status != PaymentStatus.PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chỉ có thể thanh toán giao dịch đang chờ"
+            )
+        
+        gateway.charge(payment)
+        return payment
+    
+    def complete_pending(self, paid_at: Dict[int, datetime]) -> Set[int]:
+        """Mark many PENDING payments COMPLETED and commit ({payment_id: payment_date}). Returns the ids completed."""
+        completed = self.settle_pending({
+            payment_id: (PaymentStatus.COMPLETED, payment_date) for payment_id, payment_date in paid_at.items()
+        })
+        self.db.commit()
+        return completed
+    
+    def settle_pending(self, outcomes: Dict[int, Tuple[PaymentStatus, datetime]]) -> Set[int]:
+        """
+        Move many PENDING payments to COMPLETED / FAILED ({payment_id: (status, time)}), without committing.
+        Khóa các booking theo thứ tự id (cùng thứ tự khóa với _lock_payment) rồi UPDATE
+        hàng loạt; payment đã đổi trạng thái trước khi khóa được bỏ qua, payment hoàn thành
+        làm amount_paid vượt tổng booking cũng bị bỏ qua (vẫn PENDING).
+        Returns the ids actually moved.
+        """
+        if not outcomes:
+            return set()
+        booking_ids = sorted({booking_id for (booking_id,) in self.db.query(Payment.booking_id).filter(
+            Payment.id.in_(list(outcomes))
+        ).distinct()})
+        if self.db.get_bind().dialect.name == "sqlite":
+            self.db.execute(
+                update(Booking).where(Booking.id.in_(booking_ids)).values(updated_at=Booking.updated_at)
+            )
+        bookings = {booking.id: booking for booking in self.db.query(Booking).filter(
+            Booking.id.in_(booking_ids)
+        ).order_by(Booking.id).with_for_update().populate_existing()}
+        
+        # Dưới khóa booking trạng thái payment không đổi được nữa
+        rows = self.db.query(Payment.id, Payment.booking_id, Payment.amount_minor).filter(
+            Payment.id.in_(list(outcomes)), Payment.payment_status == PaymentStatus.PENDING
+        ).all()
+        if not rows:
+            return set()
+        
+        now = datetime.utcnow()
+        completed = []
+        paid = {booking_id: booking.amount_paid_minor or 0 for booking_id, booking in bookings.items()}
+        for row in sorted(rows, key=lambda row: row.id):
+            if outcomes[row.id][0] != PaymentStatus.COMPLETED:
+                continue
+            if paid[row.booking_id] + row.amount_minor > bookings[row.booking_id].total_price_minor:
+                continue
+            paid[row.booking_id] += row.amount_minor
+            completed.append(row)
+        failed = [row for row in rows if outcomes[row.id][0] == PaymentStatus.FAILED]
+        if completed:
+            self.db.execute(update(Payment), [
+                {"id": row.id, "payment_status": PaymentStatus.COMPLETED, "payment_date": outcomes[row.id][1], "updated_at": now}
+                for row in completed
+            ])
+        if failed:
+            self.db.execute(update(Payment), [
+                {"id": row.id, "payment_status": PaymentStatus.FAILED, "updated_at": now}
+                for row in failed
+            ])
+        for row in completed + failed:
+            self._apply_balance(bookings[row.booking_id], PaymentStatus.PENDING, row.amount_minor,
+                                outcomes[row.id][0], row.amount_minor)
+        moved = [row.id for row in completed + failed]
+        record_events(self.db, "updated", self.db.query(Payment).filter(
+            Payment.id.in_(moved)
+        ).populate_existing())
+        return set(moved)
+    
+    def fail_payment(self, payment_id: int, reason: str, current_user: User) -> Payment:
+        """Mark payment as failed"""
         # Check permissions (only admin can fail payments)
         if current_user.role.value != "admin":
             raise HTTPException(
@@ -263,13 +439,16 @@ class PaymentService:
                 detail="Chỉ admin mới có quyền đánh dấu thanh toán thất bại"
             )
         
-        if payment.status != PaymentStatus.PENDING:
+        payment, booking = self._lock_payment(payment_id)
+        
+        if payment.payment_status != PaymentStatus.PENDING:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Chỉ có thể đánh dấu thất bại thanh toán đang chờ"
             )
         
-        payment.status = PaymentStatus.FAILED
+        self._apply_balance(booking, payment.payment_status, payment.amount_minor, PaymentStatus.FAILED, payment.amount_minor)
+        payment.payment_status = PaymentStatus.FAILED
         payment.notes = f"{payment.notes or ''}\nLý do thất bại: {reason}".strip()
         payment.updated_at = datetime.utcnow()
         
@@ -280,29 +459,24 @@ class PaymentService:
     
     def cancel_payment(self, payment_id: int, current_user: User) -> Payment:
         """Cancel a payment"""
-        payment = self.get_payment_by_id(payment_id)
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Không tìm thấy thanh toán"
-            )
+        payment, booking = self._lock_payment(payment_id)
         
         # Check permissions
-        if current_user.role.value != "admin" and current_user.id != payment.booking.user_id:
+        if current_user.role.value != "admin" and current_user.id != booking.user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Không có quyền hủy thanh toán này"
             )
         
         # Can only cancel pending payments
-        if payment.status != PaymentStatus.PENDING:
+        if payment.payment_status != PaymentStatus.PENDING:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Chỉ có thể hủy thanh toán đang chờ"
             )
         
-        payment.status = PaymentStatus.CANCELLED
+        self._apply_balance(booking, payment.payment_status, payment.amount_minor, PaymentStatus.CANCELLED, payment.amount_minor)
+        payment.payment_status = PaymentStatus.CANCELLED
         payment.updated_at = datetime.utcnow()
         
         self.db.commit()
@@ -318,21 +492,16 @@ class PaymentService:
                 detail="Chỉ admin mới có quyền xóa thanh toán"
             )
         
-        payment = self.get_payment_by_id(payment_id)
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Không tìm thấy thanh toán"
-            )
+        payment, booking = self._lock_payment(payment_id)
         
         # Can't delete completed payments
-        if payment.status == PaymentStatus.COMPLETED:
+        if payment.payment_status == PaymentStatus.COMPLETED:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Không thể xóa thanh toán đã hoàn thành"
             )
         
+        self._apply_balance(booking, payment.payment_status, payment.amount_minor, None, 0)
         self.db.delete(payment)
         self.db.commit()
         
@@ -343,25 +512,24 @@ class PaymentService:
         query = self.db.query(Payment)
         
         if hotel_id:
-            query = query.join(Booking).join(Booking.room).filter(
-                Booking.room.has(hotel_id=hotel_id)
-            )
+            query = query.filter(Payment.hotel_id == hotel_id)
         
         total_payments = query.count()
-        completed_payments = query.filter(Payment.status == PaymentStatus.COMPLETED).count()
-        pending_payments = query.filter(Payment.status == PaymentStatus.PENDING).count()
-        failed_payments = query.filter(Payment.status == PaymentStatus.FAILED).count()
-        cancelled_payments = query.filter(Payment.status == PaymentStatus.CANCELLED).count()
-        
-        # Total revenue
-        total_revenue = query.filter(
-            Payment.status == PaymentStatus.COMPLETED
-        ).with_entities(func.sum(Payment.amount)).scalar() or 0
-        
-        # Average payment amount
-        avg_payment = query.filter(
-            Payment.status == PaymentStatus.COMPLETED
-        ).with_entities(func.avg(Payment.amount)).scalar() or 0
+        completed_payments = query.filter(Payment.payment_status == PaymentStatus.COMPLETED).count()
+        pending_payments = query.filter(Payment.payment_status == PaymentStatus.PENDING).count()
+        failed_payments = query.filter(Payment.payment_status == PaymentStatus.FAILED).count()
+        cancelled_payments = query.filter(Payment.payment_status == PaymentStatus.CANCELLED).count()
+        
+        # Revenue per currency (tổng số nguyên chính xác); total/average theo DEFAULT_CURRENCY
+        revenue_by_currency = {}
+        total_revenue = avg_payment = 0
+        for currency, total_minor, count in query.filter(
+            Payment.payment_status == PaymentStatus.COMPLETED
+        ).with_entities(Payment.currency, func.sum(Payment.amount_minor), func.count(Payment.id)).group_by(Payment.currency):
+            revenue_by_currency[currency] = float(to_major(total_minor, currency))
+            if currency == DEFAULT_CURRENCY:
+                total_revenue = to_major(total_minor, currency)
+                avg_payment = to_major(total_minor, currency) / count
         
         # Payment method breakdown
         payment_methods = {}
@@ -369,7 +537,7 @@ class PaymentService:
             count = query.filter(
                 and_(
                     Payment.payment_method == method,
-                    Payment.status == PaymentStatus.COMPLETED
+                    Payment.payment_status == PaymentStatus.COMPLETED
                 )
             ).count()
             payment_methods[method.value] = count
@@ -382,39 +550,117 @@ class PaymentService:
             "cancelled_payments": cancelled_payments,
             "total_revenue": float(total_revenue),
             "average_payment": float(avg_payment),
+            "revenue_by_currency": revenue_by_currency,
             "payment_methods": payment_methods
         }
     
-    def get_booking_payment_status(self, booking_id: int) -> dict:
-        """Get payment status for a specific booking"""
-        booking = self.db.query(Booking).filter(Booking.id == booking_id).first()
+    def _payment_status_query(self):
+        """Balance columns of bookings + their payment count, one grouped row per booking"""
+        return self.db.query(
+            Booking.id, Booking.user_id, Booking.currency, Booking.total_price_minor,
+            Booking.amount_paid_minor, Booking.amount_pending_minor, func.count(Payment.id).label("payment_count")
+        ).outerjoin(Payment, Payment.booking_id == Booking.id).group_by(
+            Booking.id, Booking.user_id, Booking.currency, Booking.total_price_minor,
+            Booking.amount_paid_minor, Booking.amount_pending_minor
+        )
+    
+    @staticmethod
+    def _payment_status(row) -> dict:
+        remaining_minor = row.total_price_minor - (row.amount_paid_minor or 0)
+        return {
+            "booking_id": row.id,
+            "currency": row.currency,
+            "total_amount": float(to_major(row.total_price_minor, row.currency)),
+            "total_paid": float(to_major(row.amount_paid_minor or 0, row.currency)),
+            "total_pending": float(to_major(row.amount_pending_minor or 0, row.currency)),
+            "remaining_balance": float(to_major(remaining_minor, row.currency)),
+            "is_fully_paid": remaining_minor <= 0,
+            "payment_count": row.payment_count
+        }
+    
+    def get_booking_payment_status(self, booking_id: int, current_user: User) -> dict:
+        """Get payment status for a specific booking (admin hoặc chủ booking)"""
+        row = self._payment_status_query().filter(Booking.id == booking_id).first()
         
-        if not booking:
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Không tìm thấy booking"
             )
         
-        payments = self.db.query(Payment).filter(Payment.booking_id == booking_id).all()
-        
-        total_paid = sum(p.amount for p in payments if p.status == PaymentStatus.COMPLETED)
-        total_pending = sum(p.amount for p in payments if p.status == PaymentStatus.PENDING)
+        if current_user.role.value != "admin" and current_user.id != row.user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Không có quyền xem thanh toán của booking này"
+            )
         
-        remaining_balance = booking.total_price - total_paid
+        return self._payment_status(row)
+    
+    def get_payment_status_batch(self, booking_ids: List[int], current_user: User) -> dict:
+        """
+        Payment status of many bookings in one grouped query, in request order.
+        Booking không tồn tại hoặc không thuộc user (khi không phải admin) nằm trong ``not_found``.
+        """
+        booking_ids = list(dict.fromkeys(booking_ids))
+        query = self._payment_status_query().filter(Booking.id.in_(booking_ids))
+        if current_user.role.value != "admin":
+            query = query.filter(Booking.user_id == current_user.id)
+        rows = {row.id: row for row in query}
         
         return {
-            "booking_id": booking_id,
-            "total_amount": float(booking.total_price),
-            "total_paid": float(total_paid),
-            "total_pending": float(total_pending),
-            "remaining_balance": float(remaining_balance),
-            "is_fully_paid": remaining_balance <= 0,
-            "payment_count": len(payments)
+            "items": [self._payment_status(rows[booking_id]) for booking_id in booking_ids if booking_id in rows],
+            "not_found": [booking_id for booking_id in booking_ids if booking_id not in rows]
         }
     
+    def verify_balances(self, after_id: int = 0, batch_size: int = PAYMENT_VERIFY_BATCH) -> Tuple[int, Optional[int]]:
+        """
+        Compare amount_paid / amount_pending of one batch of bookings (id > after_id) with their payments.
+        Booking lệch được khóa, tính lại và sửa. Returns (number fixed, after_id of the next batch or None).
+        """
+        ids = [booking_id for (booking_id,) in self.db.query(Booking.id).filter(
+            Booking.id > after_id
+        ).order_by(Booking.id).limit(batch_size)]
+        if not ids:
+            return 0, None
+        
+        def drifted(rows) -> List[int]:
+            return [
+                row.id for row in rows
+                if (row.amount_paid_minor or 0) != (row.paid or 0)
+                or (row.amount_pending_minor or 0) != (row.pending or 0)
+            ]
+        
+        def sums(booking_ids):
+            totals = self.db.query(
+                Payment.booking_id.label("booking_id"),
+                func.sum(case((Payment.payment_status == PaymentStatus.COMPLETED, Payment.amount_minor), else_=0)).label("paid"),
+                func.sum(case((Payment.payment_status == PaymentStatus.PENDING, Payment.amount_minor), else_=0)).label("pending")
+            ).filter(Payment.booking_id.in_(booking_ids)).group_by(Payment.booking_id).subquery()
+            return self.db.query(
+                Booking.id, Booking.amount_paid_minor, Booking.amount_pending_minor, totals.c.paid, totals.c.pending
+            ).outerjoin(totals, totals.c.booking_id == Booking.id).filter(Booking.id.in_(booking_ids))
+        
+        suspects = drifted(sums(ids).all())
+        self.db.rollback()
+        
+        fixed = 0
+        for booking_id in suspects:
+            # Kiểm tra lại dưới khóa: payment commit giữa chừng không bị tính là lệch
+            booking = self._lock_booking(booking_id)
+            rows = sums([booking_id]).all()
+            if booking is not None and drifted(rows):
+                print(f"⚠️ Số dư booking {booking_id} lệch: paid {booking.amount_paid_minor} -> {rows[0].paid or 0}, "
+                      f"pending {booking.amount_pending_minor} -> {rows[0].pending or 0}")
+                booking.amount_paid_minor = int(rows[0].paid or 0)
+                booking.amount_pending_minor = int(rows[0].pending or 0)
+                fixed += 1
+            self.db.commit()
+        
+        return fixed, (ids[-1] if len(ids) == batch_size else None)
+    
     def get_recent_payments(self, days: int = 7, limit: int = 50) -> List[Payment]:
         """Get recent payments"""
-        cutoff_date = datetime.utcnow() - datetime.timedelta(days=days)
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
         
         return self.db.query(Payment).options(
             joinedload(Payment.booking).joinedload(Booking.user),
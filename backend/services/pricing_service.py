@@ -0,0 +1,287 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from fastapi import HTTPException, status
+from typing import Dict, List, Optional, Sequence
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import numpy as np
+
+from models import Room, RoomRate, RoomAllotment, User, Booking
+from services.room_service import RoomService
+from utils.money import DEFAULT_CURRENCY, to_major, to_minor
+
+# Giới hạn số ngày cho một lần sửa giá theo khoảng / một yêu cầu báo giá
+MAX_RATE_RANGE_DAYS = 731
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _day_index(values, start: date) -> np.ndarray:
+    """Offsets in days of the given dates from start"""
+    days = np.array([_as_date(v) for v in values], dtype="datetime64[D]")
+    return (days - np.datetime64(start, "D")).astype(np.intp)
+
+
+class PricingService:
+    """
+    Stay pricing from the per-date rate calendar (room_rates).
+
+    Giá của n phòng x m đêm được dựng thành ma trận NumPy int64 (đơn vị tiền nhỏ nhất
+    của DEFAULT_CURRENCY): khởi tạo bằng price_per_night, ghi đè các ô có giá theo ngày
+    lấy từ MỘT truy vấn theo khoảng ngày, rồi cộng theo hàng.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def price_matrix(self, rooms: Sequence[Room], check_in_date, check_out_date) -> np.ndarray:
+        """Nightly prices in minor units as a (len(rooms), nights) int64 array"""
+        check_in = _as_date(check_in_date)
+        check_out = _as_date(check_out_date)
+        nights = (check_out - check_in).days
+        if nights <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày check-in phải trước ngày check-out"
+            )
+
+        base = np.array([to_minor(room.price_per_night, DEFAULT_CURRENCY) for room in rooms], dtype=np.int64)
+        prices = np.repeat(base[:, None], nights, axis=1)
+        if not rooms:
+            return prices
+
+        row_of = {room.id: i for i, room in enumerate(rooms)}
+        rates = self.db.query(RoomRate.room_id, RoomRate.date, RoomRate.price_minor).filter(
+            and_(
+                RoomRate.room_id.in_(list(row_of)),
+                RoomRate.date >= check_in,
+                RoomRate.date < check_out
+            )
+        ).all()
+        if rates:
+            rows = np.fromiter((row_of[r.room_id] for r in rates), dtype=np.intp, count=len(rates))
+            cols = np.fromiter(((r.date - check_in).days for r in rates), dtype=np.intp, count=len(rates))
+            prices[rows, cols] = np.fromiter((r.price_minor for r in rates), dtype=np.int64, count=len(rates))
+        return prices
+
+    def stay_totals(self, rooms: Sequence[Room], check_in_date, check_out_date) -> Dict[int, int]:
+        """Total stay price in minor units for each room, keyed by room id"""
+        totals = self.price_matrix(rooms, check_in_date, check_out_date).sum(axis=1)
+        return {room.id: int(total) for room, total in zip(rooms, totals)}
+
+    def stay_total(self, room: Room, check_in_date, check_out_date) -> int:
+        """Total stay price of one room in minor units"""
+        return self.stay_totals([room], check_in_date, check_out_date)[room.id]
+
+    def quote_stays(self, items: Sequence) -> List[dict]:
+        """
+        Quote many (room_id, check_in_date, check_out_date, guests) stays at once.
+
+        Mỗi yêu cầu được kiểm tra riêng (phòng, số đêm tối đa MAX_RATE_RANGE_DAYS) và
+        yêu cầu lỗi chỉ nhận reason của nó. Các yêu cầu hợp lệ được gom thành các cửa sổ
+        ngày không quá MAX_RATE_RANGE_DAYS; mỗi cửa sổ dựng ma trận giá phòng x ngày
+        (1 truy vấn room_rates) và ma trận đêm bị chiếm (1 truy vấn bookings, 1 truy vấn
+        đêm loại phòng đã hết allotment), rồi lấy tổng giá / số đêm bị chiếm của từng yêu
+        cầu bằng tổng tích lũy: total = cumsum[b] - cumsum[a]. Tổng tích lũy tính trên
+        đơn vị tiền nhỏ nhất (int64) nên hiệu hai tổng luôn chính xác.
+        """
+        if not items:
+            return []
+
+        room_ids = sorted({item.room_id for item in items})
+        rooms = {room.id: room for room in self.db.query(Room).filter(Room.id.in_(room_ids)).all()}
+
+        check_in = np.array([item.check_in_date for item in items], dtype="datetime64[D]")
+        check_out = np.array([item.check_out_date for item in items], dtype="datetime64[D]")
+        nights = (check_out - check_in).astype(np.intp)
+        found = np.array([item.room_id in rooms for item in items], dtype=bool)
+        priced = found & (nights > 0) & (nights <= MAX_RATE_RANGE_DAYS)
+
+        totals = np.zeros(len(items), dtype=np.int64)
+        booked = np.zeros(len(items), dtype=bool)
+        for window in self._quote_windows(check_in, check_out, np.flatnonzero(priced)):
+            start = check_in[window].min().astype(date)
+            end = check_out[window].max().astype(date)
+            window_rooms = [rooms[room_id] for room_id in sorted({items[i].room_id for i in window})]
+            price_sums, occupied_sums = self._window_sums(window_rooms, start, end)
+
+            row_of = {room.id: row for row, room in enumerate(window_rooms)}
+            rows = np.array([row_of[items[i].room_id] for i in window], dtype=np.intp)
+            a = (check_in[window] - np.datetime64(start, "D")).astype(np.intp)
+            b = (check_out[window] - np.datetime64(start, "D")).astype(np.intp)
+            totals[window] = price_sums[rows, b] - price_sums[rows, a]
+            booked[window] = (occupied_sums[rows, b] - occupied_sums[rows, a]) > 0
+
+        quotes = []
+        for i, item in enumerate(items):
+            room = rooms.get(item.room_id)
+            reason = None
+            if room is None:
+                reason = "Không tìm thấy phòng"
+            elif nights[i] <= 0:
+                reason = "Ngày check-in phải trước ngày check-out"
+            elif nights[i] > MAX_RATE_RANGE_DAYS:
+                reason = f"Thời gian ở tối đa là {MAX_RATE_RANGE_DAYS} đêm"
+            elif not room.is_available:
+                reason = "Phòng đang bảo trì"
+            elif item.guests > room.capacity:
+                reason = f"Số lượng khách vượt quá sức chứa của phòng ({room.capacity})"
+            elif booked[i]:
+                reason = "Phòng không có sẵn trong thời gian đã chọn"
+            quotes.append({
+                "room_id": item.room_id,
+                "check_in_date": item.check_in_date,
+                "check_out_date": item.check_out_date,
+                "guests": item.guests,
+                "nights": max(int(nights[i]), 0),
+                "total_price": float(to_major(int(totals[i]), DEFAULT_CURRENCY)) if priced[i] else None,
+                "available": reason is None,
+                "reason": reason,
+            })
+        return quotes
+
+    @staticmethod
+    def _quote_windows(check_in: np.ndarray, check_out: np.ndarray, indices: np.ndarray) -> List[np.ndarray]:
+        """Group item indices (each at most MAX_RATE_RANGE_DAYS nights) into windows spanning at most that many days"""
+        windows = []
+        current: List[int] = []
+        start = end = None
+        for i in indices[np.argsort(check_in[indices], kind="stable")]:
+            if current and (max(end, check_out[i]) - start).astype(np.intp) > MAX_RATE_RANGE_DAYS:
+                windows.append(np.array(current, dtype=np.intp))
+                current = []
+            if not current:
+                start, end = check_in[i], check_out[i]
+            current.append(i)
+            end = max(end, check_out[i])
+        if current:
+            windows.append(np.array(current, dtype=np.intp))
+        return windows
+
+    def _window_sums(self, rooms: Sequence[Room], start: date, end: date):
+        """Cumulative (price in minor units, occupied) sums per night of [start, end), shape (len(rooms), nights + 1)"""
+        width = (end - start).days
+        row_of = {room.id: i for i, room in enumerate(rooms)}
+
+        # Giá từng đêm (đơn vị nhỏ): price_per_night, ghi đè bằng room_rates trong cửa sổ
+        base = np.array([to_minor(room.price_per_night, DEFAULT_CURRENCY) for room in rooms], dtype=np.int64)
+        prices = np.repeat(base[:, None], width, axis=1)
+        rates = self.db.query(RoomRate.room_id, RoomRate.date, RoomRate.price_minor).filter(
+            and_(
+                RoomRate.room_id.in_(list(row_of)),
+                RoomRate.date >= start,
+                RoomRate.date < end
+            )
+        ).all()
+        if rates:
+            rows = np.array([row_of[r.room_id] for r in rates], dtype=np.intp)
+            prices[rows, _day_index([r.date for r in rates], start)] = [r.price_minor for r in rates]
+
+        # Số booking chiếm phòng từng đêm (mảng hiệu + cumsum)
+        bookings = RoomService(self.db).booked_room_ids(start, end).add_columns(
+            Booking.check_in_date, Booking.check_out_date
+        ).filter(Booking.room_id.in_(list(row_of))).all()
+        occupied = np.zeros((len(rooms), width + 1), dtype=np.int32)
+        if bookings:
+            rows = np.array([row_of[b.room_id] for b in bookings], dtype=np.intp)
+            first = np.clip(_day_index([b.check_in_date for b in bookings], start), 0, width)
+            last = np.clip(_day_index([b.check_out_date for b in bookings], start), 0, width)
+            np.add.at(occupied, (rows, first), 1)
+            np.add.at(occupied, (rows, last), -1)
+        occupied = np.cumsum(occupied, axis=1)[:, :width] > 0
+
+        # Đêm loại phòng đã hết allotment cũng không bán được (kể cả phòng đang trống)
+        rows_of_type = defaultdict(list)
+        for room in rooms:
+            rows_of_type[(room.hotel_id, room.room_type)].append(row_of[room.id])
+        sold_out = self.db.query(RoomAllotment.hotel_id, RoomAllotment.room_type, RoomAllotment.date).filter(
+            and_(
+                RoomAllotment.hotel_id.in_({room.hotel_id for room in rooms}),
+                RoomAllotment.date >= start,
+                RoomAllotment.date < end,
+                RoomAllotment.sold >= RoomAllotment.total
+            )
+        ).all()
+        for night in sold_out:
+            occupied[rows_of_type[(night.hotel_id, night.room_type)], (night.date - start).days] = True
+
+        zeros = np.zeros((len(rooms), 1), dtype=np.int64)
+        return np.hstack([zeros, np.cumsum(prices, axis=1)]), np.hstack([zeros, np.cumsum(occupied, axis=1)])
+
+    def get_rate_calendar(self, room: Room, start_date: date, end_date: date) -> List[dict]:
+        """Nightly price of a room for every date in [start_date, end_date]"""
+        self._validate_range(start_date, end_date)
+        prices = self.price_matrix([room], start_date, end_date + timedelta(days=1))[0]
+        overrides = {
+            rate_date for (rate_date,) in self.db.query(RoomRate.date).filter(
+                and_(
+                    RoomRate.room_id == room.id,
+                    RoomRate.date >= start_date,
+                    RoomRate.date <= end_date
+                )
+            )
+        }
+        return [
+            {
+                "date": start_date + timedelta(days=i),
+                "price": float(to_major(int(price), DEFAULT_CURRENCY)),
+                "is_override": start_date + timedelta(days=i) in overrides,
+            }
+            for i, price in enumerate(prices)
+        ]
+
+    def set_rates(
+        self,
+        room: Room,
+        start_date: date,
+        end_date: date,
+        price: Optional[float],
+        weekdays: Optional[List[int]],
+        current_user: User
+    ) -> int:
+        """
+        Set (price) or clear (price=None) the rate of every date in [start_date, end_date]
+        whose weekday (0=Thứ 2 .. 6=Chủ nhật) is in weekdays. Returns the number of dates set,
+        or when clearing the number of rate overrides actually deleted.
+        """
+        if current_user.role.value != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Chỉ admin mới có quyền cập nhật giá phòng"
+            )
+        self._validate_range(start_date, end_date)
+
+        days = (end_date - start_date).days + 1
+        dates = [start_date + timedelta(days=i) for i in range(days)]
+        if weekdays is not None:
+            allowed = set(weekdays)
+            dates = [d for d in dates if d.weekday() in allowed]
+        if not dates:
+            return 0
+
+        # Xóa giá cũ trong khoảng rồi chèn lại hàng loạt
+        deleted = self.db.query(RoomRate).filter(
+            and_(RoomRate.room_id == room.id, RoomRate.date.in_(dates))
+        ).delete(synchronize_session=False)
+        if price is not None:
+            price_minor = to_minor(price, DEFAULT_CURRENCY)
+            self.db.bulk_insert_mappings(
+                RoomRate, [{"room_id": room.id, "date": d, "price_minor": price_minor} for d in dates]
+            )
+        self.db.commit()
+        return len(dates) if price is not None else deleted
+
+    @staticmethod
+    def _validate_range(start_date: date, end_date: date) -> None:
+        if start_date > end_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày bắt đầu phải trước hoặc bằng ngày kết thúc"
+            )
+        if (end_date - start_date).days + 1 > MAX_RATE_RANGE_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Khoảng ngày tối đa là {MAX_RATE_RANGE_DAYS} ngày"
+            )
@@ -0,0 +1,294 @@
+"""Bank / MoMo statement reconciliation (POST /api/v1/payments/reconcile).
+
+Sao kê CSV được đọc tuần tự theo từng lô RECONCILE_CHUNK_SIZE dòng; mỗi lô:
+  1. khớp chính xác theo transaction_id (cột transaction_id hoặc mã TXN_... trong nội dung CK)
+     bằng một truy vấn IN trên unique index,
+  2. dòng còn lại: mã booking trong nội dung CK + đúng số tiền,
+  3. cuối cùng: đúng số tiền + ngày giao dịch (payment chuyển khoản / MoMo, tạo
+     trong RECONCILE_DATE_WINDOW_DAYS ngày trước đó) khi chỉ có đúng một ứng viên,
+rồi đánh dấu COMPLETED cả lô bằng PaymentService.complete_pending và trả về báo cáo
+từng dòng. Mỗi bước ưu tiên payment đang chờ; payment đã COMPLETED chỉ khớp khi không
+có payment đang chờ nào và luôn được báo "matched" / "đã hoàn thành trước đó" ở cả ba
+bước. Một payment chỉ khớp một dòng trong cả sao kê (các lô dùng chung ``claimed``:
+payment id -> số dòng). Ngoài ``claimed`` (vài số nguyên mỗi payment khớp), bộ nhớ chỉ
+phụ thuộc kích thước lô.
+"""
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import csv
+import io
+import os
+import re
+
+from models import Booking, Payment, PaymentMethod, PaymentStatus
+from services.payment_service import PaymentService
+from utils.money import DEFAULT_CURRENCY, to_major, to_minor
+
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "500"))
+RECONCILE_DATE_WINDOW_DAYS = int(os.getenv("RECONCILE_DATE_WINDOW_DAYS", "3"))
+
+# Tên cột chấp nhận được (không phân biệt hoa thường) -> trường chuẩn
+COLUMN_ALIASES = {
+    "transaction_id": "transaction_id", "txn_id": "transaction_id", "ma_giao_dich": "transaction_id",
+    "amount": "amount", "credit": "amount", "so_tien": "amount",
+    "date": "date", "transaction_date": "date", "value_date": "date", "ngay": "date",
+    "reference": "reference", "description": "reference", "content": "reference", "noi_dung": "reference",
+    "currency": "currency",
+}
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y", "%d/%m/%Y %H:%M:%S")
+# Phương thức có sao kê để đối soát theo số tiền + ngày
+STATEMENT_METHODS = (PaymentMethod.BANK_TRANSFER, PaymentMethod.MOMO)
+
+TRANSACTION_ID_PATTERN = re.compile(r"TXN_[0-9A-Z]{13}")
+# booking_reference: 13 ký tự Crockford base32 (utils.ids)
+BOOKING_REFERENCE_PATTERN = re.compile(r"\b[0-9A-HJKMNP-TV-Z]{13}\b")
+
+
+def _parse_amount(value: str) -> Decimal:
+    """Statement amount; thousands separators (1,600,000) and spaces are ignored"""
+    return Decimal(re.sub(r"[,\s_]", "", value or ""))
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"ngày không hợp lệ: {value}")
+
+
+class StatementLine:
+    """One parsed statement row plus its reconciliation outcome"""
+
+    def __init__(self, line: int, transaction_id: Optional[str], reference: str,
+                 amount_minor: int, currency: str, date: Optional[datetime]):
+        self.line = line
+        self.transaction_id = transaction_id
+        self.reference = reference
+        self.amount_minor = amount_minor
+        self.currency = currency
+        self.date = date
+        self.status = "unknown"
+        self.match: Optional[str] = None
+        self.reason: Optional[str] = None
+        self.payment_id: Optional[int] = None
+        self.complete = False  # Payment đang chờ, cần chuyển COMPLETED
+
+    def resolve(self, status_: str, payment: Optional[Payment] = None,
+                match: Optional[str] = None, reason: Optional[str] = None) -> None:
+        self.status, self.match, self.reason = status_, match, reason
+        if payment is not None:
+            self.payment_id = payment.id
+            self.transaction_id = payment.transaction_id
+
+    def report(self) -> dict:
+        return {
+            "line": self.line,
+            "status": self.status,
+            "match": self.match,
+            "reason": self.reason,
+            "payment_id": self.payment_id,
+            "transaction_id": self.transaction_id,
+            "amount": float(to_major(self.amount_minor, self.currency)),
+            "currency": self.currency,
+        }
+
+
+class ReconciliationService:
+    """Matches statement rows against payments and settles the matched ones"""
+
+    def __init__(self, db: Session, chunk_size: int = RECONCILE_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def open_statement(stream: IO[bytes]) -> Iterator[dict]:
+        """
+        CSV reader over a binary stream, with columns renamed to the canonical fields.
+        Raises 400 when the header has no amount column or nothing to match on.
+        """
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        reader = csv.reader(text)
+        header = next(reader, None) or []
+        fields = [COLUMN_ALIASES.get(name.strip().lower().replace(" ", "_")) for name in header]
+        if "amount" not in fields or not {"transaction_id", "reference"} & set(fields):
+            text.detach()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Sao kê phải có cột amount và transaction_id hoặc reference"
+            )
+        return (
+            {field: value for field, value in zip(fields, row) if field}
+            for row in reader
+        )
+
+    def reconcile(self, rows: Iterable[dict], dry_run: bool = False) -> Iterator[dict]:
+        """Report dict per statement row, then a final {"summary": ...}; processed chunk by chunk"""
+        counts = {"matched": 0, "mismatch": 0, "unknown": 0, "invalid": 0, "completed": 0}
+        claimed: Dict[int, int] = {}  # payment id -> dòng sao kê đã khớp, cho cả sao kê
+        numbered = enumerate(rows, start=2)  # Dòng 1 là header
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            lines: List[StatementLine] = []
+            for line_number, row in chunk:
+                parsed = self._parse(line_number, row)
+                if isinstance(parsed, dict):
+                    counts["invalid"] += 1
+                    yield parsed
+                else:
+                    lines.append(parsed)
+            counts["completed"] += self._reconcile_chunk(lines, claimed, dry_run)
+            for line in lines:
+                counts[line.status] += 1
+                yield line.report()
+        yield {"summary": {**counts, "dry_run": dry_run}}
+
+    def _parse(self, line_number: int, row: dict):
+        """StatementLine, or an ``invalid`` report dict"""
+        try:
+            currency = (row.get("currency") or DEFAULT_CURRENCY).strip().upper()
+            amount_minor = to_minor(_parse_amount(row.get("amount")), currency)
+            date = _parse_date(row.get("date"))
+        except InvalidOperation:
+            return {"line": line_number, "status": "invalid", "reason": "số tiền không hợp lệ"}
+        except ValueError as e:
+            return {"line": line_number, "status": "invalid", "reason": str(e)}
+        if amount_minor <= 0:
+            return {"line": line_number, "status": "invalid", "reason": "không phải giao dịch ghi có"}
+        reference = (row.get("reference") or "").upper()
+        transaction_id = (row.get("transaction_id") or "").strip().upper()
+        if not transaction_id:
+            found = TRANSACTION_ID_PATTERN.search(reference)
+            transaction_id = found.group(0) if found else None
+        return StatementLine(line_number, transaction_id, reference, amount_minor, currency, date)
+
+    def _reconcile_chunk(self, lines: List[StatementLine], claimed: Dict[int, int], dry_run: bool) -> int:
+        """Resolve every line of one chunk; returns the number of payments completed"""
+        try:
+            self._match_transaction_ids(lines, claimed)
+            self._match_booking_references([line for line in lines if line.status == "unknown"], claimed)
+            self._match_amount_and_date([line for line in lines if line.status == "unknown"], claimed)
+        finally:
+            # Trả snapshot / kết nối trước khi khóa booking
+            self.db.rollback()
+
+        pending = {line.payment_id: line for line in lines if line.complete}
+        if dry_run or not pending:
+            return 0
+        completed = PaymentService(self.db).complete_pending({
+            payment_id: line.date or datetime.utcnow() for payment_id, line in pending.items()
+        })
+        for payment_id, line in pending.items():
+            if payment_id not in completed:
+                line.resolve("mismatch", match=line.match, reason="payment đã đổi trạng thái hoặc vượt tổng booking")
+                line.complete = False
+        return len(completed)
+
+    def _claim(self, line: StatementLine, payment: Payment, match: str,
+               claimed: Dict[int, int]) -> None:
+        """Match a line to a payment, checking amount, currency, status and duplicates"""
+        if payment.id in claimed:
+            line.resolve("mismatch", payment, match, f"trùng với dòng {claimed[payment.id]}")
+        elif payment.currency != line.currency:
+            line.resolve("mismatch", payment, match, f"khác tiền tệ ({payment.currency})")
+        elif payment.amount_minor != line.amount_minor:
+            line.resolve("mismatch", payment, match, f"khác số tiền (payment: {payment.amount})")
+        elif payment.payment_status == PaymentStatus.COMPLETED:
+            claimed[payment.id] = line.line
+            line.resolve("matched", payment, match, "đã hoàn thành trước đó")
+        elif payment.payment_status != PaymentStatus.PENDING:
+            line.resolve("mismatch", payment, match, f"payment {payment.payment_status.value}")
+        else:
+            claimed[payment.id] = line.line
+            line.resolve("matched", payment, match)
+            line.complete = True
+
+    @staticmethod
+    def _open_candidates(payments: Iterable[Payment], claimed: Dict[int, int]) -> List[Payment]:
+        """Unclaimed pending candidates, or if there are none the already-completed ones"""
+        unclaimed = [payment for payment in payments if payment.id not in claimed]
+        for status_ in (PaymentStatus.PENDING, PaymentStatus.COMPLETED):
+            found = [payment for payment in unclaimed if payment.payment_status == status_]
+            if found:
+                return found
+        return []
+
+    def _match_transaction_ids(self, lines: List[StatementLine], claimed: Dict[int, int]) -> None:
+        transaction_ids = {line.transaction_id for line in lines if line.transaction_id}
+        if not transaction_ids:
+            return
+        payments = {payment.transaction_id: payment for payment in self.db.query(Payment).filter(
+            Payment.transaction_id.in_(transaction_ids)
+        )}
+        for line in lines:
+            payment = payments.get(line.transaction_id)
+            if payment is not None:
+                self._claim(line, payment, "transaction_id", claimed)
+
+    def _match_booking_references(self, lines: List[StatementLine], claimed: Dict[int, int]) -> None:
+        references = {line: set(BOOKING_REFERENCE_PATTERN.findall(line.reference)) for line in lines}
+        wanted = set().union(*references.values()) if references else set()
+        if not wanted:
+            return
+        payments_by_reference: Dict[str, List[Payment]] = {}
+        for payment, reference in self.db.query(Payment, Booking.booking_reference).join(
+            Booking, Booking.id == Payment.booking_id
+        ).filter(Booking.booking_reference.in_(wanted)):
+            payments_by_reference.setdefault(reference, []).append(payment)
+
+        for line, tokens in references.items():
+            candidates = [payment for token in tokens for payment in payments_by_reference.get(token, ())]
+            if not candidates:
+                continue
+            same_amount = self._open_candidates(
+                [payment for payment in candidates if payment.amount_minor == line.amount_minor], claimed
+            )
+            if len(same_amount) == 1:
+                self._claim(line, same_amount[0], "booking_reference", claimed)
+            elif same_amount:
+                line.resolve("mismatch", match="booking_reference", reason="nhiều payment cùng số tiền")
+            else:
+                line.resolve("mismatch", match="booking_reference", reason="không có payment khớp số tiền")
+
+    def _match_amount_and_date(self, lines: List[StatementLine], claimed: Dict[int, int]) -> None:
+        dated = [line for line in lines if line.date is not None]
+        if not dated:
+            return
+        window = timedelta(days=RECONCILE_DATE_WINDOW_DAYS)
+        candidates: Dict[int, List[Payment]] = {}
+        for payment in self.db.query(Payment).filter(
+            Payment.payment_status.in_((PaymentStatus.PENDING, PaymentStatus.COMPLETED)),
+            Payment.payment_method.in_(STATEMENT_METHODS),
+            Payment.amount_minor.in_({line.amount_minor for line in dated}),
+            Payment.created_at >= min(line.date for line in dated) - window,
+            Payment.created_at < max(line.date for line in dated) + timedelta(days=1)
+        ):
+            candidates.setdefault(payment.amount_minor, []).append(payment)
+
+        for line in dated:
+            found = self._open_candidates([
+                payment for payment in candidates.get(line.amount_minor, ())
+                if payment.currency == line.currency
+                and line.date - window <= _naive(payment.created_at) < line.date + timedelta(days=1)
+            ], claimed)
+            if len(found) == 1:
+                self._claim(line, found[0], "amount_date", claimed)
+            elif found:
+                line.resolve("mismatch", match="amount_date", reason=f"{len(found)} payment cùng số tiền và ngày")
+
+
+def _naive(value: datetime) -> datetime:
+    """created_at có thể mang tzinfo (MySQL TIMESTAMP) — so sánh theo UTC không tz như phần còn lại"""
+    if value.tzinfo is not None:
+        return value.replace(tzinfo=None) - value.utcoffset()
+    return value
@@ -1,16 +1,48 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, not_
+from sqlalchemy import and_, or_, not_, update, exists
 from fastapi import HTTPException, status
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import datetime, date, time
 import os
 from pathlib import Path
 
 from utils.gdrive import ensure_folder, list_files
-from models import Room, User, Hotel, Booking, BookingStatus, RoomType
+from utils.fulltext import hotel_match, room_match
+from services.amenity_service import AmenityService
+from services.outbox_service import record_events
+from utils.query_cache import invalidate_room
+from utils.textfold import fill_room_search_columns
+from models import Room, User, Hotel, Booking, BookingStatus, Payment, RoomType, RoomAllotment
 from schemas import RoomCreate, RoomUpdate, RoomResponse
 
 
+def active_booking_clause(now: Optional[datetime] = None):
+    """Bookings that hold their room: confirmed, or pending with a hold that has not expired"""
+    now = now or datetime.utcnow()
+    return or_(
+        Booking.status == BookingStatus.CONFIRMED,
+        and_(
+            Booking.status == BookingStatus.PENDING,
+            or_(Booking.expires_at.is_(None), Booking.expires_at > now)
+        )
+    )
+
+
+def sold_out_clause(check_in_date: date, check_out_date: date):
+    """Rooms whose type has no allotment left on some night of [check_in_date, check_out_date)"""
+    if isinstance(check_in_date, datetime):
+        check_in_date = check_in_date.date()
+    if isinstance(check_out_date, datetime):
+        check_out_date = check_out_date.date()
+    return exists().where(
+        RoomAllotment.hotel_id == Room.hotel_id,
+        RoomAllotment.room_type == Room.room_type,
+        RoomAllotment.date >= check_in_date,
+        RoomAllotment.date < check_out_date,
+        RoomAllotment.sold >= RoomAllotment.total
+    )
+
+
 class RoomService:
     """Service layer for room operations"""
     
@@ -60,9 +92,12 @@ class RoomService:
             is_available=True
         )
         
+        fill_room_search_columns(db_room)
         self.db.add(db_room)
+        AmenityService(self.db).sync_room(db_room)
         self.db.commit()
         self.db.refresh(db_room)
+        invalidate_room(db_room.hotel_id, db_room.id)
         
         return db_room
     
@@ -76,6 +111,23 @@ class RoomService:
             room.images = self._get_room_images(room.id)
         return room
     
+    def lock_room(self, room_id: int) -> Optional[Room]:
+        """
+        Load a room holding a write lock on its row until commit/rollback (no Drive calls).
+        Mọi thao tác giữ phòng cho một khoảng ngày khóa dòng phòng trước khi kiểm tra trùng lịch.
+        """
+        rooms = self.lock_rooms([room_id])
+        return rooms[0] if rooms else None
+    
+    def lock_rooms(self, room_ids: List[int]) -> List[Room]:
+        """Lock several rooms at once, in id order so concurrent lockers cannot deadlock"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            # SQLite bỏ qua FOR UPDATE: một UPDATE không đổi dữ liệu lấy write lock của DB
+            self.db.execute(
+                update(Room).where(Room.id.in_(room_ids)).values(updated_at=Room.updated_at)
+            )
+        return self.db.query(Room).filter(Room.id.in_(room_ids)).order_by(Room.id).with_for_update().populate_existing().all()
+    
     def get_rooms(
         self,
         skip: int = 0,
@@ -120,28 +172,11 @@ class RoomService:
                 )
             
             # Find rooms that are NOT booked for the given period
-            booked_room_ids = self.db.query(Booking.room_id).filter(
-                and_(
-                    Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PENDING]),
-                    or_(
-                        # Booking overlaps with requested period
-                        and_(
-                            Booking.check_in_date <= check_in_date,
-                            Booking.check_out_date > check_in_date
-                        ),
-                        and_(
-                            Booking.check_in_date < check_out_date,
-                            Booking.check_out_date >= check_out_date
-                        ),
-                        and_(
-                            Booking.check_in_date >= check_in_date,
-                            Booking.check_out_date <= check_out_date
-                        )
-                    )
-                )
-            ).subquery()
-            
-            query = query.filter(not_(Room.id.in_(booked_room_ids)))
+            booked_room_ids = self.booked_room_ids(check_in_date, check_out_date)
+            query = query.filter(
+                not_(Room.id.in_(booked_room_ids)),
+                not_(sold_out_clause(check_in_date, check_out_date))
+            )
         
         rooms = query.offset(skip).limit(limit).all()
         
@@ -151,6 +186,21 @@ class RoomService:
         
         return rooms
     
+    def booked_room_ids(self, check_in_date: date, check_out_date: date):
+        """Query of (non-NULL) room ids with an active booking overlapping [check_in_date, check_out_date)"""
+        # Booking lưu DATETIME: so sánh với datetime để SQLite không so chuỗi lệch định dạng
+        if not isinstance(check_in_date, datetime):
+            check_in_date = datetime.combine(check_in_date, time.min)
+        if not isinstance(check_out_date, datetime):
+            check_out_date = datetime.combine(check_out_date, time.min)
+        # Booking theo loại phòng chưa gán phòng (room_id NULL) không được lọt vào NOT IN
+        return self.db.query(Booking.room_id).filter(
+            active_booking_clause(),
+            Booking.room_id.isnot(None),
+            Booking.check_in_date < check_out_date,
+            Booking.check_out_date > check_in_date
+        )
+    
     def update_room(self, room_id: int, room_data: RoomUpdate, current_user: User) -> Room:
         """Update room information"""
         # Only admin can update rooms
@@ -168,6 +218,9 @@ class RoomService:
                 detail="Không tìm thấy phòng"
             )
         
+        previous_hotel_id = room.hotel_id
+        previous_room_type = room.room_type
+        
         # Check if room number is being changed and not already taken
         if room_data.room_number and room_data.room_number != room.room_number:
             existing_room = self.db.query(Room).filter(
@@ -190,10 +243,46 @@ class RoomService:
             if hasattr(room, field) and value is not None:
                 setattr(room, field, value)
         
+        if update_data.get("amenities") is not None:
+            AmenityService(self.db).sync_room(room)
+        fill_room_search_columns(room)
+        
         room.updated_at = datetime.utcnow()
         
+        if previous_hotel_id != room.hotel_id:
+            # Giữ bookings/payments.hotel_id (bản sao) khớp với khách sạn mới của phòng
+            booking_ids = self.db.query(Booking.id).filter(Booking.room_id == room.id)
+            self.db.query(Payment).filter(Payment.booking_id.in_(booking_ids)).update(
+                {Payment.hotel_id: room.hotel_id}, synchronize_session=False
+            )
+            self.db.query(Booking).filter(Booking.room_id == room.id).update(
+                {Booking.hotel_id: room.hotel_id}, synchronize_session=False
+            )
+            record_events(self.db, "updated", self.db.query(Booking).filter(
+                Booking.room_id == room.id
+            ).populate_existing())
+            record_events(self.db, "updated", self.db.query(Payment).filter(
+                Payment.booking_id.in_(booking_ids)
+            ).populate_existing())
+        
+        if previous_room_type != room.room_type:
+            # Booking chưa kết thúc giữ loại phòng của phòng: chuyển sang loại mới
+            upcoming = and_(Booking.room_id == room.id, Booking.check_out_date > datetime.utcnow())
+            self.db.query(Booking).filter(upcoming).update(
+                {Booking.room_type: room.room_type}, synchronize_session=False
+            )
+            record_events(self.db, "updated", self.db.query(Booking).filter(upcoming).populate_existing())
+        
+        if previous_hotel_id != room.hotel_id or previous_room_type != room.room_type:
+            # sold của allotment đếm booking theo (hotel, room_type): tính lại trong cùng transaction
+            from services.allotment_service import AllotmentService
+            AllotmentService(self.db).recount()
+        
         self.db.commit()
         self.db.refresh(room)
+        invalidate_room(room.hotel_id, room.id)
+        if previous_hotel_id != room.hotel_id:
+            invalidate_room(previous_hotel_id)
         
         return room
     
@@ -218,7 +307,7 @@ class RoomService:
         active_bookings = self.db.query(Booking).filter(
             and_(
                 Booking.room_id == room_id,
-                Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PENDING]),
+                active_booking_clause(),
                 Booking.check_out_date > datetime.utcnow().date()
             )
         ).count()
@@ -231,6 +320,7 @@ class RoomService:
         
         self.db.delete(room)
         self.db.commit()
+        invalidate_room(room.hotel_id, room_id)
         
         return True
     
@@ -259,7 +349,7 @@ class RoomService:
                 detail="Ngày check-in phải trước ngày check-out"
             )
         
-        room = self.get_room_by_id(room_id)
+        room = self.db.query(Room.is_available).filter(Room.id == room_id).first()
         
         if not room:
             raise HTTPException(
@@ -270,35 +360,21 @@ class RoomService:
         if not room.is_available:
             return False
         
-        # Build base conditions
-        base_conditions = [
-            Booking.room_id == room_id,
-            Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.PENDING])
-        ]
-
-        # Exclude a specific booking if provided (dùng khi xác nhận booking chính nó)
+        return not self.has_overlapping_booking(room_id, check_in_date, check_out_date, exclude_booking_id)
+    
+    def has_overlapping_booking(
+        self,
+        room_id: int,
+        check_in_date: date,
+        check_out_date: date,
+        exclude_booking_id: int | None = None,
+    ) -> bool:
+        """Whether an active booking of the room overlaps [check_in_date, check_out_date)"""
+        query = self.booked_room_ids(check_in_date, check_out_date).filter(Booking.room_id == room_id)
+        # Exclude a specific booking if provided (dùng khi xác nhận / đổi ngày booking chính nó)
         if exclude_booking_id is not None:
-            base_conditions.append(Booking.id != exclude_booking_id)
-
-        # Overlap conditions
-        overlap_conditions = or_(
-            and_(
-                Booking.check_in_date <= check_in_date,
-                Booking.check_out_date > check_in_date
-            ),
-            and_(
-                Booking.check_in_date < check_out_date,
-                Booking.check_out_date >= check_out_date
-            ),
-            and_(
-                Booking.check_in_date >= check_in_date,
-                Booking.check_out_date <= check_out_date
-            )
-        )
-
-        conflicting_bookings = self.db.query(Booking).filter(and_(*base_conditions, overlap_conditions)).count()
-        
-        return conflicting_bookings == 0
+            query = query.filter(Booking.id != exclude_booking_id)
+        return query.first() is not None
     
     def set_room_maintenance(self, room_id: int, is_maintenance: bool, current_user: User) -> Room:
         """Set room maintenance status"""
@@ -322,24 +398,26 @@ class RoomService:
         
         self.db.commit()
         self.db.refresh(room)
+        invalidate_room(room.hotel_id, room.id)
         
         return room
     
     def search_rooms(self, search_params: dict) -> List[Room]:
         """Advanced room search"""
         query = self.db.query(Room).options(joinedload(Room.hotel))
+        order_by = [Room.id]
         
-        # Location search (via hotel)
+        # Location search (via hotel full-text index)
         if search_params.get("location"):
-            location = f"%{search_params['location']}%"
-            query = query.join(Hotel).filter(
-                or_(
-                    Hotel.city.ilike(location),
-                    Hotel.country.ilike(location),
-                    Hotel.address.ilike(location),
-                    Hotel.name.ilike(location)
-                )
-            )
+            ranked_hotels = hotel_match(self.db, search_params["location"], location_only=True)
+            query = query.join(ranked_hotels, ranked_hotels.c.id == Room.hotel_id)
+            order_by.insert(0, ranked_hotels.c.score.desc())
+        
+        # Free-text search on room description, amenities, bed type
+        if search_params.get("search"):
+            ranked_rooms = room_match(self.db, search_params["search"])
+            query = query.join(ranked_rooms, ranked_rooms.c.id == Room.id)
+            order_by.insert(0, ranked_rooms.c.score.desc())
         
         # Price range
         if search_params.get("min_price"):
@@ -358,14 +436,15 @@ class RoomService:
         
         # Amenities
         if search_params.get("amenities"):
-            for amenity in search_params["amenities"]:
-                query = query.filter(Room.amenities.ilike(f"%{amenity}%"))
+            query = query.filter(
+                *AmenityService(self.db).amenity_filters(Room, search_params["amenities"])
+            )
         
         # Available only
         if search_params.get("available_only", True):
             query = query.filter(Room.is_available == True)
         
-        return query.all()
+        return query.order_by(*order_by).all()
     
     def get_room_stats(self, hotel_id: Optional[int] = None) -> dict:
         """Get room statistics"""
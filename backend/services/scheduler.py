@@ -0,0 +1,79 @@
+"""Periodic booking lifecycle transitions.
+
+Mỗi chu kỳ chạy các UPDATE theo lô (xem BookingService._transition_batches):
+  - PENDING hết hạn giữ chỗ -> CANCELLED (trả phòng / allotment)
+  - PENDING đã qua ngày trả phòng -> CANCELLED
+  - CONFIRMED đã qua ngày trả phòng -> COMPLETED
+
+và định kỳ (PAYMENT_VERIFY_SECONDS) xếp job đối soát số dư thanh toán của booking.
+
+Chạy trong worker (python -m backend.worker) và trong vòng sweep của API; nhiều
+tiến trình chạy cùng lúc vẫn an toàn vì mỗi lô dùng SKIP LOCKED + UPDATE có điều kiện.
+"""
+from typing import Callable, Dict
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from services.booking_service import BookingService
+from services.job_service import JobService
+from services.job_handlers import PAYMENT_BALANCE_VERIFY_JOB
+
+# Chu kỳ (giây) của scheduler (0 = tắt)
+BOOKING_LIFECYCLE_SECONDS = float(os.getenv("BOOKING_LIFECYCLE_SECONDS", "60"))
+# Chu kỳ (giây) đối soát amount_paid / amount_pending với bảng payments (0 = tắt)
+PAYMENT_VERIFY_SECONDS = float(os.getenv("PAYMENT_VERIFY_SECONDS", str(24 * 3600)))
+
+
+def run_booking_lifecycle(session_factory: Callable[[], Session]) -> Dict[str, int]:
+    """Run every transition once. Returns the number of bookings moved by each."""
+    db = session_factory()
+    try:
+        service = BookingService(db)
+        return {
+            "expired_holds": service.expire_holds(),
+            "expired_stale": service.expire_stale_pending(),
+            "completed": service.complete_stays(),
+        }
+    finally:
+        db.close()
+
+
+class LifecycleScheduler:
+    """Runs run_booking_lifecycle (and queues due verification jobs) every ``interval`` seconds until stopped"""
+
+    def __init__(self, session_factory: Callable[[], Session], interval: float = BOOKING_LIFECYCLE_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.next_verification = time.monotonic() + PAYMENT_VERIFY_SECONDS
+
+    def enqueue_due_verification(self) -> bool:
+        """Queue the payment balance verification job when its period has elapsed"""
+        if PAYMENT_VERIFY_SECONDS <= 0 or time.monotonic() < self.next_verification:
+            return False
+        self.next_verification = time.monotonic() + PAYMENT_VERIFY_SECONDS
+        db = self.session_factory()
+        try:
+            JobService(db).enqueue(PAYMENT_BALANCE_VERIFY_JOB, {"after_id": 0})
+        finally:
+            db.close()
+        return True
+
+    def run_once(self) -> Dict[str, int]:
+        self.enqueue_due_verification()
+        counts = run_booking_lifecycle(self.session_factory)
+        if any(counts.values()):
+            print(
+                f"⏰ Booking: {counts['expired_holds']} hết hạn giữ chỗ, "
+                f"{counts['expired_stale']} chờ quá hạn, {counts['completed']} hoàn tất"
+            )
+        return counts
+
+    def run_forever(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ Lỗi scheduler booking: {e}")
@@ -0,0 +1,246 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, distinct, literal, case, cast, union_all, String
+from fastapi import HTTPException, status
+from typing import Dict, List
+
+from models import Hotel, Room, RoomRate, RoomType
+from schemas import HotelSearchRequest
+from services.amenity_service import AmenityService
+from services.hotel_service import HotelService
+from services.pricing_service import PricingService
+from services.room_service import RoomService, sold_out_clause
+from utils.fulltext import hotel_match
+from utils.money import DEFAULT_CURRENCY, currency_exponent, to_major
+
+# Ngưỡng giá (VND/đêm) cho facet khoảng giá
+PRICE_BUCKETS = (500_000, 1_000_000, 2_000_000, 5_000_000)
+
+# Bộ lọc của từng facet: facet được đếm khi bỏ bộ lọc của chính nó
+FACET_FILTERS = {
+    "star_rating": ("min_rating", "star_ratings"),
+    "room_type": ("room_type",),
+    "price": ("min_price", "max_price"),
+}
+
+
+def _price_bucket_labels() -> List[str]:
+    bounds = (0,) + PRICE_BUCKETS
+    labels = [f"{lo}-{hi}" for lo, hi in zip(bounds, bounds[1:])]
+    labels.append(f"{PRICE_BUCKETS[-1]}+")
+    return labels
+
+
+class SearchService:
+    """
+    Unified hotel search: location, dates, guests, price, stars, amenities.
+
+    Tất cả điều kiện được gom vào một CTE các phòng còn trống ("candidates"),
+    rồi từ đó chạy 3 truy vấn tập hợp: trang khách sạn (+ tổng), phòng rẻ nhất
+    của từng khách sạn trong trang, và toàn bộ facet trong một UNION ALL (mỗi facet
+    đếm trên CTE bỏ bộ lọc của chính nó, để chọn một giá trị không làm mất các giá
+    trị khác). Giá để lọc, sắp xếp và chia khoảng là giá trung bình mỗi đêm theo lịch
+    giá (room_rates) của kỳ ở, cùng nguồn với total_price.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _nightly_price(params: HotelSearchRequest):
+        """Average nightly price of the stay from the rate calendar (price_per_night without dates)"""
+        if not (params.check_in_date and params.check_out_date):
+            return Room.price_per_night
+        nights = (params.check_out_date - params.check_in_date).days
+        factor = 10 ** currency_exponent(DEFAULT_CURRENCY)
+        overrides = select(func.sum(RoomRate.price_minor / factor - Room.price_per_night)).where(
+            RoomRate.room_id == Room.id,
+            RoomRate.date >= params.check_in_date,
+            RoomRate.date < params.check_out_date
+        ).correlate(Room).scalar_subquery()
+        return Room.price_per_night + func.coalesce(overrides, 0) / nights
+
+    def _candidate_rooms(self, params: HotelSearchRequest, name: str = "candidates"):
+        """CTE of (room_id, hotel_id, price, room_type, city, star_rating) matching every filter"""
+        price = self._nightly_price(params)
+        query = select(
+            Room.id.label("room_id"),
+            Room.hotel_id.label("hotel_id"),
+            price.label("price"),
+            Room.room_type.label("room_type"),
+            Hotel.city.label("city"),
+            Hotel.star_rating.label("star_rating")
+        ).join(Hotel, Hotel.id == Room.hotel_id).where(Room.is_available == True)
+
+        if params.location:
+            ranked = hotel_match(self.db, params.location, location_only=True)
+            query = query.join(ranked, ranked.c.id == Hotel.id)
+
+        if params.check_in_date and params.check_out_date:
+            booked_room_ids = RoomService(self.db).booked_room_ids(
+                params.check_in_date, params.check_out_date
+            )
+            query = query.where(
+                ~Room.id.in_(booked_room_ids),
+                ~sold_out_clause(params.check_in_date, params.check_out_date)
+            )
+
+        if params.guests:
+            query = query.where(Room.capacity >= params.guests)
+
+        if params.min_price is not None:
+            query = query.where(price >= params.min_price)
+
+        if params.max_price is not None:
+            query = query.where(price <= params.max_price)
+
+        if params.min_rating:
+            query = query.where(Hotel.star_rating >= params.min_rating)
+
+        if params.star_ratings:
+            query = query.where(Hotel.star_rating.in_(params.star_ratings))
+
+        if params.room_type:
+            query = query.where(Room.room_type == params.room_type)
+
+        if params.amenities:
+            query = query.where(*AmenityService(self.db).amenity_filters(Hotel, params.amenities))
+
+        return query.cte(name)
+
+    def _facets(self, params: HotelSearchRequest, candidates) -> Dict[str, List[dict]]:
+        """Facet counts (number of hotels) for city, stars, room type and price bucket"""
+        bucket_labels = _price_bucket_labels()
+
+        def price_bucket(c):
+            return case(
+                *[(c.c.price < bound, literal(label)) for bound, label in zip(PRICE_BUCKETS, bucket_labels)],
+                else_=literal(bucket_labels[-1])
+            )
+
+        def facet(name: str, column_of):
+            # Bỏ bộ lọc của chính facet (nếu có) khi đếm
+            cleared = {f: None for f in FACET_FILTERS.get(name, ()) if getattr(params, f) is not None}
+            c = self._candidate_rooms(params.model_copy(update=cleared), f"{name}_candidates") if cleared else candidates
+            column = column_of(c)
+            return select(
+                literal(name).label("facet"),
+                cast(column, String(255)).label("value"),
+                func.count(distinct(c.c.hotel_id)).label("count")
+            ).group_by(column)
+
+        rows = self.db.execute(union_all(
+            facet("city", lambda c: c.c.city),
+            facet("star_rating", lambda c: c.c.star_rating),
+            facet("room_type", lambda c: c.c.room_type),
+            facet("price", price_bucket)
+        )).all()
+
+        facets = {"city": [], "star_rating": [], "room_type": [], "price": []}
+        for name, value, count in rows:
+            if value is None:
+                continue
+            if name == "room_type" and value in RoomType.__members__:
+                # Enum được lưu theo tên (SINGLE, DOUBLE...)
+                value = RoomType[value].value
+            facets[name].append({"value": str(value), "count": count})
+
+        facets["city"].sort(key=lambda f: (-f["count"], f["value"]))
+        facets["star_rating"].sort(key=lambda f: int(f["value"]), reverse=True)
+        facets["room_type"].sort(key=lambda f: (-f["count"], f["value"]))
+        facets["price"].sort(key=lambda f: bucket_labels.index(f["value"]))
+        return facets
+
+    def search_hotels(self, params: HotelSearchRequest) -> dict:
+        """Search hotels with their cheapest available room and facet counts"""
+        if bool(params.check_in_date) != bool(params.check_out_date):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cần cả ngày check-in và ngày check-out"
+            )
+        if params.check_in_date and params.check_in_date >= params.check_out_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ngày check-in phải trước ngày check-out"
+            )
+
+        c = self._candidate_rooms(params)
+
+        # 1) Trang khách sạn + tổng số (window count)
+        min_price = func.min(c.c.price).label("min_price")
+        stars = func.max(c.c.star_rating).label("star_rating")
+        order_by = {
+            "price_asc": (min_price.asc(), c.c.hotel_id),
+            "price_desc": (min_price.desc(), c.c.hotel_id),
+            "rating_desc": (stars.desc(), min_price.asc(), c.c.hotel_id),
+        }[params.sort]
+        page_rows = self.db.execute(
+            select(
+                c.c.hotel_id,
+                min_price,
+                func.count().label("available_rooms"),
+                stars,
+                func.count().over().label("total")
+            )
+            .group_by(c.c.hotel_id)
+            .order_by(*order_by)
+            .offset((params.page - 1) * params.page_size)
+            .limit(params.page_size)
+        ).all()
+
+        if page_rows:
+            total = page_rows[0].total
+        else:
+            total = self.db.execute(select(func.count(distinct(c.c.hotel_id)))).scalar() or 0
+
+        # 2) Phòng rẻ nhất của từng khách sạn trong trang
+        hotel_ids = [row.hotel_id for row in page_rows]
+        cheapest_rooms = {}
+        hotels = {}
+        if hotel_ids:
+            rank = func.row_number().over(
+                partition_by=c.c.hotel_id,
+                order_by=(c.c.price, c.c.room_id)
+            ).label("rank")
+            ranked = select(c.c.room_id, rank).where(c.c.hotel_id.in_(hotel_ids)).subquery()
+            room_ids = self.db.execute(
+                select(ranked.c.room_id).where(ranked.c.rank == 1)
+            ).scalars().all()
+
+            for room in self.db.query(Room).filter(Room.id.in_(room_ids)).all():
+                cheapest_rooms[room.hotel_id] = room
+            for hotel in self.db.query(Hotel).filter(Hotel.id.in_(hotel_ids)).all():
+                hotels[hotel.id] = hotel
+
+        nights = None
+        stay_totals = {}
+        if params.check_in_date and params.check_out_date:
+            nights = (params.check_out_date - params.check_in_date).days
+            stay_totals = PricingService(self.db).stay_totals(
+                list(cheapest_rooms.values()), params.check_in_date, params.check_out_date
+            )
+
+        hotel_service = HotelService(self.db)
+        items = []
+        for row in page_rows:
+            hotel = hotels[row.hotel_id]
+            hotel.images = hotel_service._get_hotel_images(hotel.id)
+            room = cheapest_rooms.get(row.hotel_id)
+            items.append({
+                "hotel": hotel,
+                "min_price": row.min_price,
+                "available_rooms": row.available_rooms,
+                "cheapest_room": room,
+                "nights": nights,
+                "total_price": float(to_major(stay_totals[room.id], DEFAULT_CURRENCY)) if room and stay_totals else None,
+            })
+
+        # 3) Facet
+        facets = self._facets(params, c)
+
+        return {
+            "items": items,
+            "total": total,
+            "page": params.page,
+            "page_size": params.page_size,
+            "facets": facets,
+        }
@@ -0,0 +1,134 @@
+"""Payment gateway webhooks: receive fast, apply in batches.
+
+Request webhook chỉ kiểm tra chữ ký rồi INSERT sự kiện (bỏ qua event_id trùng nhờ
+unique (gateway, event_id)) và xếp một job xử lý, nên đợt webhook dồn dập chỉ tốn
+một INSERT mỗi request. Job lấy sự kiện theo lô bằng SKIP LOCKED, đổi trạng thái
+các payment đang chờ bằng PaymentService.settle_pending và đánh dấu sự kiện trong
+CÙNG transaction — chạy lại hay nhiều worker song song đều không xử lý hai lần.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
+from typing import Dict, Optional
+from datetime import datetime
+import json
+import os
+
+from models import Job, JobStatus, Payment, PaymentStatus, PaymentWebhookEvent, WebhookEventStatus
+from services.job_handlers import PAYMENT_WEBHOOK_JOB
+from services.job_service import JobService
+from services.payment_gateway import PaymentGateway
+from services.payment_service import PaymentService
+
+PAYMENT_WEBHOOK_BATCH = int(os.getenv("PAYMENT_WEBHOOK_BATCH", "200"))
+
+EVENT_STATUSES = {
+    "payment.succeeded": PaymentStatus.COMPLETED,
+    "payment.failed": PaymentStatus.FAILED,
+}
+
+
+def _occurred_at(value: str) -> datetime:
+    """Event time as naive UTC (mặc định: lúc xử lý)"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return parsed
+
+
+class WebhookService:
+    """Storage and batch processing of payment webhook events"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def receive(self, gateway: PaymentGateway, body: bytes, signature: Optional[str]) -> int:
+        """Verify and store the events of one webhook request. Returns the number of events in it."""
+        events = gateway.parse_events(body, signature)
+        if not events:
+            return 0
+        now = datetime.utcnow()
+        self.db.execute(
+            insert(PaymentWebhookEvent).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+            [
+                {
+                    "gateway": gateway.name,
+                    "event_id": event["event_id"],
+                    "event_type": event["event_type"],
+                    "transaction_id": event["transaction_id"],
+                    "payload": json.dumps(event, ensure_ascii=False),
+                    "status": WebhookEventStatus.RECEIVED,
+                    "created_at": now,
+                }
+                for event in events
+            ]
+        )
+        self.db.commit()
+        self.enqueue_processing()
+        return len(events)
+
+    def enqueue_processing(self) -> None:
+        """Queue a processing job unless one is already waiting (một đợt webhook -> một job)"""
+        waiting = self.db.query(Job.id).filter(
+            Job.kind == PAYMENT_WEBHOOK_JOB, Job.status == JobStatus.QUEUED
+        ).first()
+        self.db.rollback()
+        if waiting is None:
+            JobService(self.db).enqueue(PAYMENT_WEBHOOK_JOB, {})
+
+    def process_batch(self, batch_size: int = PAYMENT_WEBHOOK_BATCH) -> int:
+        """Apply one batch of received events. Returns the number of events handled."""
+        events = self.db.query(PaymentWebhookEvent).filter(
+            PaymentWebhookEvent.status == WebhookEventStatus.RECEIVED
+        ).order_by(PaymentWebhookEvent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not events:
+            self.db.rollback()
+            return 0
+
+        payments = {payment.transaction_id: payment for payment in self.db.query(Payment).filter(
+            Payment.transaction_id.in_({event.transaction_id for event in events})
+        )}
+        outcomes = {}
+        applied_by: Dict[int, PaymentWebhookEvent] = {}
+        errors: Dict[int, str] = {}
+        for event in events:
+            payload = json.loads(event.payload)
+            payment = payments.get(event.transaction_id)
+            if payment is None:
+                errors[event.id] = "không tìm thấy thanh toán"
+            elif payment.amount_minor != payload["amount_minor"] or payment.currency != payload["currency"]:
+                errors[event.id] = "số tiền không khớp thanh toán"
+            elif payment.id in applied_by:
+                errors[event.id] = f"thanh toán đã có sự kiện {applied_by[payment.id].event_id} trong lô"
+            else:
+                outcomes[payment.id] = (EVENT_STATUSES[event.event_type], _occurred_at(payload["occurred_at"]))
+                applied_by[payment.id] = event
+
+        moved = PaymentService(self.db).settle_pending(outcomes)
+        for payment_id, event in applied_by.items():
+            if payment_id not in moved:
+                errors[event.id] = "thanh toán không còn ở trạng thái chờ hoặc vượt tổng booking"
+
+        now = datetime.utcnow()
+        self.db.execute(update(PaymentWebhookEvent), [
+            {
+                "id": event.id,
+                "status": WebhookEventStatus.IGNORED if event.id in errors else WebhookEventStatus.PROCESSED,
+                "error": errors.get(event.id),
+                "processed_at": now,
+            }
+            for event in events
+        ])
+        self.db.commit()
+        return len(events)
+
+    def process_pending(self, batch_size: int = PAYMENT_WEBHOOK_BATCH) -> int:
+        """Process batches until no received event is left. Returns the number handled."""
+        handled = 0
+        while True:
+            count = self.process_batch(batch_size)
+            handled += count
+            if count < batch_size:
+                return handled
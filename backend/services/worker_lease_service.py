@@ -0,0 +1,117 @@
+"""Worker id leases for utils.ids.
+
+Tiến trình không đặt ID_WORKER_ID (API, job worker) thuê một worker id 0..MAX_WORKER_ID
+trong bảng id_worker_leases lúc khởi động và gia hạn mỗi ID_WORKER_LEASE_SECONDS / 3
+giây. Lease không được gia hạn quá ID_WORKER_LEASE_SECONDS thì tiến trình khác được
+lấy lại (tiến trình bị kill không trả lease); tiến trình phát hiện mình mất lease
+thì thuê id khác ngay. Hai tiến trình không bao giờ cùng giữ một id nhờ INSERT vào
+khóa chính / UPDATE có điều kiện trên lease đã hết hạn.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import os
+import secrets
+import socket
+import threading
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import IdWorkerLease
+from utils.ids import MAX_WORKER_ID, use_worker_id
+
+ID_WORKER_LEASE_SECONDS = float(os.getenv("ID_WORKER_LEASE_SECONDS", "300"))
+
+
+class WorkerIdLease:
+    """The worker id lease of this process"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        owner: Optional[str] = None,
+        lease_seconds: float = ID_WORKER_LEASE_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.lease_seconds = lease_seconds
+        self.worker_id: Optional[int] = None
+
+    def acquire(self) -> int:
+        """Lease a free (or expired) worker id and use it for new IDs of this process"""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            expired_before = now - timedelta(seconds=self.lease_seconds)
+            leases = dict(db.query(IdWorkerLease.worker_id, IdWorkerLease.renewed_at).all())
+            db.rollback()
+            free = [worker_id for worker_id in range(MAX_WORKER_ID + 1) if worker_id not in leases]
+            expired = sorted(
+                (worker_id for worker_id, renewed_at in leases.items() if renewed_at < expired_before),
+                key=leases.get
+            )
+            for worker_id in free:
+                db.add(IdWorkerLease(worker_id=worker_id, owner=self.owner, renewed_at=now))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # tiến trình khác vừa thuê id này
+                    continue
+                return self._use(worker_id)
+            for worker_id in expired:
+                taken = db.execute(
+                    update(IdWorkerLease)
+                    .where(IdWorkerLease.worker_id == worker_id, IdWorkerLease.renewed_at < expired_before)
+                    .values(owner=self.owner, renewed_at=now)
+                ).rowcount
+                db.commit()
+                if taken:
+                    return self._use(worker_id)
+        finally:
+            db.close()
+        raise RuntimeError("Không còn worker id trống để thuê (id_worker_leases)")
+
+    def _use(self, worker_id: int) -> int:
+        self.worker_id = worker_id
+        use_worker_id(worker_id)
+        return worker_id
+
+    def renew(self) -> bool:
+        """Extend the lease; re-acquire another id if it was lost. Returns True if the lease was kept."""
+        db = self.session_factory()
+        try:
+            kept = db.execute(
+                update(IdWorkerLease)
+                .where(IdWorkerLease.worker_id == self.worker_id, IdWorkerLease.owner == self.owner)
+                .values(renewed_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        if not kept:
+            print(f"⚠️ Mất lease worker id {self.worker_id}, thuê id mới")
+            self.acquire()
+        return bool(kept)
+
+    def release(self) -> None:
+        """Give the worker id back (lúc tắt tiến trình)"""
+        if self.worker_id is None:
+            return
+        use_worker_id(None)
+        db = self.session_factory()
+        try:
+            db.execute(delete(IdWorkerLease).where(
+                IdWorkerLease.worker_id == self.worker_id, IdWorkerLease.owner == self.owner
+            ))
+            db.commit()
+        finally:
+            db.close()
+        self.worker_id = None
+
+    def run_forever(self, stop: threading.Event) -> None:
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew()
+            except Exception as e:
+                print(f"⚠️ Lỗi gia hạn worker id: {e}")
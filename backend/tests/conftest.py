@@ -4,6 +4,16 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+# Test tự chạy job worker khi cần (JobWorker.run_once)
+os.environ.setdefault("JOB_WORKER_IN_PROCESS", "false")
+# Giữ chỗ có hạn (tắt mặc định) cho test sweeper
+os.environ.setdefault("BOOKING_HOLD_MINUTES", "30")
+# Cổng thanh toán giả lập (tắt mặc định) cho test webhook
+os.environ.setdefault("PAYMENT_SIMULATOR_ENABLED", "true")
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "test-webhook-secret")
+# new_id() ngoài lifespan của app (chưa thuê worker id từ DB)
+os.environ.setdefault("ID_HASHED_WORKER_ID", "true")
+
 # Không import gdrive khi chạy CI
 if os.getenv("CI", "").lower() != "true":
     import utils.gdrive
@@ -0,0 +1,93 @@
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import and_
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal
+from models import Booking, BookingStatus, Room, User
+from schemas import BookingBase
+from services.booking_service import BookingService
+
+# Số lượt đặt phòng song song của benchmark
+ATTEMPTS = int(os.getenv("BOOKING_CONCURRENCY_ATTEMPTS", "500"))
+WORKERS = int(os.getenv("BOOKING_CONCURRENCY_WORKERS", "32"))
+
+
+def _attempt(user_id: int, room_id: int, check_in: datetime, nights: int):
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        BookingService(db).create_booking(BookingBase(
+            user_id=user_id,
+            room_id=room_id,
+            check_in_date=check_in,
+            check_out_date=check_in + timedelta(days=nights),
+            guest_count=1
+        ), user)
+        return 201
+    except HTTPException as exc:
+        return exc.status_code
+    finally:
+        db.close()
+
+
+def test_parallel_bookings_never_overlap(client):
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.username == "admin").scalar()
+        room_ids = [room_id for (room_id,) in db.query(Room.id).filter(Room.is_available == True).limit(3)]
+    finally:
+        db.close()
+
+    # Mọi lượt tranh nhau 3 phòng trong 10 ngày
+    start = datetime(2040, 1, 1)
+    rng = random.Random(37)
+    attempts = [
+        (user_id, rng.choice(room_ids), start + timedelta(days=rng.randrange(10)), rng.randint(1, 3))
+        for _ in range(ATTEMPTS)
+    ]
+    # Cùng một phòng, cùng ngày: chỉ một lượt được thành công
+    attempts += [(user_id, room_ids[0], datetime(2040, 6, 1), 2)] * 50
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = Counter(pool.map(lambda args: _attempt(*args), attempts))
+    elapsed = time.perf_counter() - started
+    print(f"{len(attempts)} booking attempts in {elapsed:.2f}s: {dict(results)}")
+
+    assert set(results) <= {201, 400}
+    assert results[201] >= len(room_ids)
+
+    db = SessionLocal()
+    try:
+        other = aliased(Booking)
+        active = [BookingStatus.PENDING, BookingStatus.CONFIRMED]
+        overlaps = db.query(Booking.id, other.id).join(
+            other,
+            and_(
+                other.room_id == Booking.room_id,
+                other.id > Booking.id,
+                other.check_in_date < Booking.check_out_date,
+                other.check_out_date > Booking.check_in_date
+            )
+        ).filter(
+            Booking.room_id.in_(room_ids),
+            Booking.status.in_(active),
+            other.status.in_(active),
+            Booking.check_in_date >= start
+        ).all()
+        assert overlaps == []
+
+        same_stay = db.query(Booking).filter(
+            Booking.room_id == room_ids[0],
+            Booking.check_in_date == datetime(2040, 6, 1)
+        ).count()
+        assert same_stay == 1
+    finally:
+        db.close()
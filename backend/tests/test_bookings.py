@@ -4,3 +4,358 @@ def test_health_check(client):
     json_resp = response.json()
     assert json_resp["code"] == 200
     assert json_resp["data"]["api"] == "healthy"
+
+
+def _admin_headers(client):
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def test_booking_hotel_id_filters(client):
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    response = client.post("/api/v1/bookings/", json={
+        "room_id": room["id"],
+        "check_in_date": "2031-03-01",
+        "check_out_date": "2031-03-03",
+        "guest_count": 1
+    }, headers=headers)
+    assert response.status_code == 201
+    booking = response.json()["data"]
+    assert booking["hotel_id"] == 2
+
+    listed = client.get("/api/v1/bookings/", params={"hotel_id": 2}, headers=headers).json()["data"]
+    assert booking["id"] in [b["id"] for b in listed]
+    assert all(b["hotel_id"] == 2 for b in listed)
+    other = client.get("/api/v1/bookings/", params={"hotel_id": 3}, headers=headers).json()["data"]
+    assert booking["id"] not in [b["id"] for b in other]
+
+    stats = client.get("/api/v1/bookings/stats/overview", params={"hotel_id": 2}, headers=headers).json()["data"]
+    assert stats["pending_bookings"] >= 1
+
+
+def test_booking_by_room_type_allotment(client):
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    room_type = room["room_type"]
+
+    response = client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room_type,
+        "start_date": "2031-05-01",
+        "end_date": "2031-05-10",
+        "total": 1
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"]["updated_dates"] == 10
+
+    stay = {"hotel_id": 2, "room_type": room_type, "check_in_date": "2031-05-02", "check_out_date": "2031-05-04"}
+    response = client.post("/api/v1/bookings/by-type", json=stay, headers=headers)
+    assert response.status_code == 201
+    booking = response.json()["data"]
+    assert booking["room_id"] is None
+    assert booking["room_type"] == room_type
+    assert booking["hotel_id"] == 2
+
+    # Đêm 03/05 đã bán hết
+    overlapping = dict(stay, check_in_date="2031-05-03", check_out_date="2031-05-05")
+    assert client.post("/api/v1/bookings/by-type", json=overlapping, headers=headers).status_code == 400
+    availability = client.get("/api/v1/hotels/2/availability", params={
+        "check_in_date": "2031-05-03", "check_out_date": "2031-05-05"
+    }).json()["data"]
+    assert {"room_type": room_type, "available_rooms": 0} in availability
+
+    # Không thể giảm quỹ phòng xuống dưới số đã bán
+    response = client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room_type, "start_date": "2031-05-02", "end_date": "2031-05-02", "total": 0
+    }, headers=headers)
+    assert response.status_code == 400
+
+    response = client.post(f"/api/v1/bookings/{booking['id']}/assign-room", json={"room_id": room["id"]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"]["room_id"] == room["id"]
+
+    response = client.post(f"/api/v1/bookings/{booking['id']}/cancel/", headers=headers)
+    assert response.status_code == 200
+    assert client.post("/api/v1/bookings/by-type", json=overlapping, headers=headers).status_code == 201
+    allotments = client.get("/api/v1/hotels/2/allotments", params={
+        "start_date": "2031-05-02", "end_date": "2031-05-04", "room_type": room_type
+    }).json()["data"]
+    assert [a["sold"] for a in allotments] == [0, 1, 1]
+
+
+def test_allotment_and_per_room_bookings_share_inventory(client):
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    room_type = room["room_type"]
+    stay = {"check_in_date": "2039-01-10", "check_out_date": "2039-01-12", "guest_count": 1}
+
+    # Booking theo phòng có trước khi mở quỹ: được tính vào sold của đêm mới mở
+    per_room = client.post("/api/v1/bookings/", json=dict(stay, room_id=room["id"]), headers=headers)
+    assert per_room.status_code == 201 and per_room.json()["data"]["room_type"] == room_type
+    assert client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room_type, "start_date": "2039-01-01", "end_date": "2039-01-31", "total": 1
+    }, headers=headers).status_code == 200
+    allotments = client.get("/api/v1/hotels/2/allotments", params={
+        "start_date": "2039-01-10", "end_date": "2039-01-12", "room_type": room_type
+    }).json()["data"]
+    assert [a["sold"] for a in allotments] == [1, 1, 0]
+    by_type = dict(stay, hotel_id=2, room_type=room_type)
+    by_type.pop("guest_count")
+    assert client.post("/api/v1/bookings/by-type", json=by_type, headers=headers).status_code == 400
+
+    # Booking theo loại phòng chưa gán phòng chặn booking theo phòng, tìm kiếm và báo giá
+    later = {"check_in_date": "2039-01-20", "check_out_date": "2039-01-22"}
+    unassigned = client.post("/api/v1/bookings/by-type", json=dict(by_type, **later), headers=headers)
+    assert unassigned.status_code == 201
+    response = client.post("/api/v1/bookings/", json=dict(stay, room_id=room["id"], **later), headers=headers)
+    assert response.status_code == 400
+    listed = client.get("/api/v1/rooms/", params={
+        "hotel_id": 2, "check_in": "2039-01-20", "check_out": "2039-01-22"
+    }).json()["data"]
+    assert room["id"] not in [r["id"] for r in listed]
+    # ... nhưng không chặn các phòng khác (room_id NULL không được lọt vào NOT IN)
+    listed = client.get("/api/v1/rooms/", params={"check_in": "2039-01-20", "check_out": "2039-01-22"}).json()["data"]
+    assert {1, 3} <= {r["hotel_id"] for r in listed}
+    found = client.post("/api/v1/search/", json={
+        "check_in_date": "2039-01-20", "check_out_date": "2039-01-22", "page_size": 50
+    }).json()["data"]
+    assert {1, 3} <= {item["id"] for item in found["items"]}
+    quote = client.post("/api/v1/rooms/quotes", json={"items": [
+        {"room_id": room["id"], "check_in_date": "2039-01-20", "check_out_date": "2039-01-22"}
+    ]}).json()["data"][0]
+    assert quote["available"] is False
+
+    # Hủy thì trả quỹ, booking theo phòng lại đặt được
+    assert client.post(f"/api/v1/bookings/{unassigned.json()['data']['id']}/cancel/", headers=headers).status_code == 200
+    response = client.post("/api/v1/bookings/", json=dict(stay, room_id=room["id"], **later), headers=headers)
+    assert response.status_code == 201
+
+
+def test_status_edit_goes_through_cancel(client):
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    assert client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room["room_type"], "start_date": "2039-02-01", "end_date": "2039-02-28", "total": 1
+    }, headers=headers).status_code == 200
+    booking = client.post("/api/v1/bookings/by-type", json={
+        "hotel_id": 2, "room_type": room["room_type"], "check_in_date": "2039-02-10", "check_out_date": "2039-02-11"
+    }, headers=headers).json()["data"]
+
+    def sold():
+        return client.get("/api/v1/hotels/2/allotments", params={
+            "start_date": "2039-02-10", "end_date": "2039-02-10", "room_type": room["room_type"]
+        }).json()["data"][0]["sold"]
+
+    assert sold() == 1
+    assert client.put(f"/api/v1/bookings/{booking['id']}", json={"status": "completed"}, headers=headers).status_code == 400
+    response = client.put(f"/api/v1/bookings/{booking['id']}", json={"status": "cancelled"}, headers=headers)
+    assert response.status_code == 200 and response.json()["data"]["status"] == "cancelled"
+    assert sold() == 0
+
+
+def test_room_id_migration_rebuilds_sqlite_bookings():
+    from sqlalchemy import create_engine, inspect, text
+    from migrations import add_booking_room_types
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE bookings (id INTEGER NOT NULL PRIMARY KEY, room_id INTEGER NOT NULL, "
+            "check_in_date DATETIME NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_bookings_check_in ON bookings (check_in_date)"))
+        conn.execute(text("INSERT INTO bookings VALUES (1, 7, '2039-01-01 00:00:00')"))
+    for _ in range(2):
+        with engine.begin() as conn:
+            add_booking_room_types(conn)
+    with engine.begin() as conn:
+        columns = {c["name"]: c for c in inspect(conn).get_columns("bookings")}
+        assert columns["room_id"]["nullable"] and "room_type" in columns
+        assert [i["name"] for i in inspect(conn).get_indexes("bookings")] == ["ix_bookings_check_in"]
+        assert conn.execute(text("SELECT id, room_id FROM bookings")).all() == [(1, 7)]
+        conn.execute(text("INSERT INTO bookings (id, room_id, check_in_date) VALUES (2, NULL, '2039-01-02')"))
+
+
+def test_expired_holds_release_rooms(client):
+    from datetime import datetime, timedelta
+    from database import SessionLocal
+    from models import Booking, Payment, PaymentMethod, PaymentStatus
+    from services.booking_service import BookingService
+
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 3}).json()["data"][0]
+    stay = {"room_id": room["id"], "check_in_date": "2034-02-01", "check_out_date": "2034-02-03", "guest_count": 1}
+    booking = client.post("/api/v1/bookings/", json=stay, headers=headers).json()["data"]
+    assert booking["expires_at"] is not None
+    assert client.post("/api/v1/bookings/", json=stay, headers=headers).status_code == 400
+
+    db = SessionLocal()
+    try:
+        db.query(Booking).filter(Booking.id == booking["id"]).update(
+            {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+        )
+        db.commit()
+
+        # Hết hạn giữ chỗ: phòng trống lại ngay cả trước khi sweeper chạy
+        quote = client.post("/api/v1/rooms/quotes", json={"items": [
+            {"room_id": room["id"], "check_in_date": "2034-02-01", "check_out_date": "2034-02-03"}
+        ]}).json()["data"][0]
+        assert quote["available"] is True
+        assert client.post(f"/api/v1/bookings/{booking['id']}/confirm", headers=headers).status_code == 400
+
+        # Booking đã có thanh toán không bị sweeper hủy dù hết hạn giữ chỗ
+        paid_stay = dict(stay, check_in_date="2034-03-01", check_out_date="2034-03-03")
+        paid = client.post("/api/v1/bookings/", json=paid_stay, headers=headers).json()["data"]
+        db.query(Booking).filter(Booking.id == paid["id"]).update(
+            {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+        )
+        db.add(Payment(booking_id=paid["id"], amount_minor=100, payment_method=PaymentMethod.CASH,
+                       payment_status=PaymentStatus.PENDING, transaction_id=f"HOLD-{paid['id']}"))
+        db.commit()
+
+        assert BookingService(db).expire_holds(batch_size=1) >= 1
+        assert db.get(Booking, booking["id"]).status.value == "cancelled"
+        assert db.get(Booking, paid["id"]).status.value == "pending"
+    finally:
+        db.close()
+
+    assert client.post("/api/v1/bookings/", json=stay, headers=headers).status_code == 201
+
+
+def test_expired_by_type_holds_release_allotment_once(client):
+    from datetime import datetime, timedelta
+    from database import SessionLocal
+    from models import Booking
+    from services.booking_service import BookingService
+
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    assert client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room["room_type"], "start_date": "2041-01-01", "end_date": "2041-01-31", "total": 3
+    }, headers=headers).status_code == 200
+    stay = {"hotel_id": 2, "room_type": room["room_type"], "check_in_date": "2041-01-10", "check_out_date": "2041-01-12"}
+    ids = [client.post("/api/v1/bookings/by-type", json=stay, headers=headers).json()["data"]["id"] for _ in range(2)]
+
+    def sold():
+        return [a["sold"] for a in client.get("/api/v1/hotels/2/allotments", params={
+            "start_date": "2041-01-10", "end_date": "2041-01-11", "room_type": room["room_type"]
+        }).json()["data"]]
+
+    assert sold() == [2, 2]
+    db = SessionLocal()
+    try:
+        db.query(Booking).filter(Booking.id.in_(ids)).update(
+            {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+        )
+        db.commit()
+        assert BookingService(db).expire_holds() >= 2
+        assert BookingService(db).expire_holds() == 0
+    finally:
+        db.close()
+    assert sold() == [0, 0]
+
+
+def test_cancel_racing_the_sweeper_releases_once(client):
+    import pytest
+    from datetime import datetime, timedelta
+    from fastapi import HTTPException
+    from database import SessionLocal
+    from models import Booking, User
+    from services.booking_service import BookingService
+
+    headers = _admin_headers(client)
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 2}).json()["data"][0]
+    assert client.put("/api/v1/hotels/2/allotments", json={
+        "room_type": room["room_type"], "start_date": "2041-02-01", "end_date": "2041-02-28", "total": 2
+    }, headers=headers).status_code == 200
+    stay = {"hotel_id": 2, "room_type": room["room_type"], "check_in_date": "2041-02-10", "check_out_date": "2041-02-11"}
+    held = [client.post("/api/v1/bookings/by-type", json=stay, headers=headers).json()["data"]["id"] for _ in range(2)][0]
+
+    stale, sweeper = SessionLocal(), SessionLocal()
+    try:
+        admin = stale.query(User).filter(User.username == "admin").one()
+        loaded = stale.get(Booking, held)
+        assert loaded.status.value == "pending"
+        sweeper.query(Booking).filter(Booking.id == held).update(
+            {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+        )
+        sweeper.commit()
+        assert BookingService(sweeper).expire_holds() >= 1
+
+        # Phiên cũ vẫn thấy booking đang chờ nhưng UPDATE có điều kiện không khớp
+        with pytest.raises(HTTPException) as exc:
+            BookingService(stale).cancel_booking(held, admin)
+        assert exc.value.status_code == 400
+    finally:
+        stale.close()
+        sweeper.close()
+
+    assert client.get("/api/v1/hotels/2/allotments", params={
+        "start_date": "2041-02-10", "end_date": "2041-02-10", "room_type": room["room_type"]
+    }).json()["data"][0]["sold"] == 1
+
+
+def test_group_booking_is_all_or_nothing(client):
+    headers = _admin_headers(client)
+    rooms = client.get("/api/v1/rooms/").json()["data"]
+    first, second = rooms[0], rooms[1]
+    dates = {"check_in_date": "2036-07-01", "check_out_date": "2036-07-04"}
+
+    response = client.post("/api/v1/bookings/group", json=dict(dates, rooms=[
+        {"room_id": first["id"]}, {"room_id": second["id"], "guest_count": 1}
+    ]), headers=headers)
+    assert response.status_code == 201
+    group = response.json()["data"]
+    assert group["group_reference"].startswith("GRP-")
+    assert sorted(b["room_id"] for b in group["bookings"]) == sorted([first["id"], second["id"]])
+    assert all(b["group_reference"] == group["group_reference"] for b in group["bookings"])
+    assert len({b["booking_reference"] for b in group["bookings"]}) == 2
+    assert group["total_price"] == sum(b["total_price"] for b in group["bookings"])
+
+    # Một phòng đã bị đặt: không tạo booking nào
+    third = rooms[2]
+    response = client.post("/api/v1/bookings/group", json=dict(dates, rooms=[
+        {"room_id": third["id"]}, {"room_id": second["id"]}
+    ]), headers=headers)
+    assert response.status_code == 400
+    assert second["room_number"] in response.json()["detail"]
+    alone = client.post("/api/v1/bookings/", json=dict(dates, room_id=third["id"], guest_count=1), headers=headers)
+    assert alone.status_code == 201
+
+    response = client.post("/api/v1/bookings/group", json=dict(dates, rooms=[
+        {"room_id": first["id"]}, {"room_id": first["id"]}
+    ]), headers=headers)
+    assert response.status_code == 400
+
+
+def test_lifecycle_scheduler_completes_and_expires_past_stays(client):
+    from datetime import datetime
+    from database import SessionLocal
+    from models import Booking
+    from services.scheduler import LifecycleScheduler
+    from services.booking_service import BookingService
+
+    headers = _admin_headers(client)
+    rooms = client.get("/api/v1/rooms/").json()["data"]
+    stay = {"check_in_date": "2030-03-01", "check_out_date": "2030-03-03", "guest_count": 1}
+    confirmed = client.post("/api/v1/bookings/", json=dict(stay, room_id=rooms[0]["id"]), headers=headers).json()["data"]
+    assert client.post(f"/api/v1/bookings/{confirmed['id']}/confirm", headers=headers).status_code == 200
+    pending = client.post("/api/v1/bookings/", json=dict(stay, room_id=rooms[1]["id"]), headers=headers).json()["data"]
+
+    db = SessionLocal()
+    try:
+        # Booking tạo trước khi có hạn giữ chỗ
+        db.query(Booking).filter(Booking.id == pending["id"]).update({"expires_at": None})
+        db.commit()
+
+        service = BookingService(db)
+        assert service.complete_stays(now=datetime(2030, 3, 2)) == 0
+        assert service.complete_stays(batch_size=1, now=datetime(2030, 3, 4)) >= 1
+        assert service.expire_stale_pending(batch_size=1, now=datetime(2030, 3, 4)) >= 1
+        db.expire_all()
+        assert db.get(Booking, confirmed["id"]).status.value == "completed"
+        assert db.get(Booking, pending["id"]).status.value == "cancelled"
+    finally:
+        db.close()
+
+    assert set(LifecycleScheduler(SessionLocal).run_once()) == {"expired_holds", "expired_stale", "completed"}
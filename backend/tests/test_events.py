@@ -0,0 +1,95 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models import OutboxEvent, OutboxGap, Room
+from services import outbox_service
+from services.outbox_service import OutboxService
+
+
+def _headers(client, username="admin", password="admin123"):
+    login = client.post("/api/v1/users/login", json={"username": username, "password": password})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def _cursor(client, headers):
+    return client.get("/api/v1/events/", headers=headers).json()["data"]["last_id"]
+
+
+def test_booking_changes_appear_in_feed(client):
+    headers = _headers(client)
+    assert client.get("/api/v1/events/", headers=_headers(client, "guest1", "guest123")).status_code == 403
+    cursor = _cursor(client, headers)
+
+    room = client.get("/api/v1/rooms/").json()["data"][0]
+    booking = client.post("/api/v1/bookings/", json={
+        "room_id": room["id"], "check_in_date": "2037-05-01", "check_out_date": "2037-05-03", "guest_count": 1
+    }, headers=headers).json()["data"]
+    assert client.post(f"/api/v1/bookings/{booking['id']}/confirm", headers=headers).status_code == 200
+
+    data = client.get("/api/v1/events/", params={"after": cursor, "entity_type": "booking"}, headers=headers).json()["data"]
+    mine = [e for e in data["events"] if e["entity_id"] == booking["id"]]
+    assert [e["event_type"] for e in mine] == ["booking.created", "booking.updated"]
+    assert mine[-1]["payload"]["status"] == "confirmed"
+    assert mine[-1]["hotel_id"] == room["hotel_id"]
+    assert data["last_id"] >= mine[-1]["id"]
+
+    # Đọc tiếp từ last_id: không lặp lại sự kiện cũ
+    again = client.get("/api/v1/events/", params={"after": data["last_id"], "timeout": 0}, headers=headers).json()["data"]
+    assert again["events"] == [] and again["last_id"] == data["last_id"]
+
+
+def test_long_poll_waits_for_next_change(client):
+    headers = _headers(client)
+    cursor = _cursor(client, headers)
+
+    started = time.monotonic()
+    data = client.get("/api/v1/events/", params={"after": cursor, "timeout": 0.3}, headers=headers).json()["data"]
+    assert data["events"] == [] and time.monotonic() - started >= 0.3
+
+    def touch_room():
+        time.sleep(0.3)
+        db = SessionLocal()
+        try:
+            room = db.query(Room).first()
+            room.description = f"{room.description or ''} "
+            db.commit()
+        finally:
+            db.close()
+
+    writer = threading.Thread(target=touch_room)
+    writer.start()
+    started = time.monotonic()
+    data = client.get("/api/v1/events/", params={"after": cursor, "timeout": 10}, headers=headers).json()["data"]
+    writer.join()
+    assert time.monotonic() - started < 5
+    assert [e["event_type"] for e in data["events"]] == ["room.updated"]
+
+
+def test_feed_stops_before_recent_sequence_gap(client):
+    db = SessionLocal()
+    try:
+        service = OutboxService(db)
+        last = service.last_id()
+        now = datetime.utcnow()
+        # last + 1 còn thuộc một transaction chưa commit (hoặc đã rollback)
+        db.add(OutboxEvent(id=last + 2, entity_type="room", entity_id=0, event_type="room.updated",
+                           payload="{}", created_at=now))
+        db.commit()
+        assert service.read(last) == ([], last)
+
+        # Dòng sau lỗ đã cũ không đủ: tuổi của lỗ tính từ lúc reader thấy nó
+        db.query(OutboxEvent).filter(OutboxEvent.id == last + 2).update({"created_at": now - timedelta(minutes=5)})
+        db.commit()
+        assert service.read(last) == ([], last)
+
+        # Thời điểm thấy lỗ được lưu chung cho mọi tiến trình
+        gap = db.get(OutboxGap, last + 1)
+        assert gap is not None
+        gap.first_seen_at -= timedelta(seconds=outbox_service.OUTBOX_GAP_SECONDS)
+        db.commit()
+        events, cursor = service.read(last)
+        assert [e["id"] for e in events] == [last + 2] and cursor == last + 2
+    finally:
+        db.close()
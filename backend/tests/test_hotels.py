@@ -0,0 +1,109 @@
+def test_search_hotels_fulltext(client):
+    response = client.get("/api/v1/hotels/", params={"search": "Hanoi"})
+    assert response.status_code == 200
+    hotels = response.json()["data"]
+    assert hotels
+    assert hotels[0]["name"] == "Grand Hotel Hanoi"
+
+
+def test_search_hotels_by_location(client):
+    response = client.post("/api/v1/hotels/search", json={"location": "Nha Trang"})
+    assert response.status_code == 200
+    assert any(h["city"] == "Nha Trang" for h in response.json()["data"])
+
+
+def test_search_hotels_by_amenities(client):
+    response = client.post("/api/v1/hotels/search", json={"amenities": ["Spa", "Hồ bơi"]})
+    assert response.status_code == 200
+    names = {h["name"] for h in response.json()["data"]}
+    assert "Khách sạn Quê Hương" in names
+    assert "Grand Hotel Hanoi" not in names
+
+
+def test_nearby_hotels_sorted_by_distance(client):
+    # Hồ Hoàn Kiếm, Hà Nội
+    response = client.get("/api/v1/hotels/nearby", params={"lat": 21.0287, "lon": 105.8524, "radius": 5})
+    assert response.status_code == 200
+    hotels = response.json()["data"]
+    assert [h["name"] for h in hotels] == ["Grand Hotel Hanoi"]
+    assert hotels[0]["distance_km"] < 1
+
+    # Nha Trang: Hồ Chí Minh nằm trong 500 km, Hà Nội thì không
+    response = client.get("/api/v1/hotels/nearby", params={"lat": 12.24, "lon": 109.19, "radius": 500})
+    assert response.status_code == 200
+    assert [h["name"] for h in response.json()["data"]] == ["Beachfront Resort", "Khách sạn Quê Hương"]
+
+
+def test_fold_vietnamese():
+    from utils.textfold import fold
+    assert fold("  Đà   Nẵng ") == "da nang"
+    assert fold("Hồ Chí Minh") == "ho chi minh"
+
+
+def test_search_hotels_without_accents(client):
+    response = client.get("/api/v1/hotels/", params={"city": "ha noi"})
+    assert response.status_code == 200
+    assert [h["name"] for h in response.json()["data"]] == ["Grand Hotel Hanoi"]
+
+
+def test_city_and_country_filters_match_folded_prefix(client):
+    response = client.get("/api/v1/hotels/", params={"city": "Ha"})
+    assert [h["name"] for h in response.json()["data"]] == ["Grand Hotel Hanoi"]
+    # Lọc theo tiền tố, không phải chuỗi con
+    response = client.get("/api/v1/hotels/", params={"city": "noi"})
+    assert response.json()["data"] == []
+    response = client.get("/api/v1/hotels/", params={"country": "viet nam"})
+    assert len(response.json()["data"]) == 3
+    response = client.get("/api/v1/hotels/", params={"city": "%"})
+    assert response.json()["data"] == []
+
+
+def test_search_rooms_without_accents(client):
+    response = client.post("/api/v1/rooms/search", json={"search": "dong duong", "available_only": False})
+    assert response.status_code == 200
+    assert [r["description"] for r in response.json()["data"]] == ["Phòng đôi với phong cách Đông Dương"]
+
+
+def test_fulltext_requires_every_term(client):
+    # "spa" có ở cả 3 khách sạn, "hanoi" chỉ ở một
+    response = client.get("/api/v1/hotels/", params={"search": "hanoi spa"})
+    assert [h["name"] for h in response.json()["data"]] == ["Grand Hotel Hanoi"]
+    response = client.get("/api/v1/hotels/", params={"search": "hanoi nha trang"})
+    assert response.json()["data"] == []
+
+
+def test_mysql_match_filters_short_tokens_with_like():
+    from sqlalchemy.dialects import mysql
+    from models import Hotel
+    from utils.fulltext import HOTEL_LOCATION_COLUMNS, _mysql_match
+
+    sql = str(_mysql_match(Hotel, HOTEL_LOCATION_COLUMNS, ["da", "nang"]).compile(
+        dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}
+    ))
+    assert "'+nang*'" in sql
+    assert " LIKE " in sql and " da%" in sql
+    assert "'+da*'" not in sql
+
+
+def test_amenity_created_concurrently_is_reused():
+    from database import SessionLocal
+    from models import Amenity
+    from services.amenity_service import AmenityService
+
+    other = SessionLocal()
+    other.add(Amenity(name="Sân golf", code="sân golf", bit=None))
+    other.commit()
+    other.close()
+
+    db = SessionLocal()
+    try:
+        # Request này chưa thấy "sân golf" khi tra catalog, tạo trùng code -> dùng lại bản đã có
+        service = AmenityService(db)
+        amenity = service._create_amenity("Sân golf", "sân golf")
+        assert amenity.id is not None
+        assert db.query(Amenity).filter(Amenity.code == "sân golf").count() == 1
+        fresh = service.get_or_create_amenities(["Phòng xông hơi"])[0]
+        assert fresh.bit == db.query(Amenity.bit).order_by(Amenity.bit.desc()).first().bit
+    finally:
+        db.rollback()
+        db.close()
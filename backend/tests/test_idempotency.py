@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _admin_headers(client, key=None):
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    if key:
+        headers["Idempotency-Key"] = key
+    return headers
+
+
+def _stay(client, check_in, check_out):
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 1}).json()["data"][0]
+    return {"room_id": room["id"], "check_in_date": check_in, "check_out_date": check_out, "guest_count": 1}
+
+
+def test_retry_replays_first_response(client):
+    headers = _admin_headers(client, "retry-booking-1")
+    stay = _stay(client, "2035-03-01", "2035-03-02")
+
+    first = client.post("/api/v1/bookings/", json=stay, headers=headers)
+    assert first.status_code == 201
+    retry = client.post("/api/v1/bookings/", json=stay, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+
+    # Không có key: request thứ hai thật sự chạy và bị từ chối vì trùng lịch
+    assert client.post("/api/v1/bookings/", json=stay, headers=_admin_headers(client)).status_code == 400
+
+    # Cùng key, khác body
+    other = dict(stay, check_out_date="2035-03-03")
+    assert client.post("/api/v1/bookings/", json=other, headers=headers).status_code == 422
+
+
+def test_errors_are_replayed_but_key_is_per_user(client):
+    stay = _stay(client, "2035-04-01", "2035-04-02")
+    stay["guest_count"] = 99
+    headers = _admin_headers(client, "too-many-guests")
+    first = client.post("/api/v1/bookings/", json=stay, headers=headers)
+    assert first.status_code == 400
+    assert client.post("/api/v1/bookings/", json=stay, headers=headers).headers.get("idempotent-replayed") == "true"
+
+    login = client.post("/api/v1/users/login", json={"username": "guest1", "password": "guest123"})
+    guest = {"Authorization": f"Bearer {login.json()['access_token']}", "Idempotency-Key": "too-many-guests"}
+    assert "idempotent-replayed" not in client.post("/api/v1/bookings/", json=stay, headers=guest).headers
+
+
+def test_concurrent_duplicates_create_one_booking(client):
+    headers = _admin_headers(client, "concurrent-booking")
+    stay = _stay(client, "2035-05-01", "2035-05-03")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: client.post("/api/v1/bookings/", json=stay, headers=headers), range(8)))
+
+    assert {r.status_code for r in responses} == {201}
+    assert len({r.json()["data"]["id"] for r in responses}) == 1
+    assert sum("idempotent-replayed" in r.headers for r in responses) == 7
+
+
+def test_running_request_keeps_its_key(client):
+    from datetime import datetime, timedelta
+    from database import SessionLocal
+    from models import IdempotencyKey
+    from utils.idempotency import CLAIMED, IN_PROGRESS, idempotency_store
+
+    assert idempotency_store.claim("k" * 64, "r" * 64) == (CLAIMED, None)
+
+    def last_seen(age):
+        db = SessionLocal()
+        db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == "k" * 64).update({
+            "created_at": datetime.utcnow() - timedelta(hours=1),
+            "locked_at": datetime.utcnow() - age,
+        })
+        db.commit()
+        db.close()
+
+    # Chạy đã 1 giờ nhưng vừa gia hạn: request lặp lại vẫn phải chờ
+    last_seen(timedelta(hours=1))
+    idempotency_store.heartbeat("k" * 64)
+    assert idempotency_store.claim("k" * 64, "r" * 64) == (IN_PROGRESS, None)
+    # Không gia hạn quá IDEMPOTENCY_LOCK_SECONDS: worker đã chết, key được lấy lại
+    last_seen(timedelta(hours=1))
+    assert idempotency_store.claim("k" * 64, "r" * 64) == (CLAIMED, None)
+    idempotency_store.release("k" * 64)
+
+
+def test_large_body_is_rejected(client):
+    headers = _admin_headers(client, "large-body")
+    stay = _stay(client, "2035-06-01", "2035-06-02")
+    stay["special_requests"] = "x" * (1024 * 1024 + 1)
+    assert client.post("/api/v1/bookings/", json=stay, headers=headers).status_code == 413
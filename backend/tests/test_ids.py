@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.ids import IdGenerator, decode_base32, encode_base32, new_id, ID_LENGTH
+
+
+def test_ids_are_unique_and_time_ordered():
+    generator = IdGenerator(worker_id=7)
+    ids = [generator.next_id() for _ in range(50_000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(len(i) == ID_LENGTH and not set(i) & set("ILOU") for i in ids)
+
+
+def test_ids_are_unique_across_threads_and_workers():
+    first, second = IdGenerator(worker_id=1), IdGenerator(worker_id=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda i: (first if i % 2 else second).next_id(), range(20_000)))
+    assert len(set(ids)) == len(ids)
+
+
+def test_sequence_overflow_and_clock_skew_stay_monotonic():
+    generator = IdGenerator(worker_id=3)
+    generator._last_ms = int(1e12)  # đồng hồ "lùi" so với ID đã sinh
+    values = [generator.next_int() for _ in range(10_000)]
+    assert values == sorted(set(values))
+
+
+def test_base32_round_trip():
+    assert decode_base32(encode_base32(123456789)) == 123456789
+    assert decode_base32("o1l") == decode_base32("011")
+    assert len(new_id()) == ID_LENGTH
+
+
+def test_worker_id_leases_are_exclusive_and_reclaimed(monkeypatch):
+    from datetime import datetime, timedelta
+    import pytest
+    from database import SessionLocal, engine
+    from models import Base, IdWorkerLease
+    import services.worker_lease_service as leases
+
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(leases, "MAX_WORKER_ID", 1)  # chỉ 2 id: 0 và 1
+    first, second = leases.WorkerIdLease(SessionLocal, owner="a"), leases.WorkerIdLease(SessionLocal, owner="b")
+    third = leases.WorkerIdLease(SessionLocal, owner="c")
+    try:
+        assert {first.acquire(), second.acquire()} == {0, 1}
+        with pytest.raises(RuntimeError):
+            third.acquire()
+        assert first.renew()
+
+        # "b" không gia hạn quá hạn: "c" lấy lại id, "b" phát hiện mất lease khi gia hạn
+        db = SessionLocal()
+        db.query(IdWorkerLease).filter(IdWorkerLease.owner == "b").update(
+            {IdWorkerLease.renewed_at: datetime.utcnow() - timedelta(days=1)}
+        )
+        db.commit()
+        db.close()
+        assert third.acquire() == second.worker_id
+        with pytest.raises(RuntimeError):
+            second.renew()
+    finally:
+        for lease in (first, second, third):
+            lease.release()
@@ -0,0 +1,144 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models import Job, JobStatus
+from services import job_service
+from services.job_service import JobService, JobWorker, job_handler
+
+calls = []
+
+
+@job_handler("test.flaky")
+def flaky(db, payload):
+    calls.append(payload["n"])
+    if calls.count(payload["n"]) < payload["fail_times"] + 1:
+        raise RuntimeError("tạm thời lỗi")
+
+
+lease_seen = []
+
+
+@job_handler("test.lease")
+def lease(db, payload):
+    queued = db.query(Job).filter(Job.kind == "test.lease", Job.status == JobStatus.QUEUED).count()
+    lease_seen.append(queued)
+    return {"queued": queued}
+
+
+def _job(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+
+def _drain(worker):
+    while worker.run_once():
+        pass
+
+
+def test_failed_jobs_retry_with_backoff_until_done_or_dead(client, monkeypatch):
+    monkeypatch.setattr(job_service, "JOB_BACKOFF_SECONDS", 0)
+    db = SessionLocal()
+    try:
+        ok = JobService(db).enqueue("test.flaky", {"n": 1, "fail_times": 2}).id
+        dead = JobService(db).enqueue("test.flaky", {"n": 2, "fail_times": 10}, max_attempts=3).id
+        unknown = JobService(db).enqueue("test.unknown", {}).id
+    finally:
+        db.close()
+
+    _drain(JobWorker(SessionLocal, worker_id="test"))
+
+    assert _job(ok).status == JobStatus.DONE and _job(ok).attempts == 3
+    assert _job(dead).status == JobStatus.FAILED and _job(dead).attempts == 3
+    assert "tạm thời lỗi" in _job(dead).last_error
+    assert _job(unknown).status == JobStatus.FAILED and _job(unknown).attempts == 1
+
+
+def test_backoff_delays_retry_and_expired_lease_is_reclaimed(client):
+    db = SessionLocal()
+    try:
+        delayed = JobService(db).enqueue("test.flaky", {"n": 3, "fail_times": 1}).id
+        worker = JobWorker(SessionLocal, worker_id="test")
+        worker.run_once()
+        assert _job(delayed).status == JobStatus.QUEUED
+        assert _job(delayed).run_at > datetime.utcnow()
+        assert worker.run_once() == 0
+
+        # Worker chết khi đang chạy job: hết lease thì job được chạy lại
+        stuck = Job(kind="test.flaky", payload='{"n": 4, "fail_times": 0}', status=JobStatus.RUNNING,
+                    attempts=1, max_attempts=5, run_at=datetime.utcnow(), locked_by="dead",
+                    locked_at=datetime.utcnow() - timedelta(seconds=job_service.JOB_LEASE_SECONDS + 1))
+        db.add(stuck)
+        db.commit()
+        stuck_id = stuck.id
+    finally:
+        db.close()
+
+    assert worker.run_once() == 1
+    assert _job(stuck_id).status == JobStatus.DONE
+    assert _job(stuck_id).attempts == 2
+
+
+def test_worker_claims_each_job_just_before_running_it(client):
+    _drain(JobWorker(SessionLocal, worker_id="test"))
+    db = SessionLocal()
+    try:
+        ids = [JobService(db).enqueue("test.lease", {}).id for _ in range(3)]
+    finally:
+        db.close()
+
+    assert JobWorker(SessionLocal, worker_id="test", batch_size=3).run_once() == 3
+    # Khi một job chạy, các job sau của lô vẫn QUEUED (chưa bị claim, lease chưa bắt đầu)
+    assert lease_seen == [2, 1, 0]
+    assert all(_job(job_id).status == JobStatus.DONE for job_id in ids)
+    assert _job(ids[0]).result == '{"queued": 2}'
+
+
+def test_image_upload_is_queued(client, monkeypatch):
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    room = client.get("/api/v1/rooms/").json()["data"][0]
+
+    response = client.post(
+        f"/api/v1/rooms/{room['id']}/upload-images",
+        files=[("files", ("a.jpg", b"\xff\xd8fake", "image/jpeg"))],
+        headers=headers
+    )
+    assert response.status_code == 202
+    [queued] = response.json()["data"]
+    assert queued["status_url"] == f"/api/v1/jobs/{queued['job_id']}"
+
+    status = client.get(queued["status_url"], headers=headers).json()["data"]
+    assert status["status"] == "queued" and status["result"] is None
+    db = SessionLocal()
+    try:
+        job = db.get(Job, queued["job_id"])
+        assert job.kind == "drive.upload_image" and queued["filename"] in job.payload
+        spooled = os.path.join(os.getenv("MEDIA_ROOT", "media"), json.loads(job.payload)["path"])
+        assert open(spooled, "rb").read() == b"\xff\xd8fake"
+    finally:
+        db.close()
+
+    # Job xong: file tạm bị xóa, link Drive cố định nằm trong result
+    uploaded = []
+    monkeypatch.setattr("utils.gdrive.ensure_folder", lambda name, parent: f"folder-{name}")
+    monkeypatch.setattr("utils.gdrive.list_files", lambda folder: [])
+    monkeypatch.setattr("utils.gdrive.upload_bytes",
+                        lambda data, name, folder: uploaded.append(name) or ("id", f"https://drive/{name}"))
+    db = SessionLocal()
+    try:
+        assert JobService(db).run(db.get(Job, queued["job_id"]))
+    finally:
+        db.close()
+    status = client.get(queued["status_url"], headers=headers).json()["data"]
+    assert status["status"] == "done" and status["result"] == {"link": f"https://drive/{queued['filename']}"}
+    assert uploaded == [queued["filename"]] and not os.path.exists(spooled)
+
+    login = client.post("/api/v1/users/login", json={"username": "guest1", "password": "guest123"})
+    guest = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get(queued["status_url"], headers=guest).status_code == 403
+    assert client.get("/api/v1/jobs/999999999", headers=headers).status_code == 404
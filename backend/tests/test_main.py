@@ -9,3 +9,35 @@ def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["data"]["api"] == "healthy"
+
+def test_sweep_steps_fail_independently(monkeypatch):
+    import asyncio
+    import main
+
+    ran = []
+
+    class Scheduler:
+        def __init__(self, session_factory):
+            pass
+
+        def run_once(self):
+            raise RuntimeError("lifecycle down")
+
+    def failing_purge():
+        ran.append("idempotency")
+        raise RuntimeError("idempotency down")
+
+    def last_step():
+        ran.append("events")
+        raise asyncio.CancelledError  # dừng vòng lặp sau một chu kỳ
+
+    monkeypatch.setattr(main, "LifecycleScheduler", Scheduler)
+    monkeypatch.setattr(main.idempotency_store, "purge_expired", failing_purge)
+    monkeypatch.setattr(main, "purge_finished_jobs", lambda: ran.append("jobs"))
+    monkeypatch.setattr(main, "purge_old_events", last_step)
+    monkeypatch.setattr(main, "BOOKING_HOLD_SWEEP_SECONDS", 0)
+    try:
+        asyncio.run(main.sweep_booking_holds())
+    except asyncio.CancelledError:
+        pass
+    assert ran == ["idempotency", "jobs", "events"]
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+import pytest
+
+from utils.money import Money, to_major, to_minor
+
+
+def test_minor_unit_conversion_is_exact():
+    assert to_minor(0.1, "USD") + to_minor(0.2, "USD") == to_minor("0.3", "USD") == 30
+    assert to_minor(19.99, "USD") * 3 == 5997
+    assert to_minor(Decimal("0.005"), "USD") == 1  # làm tròn half up
+    assert to_minor(800000, "VND") == 800000 and to_minor(1.5, "VND") == 2
+    assert to_major(5997, "USD") == Decimal("59.97")
+
+
+def test_money_arithmetic_stays_in_one_currency():
+    total = sum((Money.from_major("33.33", "USD") for _ in range(3)), Money(1, "USD"))
+    assert total == Money.from_major(100, "USD") and str(total) == "100.00 USD"
+    assert Money(5, "VND") < Money(6, "VND")
+    with pytest.raises(ValueError):
+        Money(1, "USD") + Money(1, "VND")
+
+
+def test_room_rate_migration_converts_prices_to_minor_units():
+    from sqlalchemy import create_engine, inspect, text
+    from migrations import convert_room_rates_to_minor_units
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE room_rates (id INTEGER NOT NULL PRIMARY KEY, room_id INTEGER NOT NULL, "
+            "date DATE NOT NULL, price FLOAT NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO room_rates VALUES (1, 7, '2039-01-01', 850000.0)"))
+    for _ in range(2):
+        with engine.begin() as conn:
+            convert_room_rates_to_minor_units(conn)
+    with engine.begin() as conn:
+        assert "price" not in {c["name"] for c in inspect(conn).get_columns("room_rates")}
+        assert conn.execute(text("SELECT price_minor FROM room_rates")).scalar() == 850000
@@ -0,0 +1,319 @@
+import json
+import random
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from database import SessionLocal
+from models import Booking, Job, JobStatus, Payment, PaymentMethod, PaymentStatus, PaymentWebhookEvent
+from services.job_handlers import PAYMENT_WEBHOOK_JOB
+from services.payment_gateway import SIGNATURE_HEADER, SimulatedGateway, get_gateway
+from services.payment_service import PaymentService
+from services.webhook_service import WebhookService
+
+
+def _admin_headers(client):
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def _confirmed_booking(client, headers, check_in, check_out):
+    room = client.get("/api/v1/rooms/").json()["data"][0]
+    booking = client.post("/api/v1/bookings/", json={
+        "room_id": room["id"], "check_in_date": check_in, "check_out_date": check_out, "guest_count": 1
+    }, headers=headers).json()["data"]
+    assert client.post(f"/api/v1/bookings/{booking['id']}/confirm", headers=headers).status_code == 200
+    return booking
+
+
+def _pay(client, headers, booking_id, amount):
+    response = client.post("/api/v1/payments/", json={
+        "booking_id": booking_id, "amount": amount, "payment_method": "credit_card"
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["data"]
+
+
+def _balance(client, headers, booking_id):
+    data = client.get(f"/api/v1/payments/booking/{booking_id}/status", headers=headers).json()["data"]
+    return data["total_paid"], data["total_pending"]
+
+
+def test_payment_transitions_maintain_booking_balance(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-01-10", "2038-01-12")
+    total = booking["total_price"]
+
+    deposit = _pay(client, headers, booking["id"], total / 2)
+    assert deposit["payment_status"] == "pending" and deposit["transaction_id"].startswith("TXN_")
+    assert _balance(client, headers, booking["id"]) == (0, total / 2)
+
+    assert client.post(f"/api/v1/payments/{deposit['id']}/process", headers=headers).status_code == 200
+    assert _balance(client, headers, booking["id"]) == (total / 2, 0)
+
+    cancelled = _pay(client, headers, booking["id"], total / 4)
+    failed = _pay(client, headers, booking["id"], total / 8)
+    deleted = _pay(client, headers, booking["id"], total / 8)
+    assert _balance(client, headers, booking["id"]) == (total / 2, total / 2)
+    # Payment đang chờ cũng tính vào tổng: không thể tạo thêm hay tăng số tiền
+    response = client.post("/api/v1/payments/", json={
+        "booking_id": booking["id"], "amount": 1, "payment_method": "cash"
+    }, headers=headers)
+    assert response.status_code == 400
+    assert client.put(f"/api/v1/payments/{deleted['id']}", json={"amount": total / 4}, headers=headers).status_code == 400
+    assert client.put(f"/api/v1/payments/{cancelled['id']}", json={"amount": total / 8}, headers=headers).status_code == 200
+    assert client.post(f"/api/v1/payments/{cancelled['id']}/cancel", headers=headers).status_code == 200
+    assert client.post(f"/api/v1/payments/{failed['id']}/fail", params={"reason": "thẻ bị từ chối"}, headers=headers).status_code == 200
+    assert _balance(client, headers, booking["id"]) == (total / 2, total / 8)
+    # Khôi phục payment đã hủy về chờ: lại được tính vào tổng
+    restore = client.put(f"/api/v1/payments/{cancelled['id']}", json={"payment_status": "pending"}, headers=headers)
+    assert restore.status_code == 200
+    assert _balance(client, headers, booking["id"]) == (total / 2, total / 4)
+    assert client.post(f"/api/v1/payments/{cancelled['id']}/cancel", headers=headers).status_code == 200
+    assert client.delete(f"/api/v1/payments/{deleted['id']}", headers=headers).status_code == 200
+    assert _balance(client, headers, booking["id"]) == (total / 2, 0)
+
+    # Vượt tổng booking
+    response = client.post("/api/v1/payments/", json={
+        "booking_id": booking["id"], "amount": total, "payment_method": "cash"
+    }, headers=headers)
+    assert response.status_code == 400
+
+
+def test_verification_repairs_drifted_balance(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-02-10", "2038-02-12")
+    payment = _pay(client, headers, booking["id"], 100)
+    client.post(f"/api/v1/payments/{payment['id']}/process", headers=headers)
+
+    db = SessionLocal()
+    try:
+        db.query(Booking).filter(Booking.id == booking["id"]).update({"amount_paid_minor": 5, "amount_pending_minor": 7})
+        db.commit()
+
+        fixed, after_id = PaymentService(db).verify_balances(after_id=booking["id"] - 1, batch_size=1)
+        assert fixed == 1 and after_id == booking["id"]
+        assert PaymentService(db).verify_balances(after_id=booking["id"] - 1, batch_size=1)[0] == 0
+    finally:
+        db.close()
+    assert _balance(client, headers, booking["id"]) == (100, 0)
+
+
+def test_completion_never_pushes_paid_past_total(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-08-10", "2038-08-12")
+    total = booking["total_price"]
+    first = _pay(client, headers, booking["id"], total)
+
+    # Payment ghi thẳng vào DB (dữ liệu cũ): cả hai cùng chờ, chỉ một được hoàn thành
+    db = SessionLocal()
+    try:
+        extra = Payment(booking_id=booking["id"], hotel_id=booking["hotel_id"], amount_minor=int(total),
+                        payment_method=PaymentMethod.CASH, payment_status=PaymentStatus.PENDING,
+                        transaction_id=f"LEGACY-{booking['id']}", currency=booking["currency"])
+        db.add(extra)
+        db.commit()
+        completed = PaymentService(db).complete_pending({first["id"]: datetime.utcnow(), extra.id: datetime.utcnow()})
+        assert completed == {first["id"]}
+        extra_id = extra.id
+    finally:
+        db.close()
+
+    assert client.post(f"/api/v1/payments/{extra_id}/process", headers=headers).status_code == 400
+    assert client.get(f"/api/v1/payments/{extra_id}", headers=headers).json()["data"]["payment_status"] == "pending"
+    status = client.get(f"/api/v1/payments/booking/{booking['id']}/status", headers=headers).json()["data"]
+    assert status["total_paid"] == total
+
+
+def test_split_payments_settle_booking_exactly(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-03-10", "2038-03-12")
+    assert booking["currency"] == "VND" and booking["amount_paid"] == 0
+    total = booking["total_price"]
+
+    response = client.post("/api/v1/payments/", json={
+        "booking_id": booking["id"], "amount": total, "payment_method": "cash", "currency": "USD"
+    }, headers=headers)
+    assert response.status_code == 400
+
+    # Hai phần có số lẻ (VND làm tròn xuống đồng) + phần còn lại: tổng khớp tuyệt đối với tổng booking
+    third = total // 3
+    for amount in [third + 0.4, third + 0.4, total - 2 * third]:
+        payment = _pay(client, headers, booking["id"], amount)
+        assert client.post(f"/api/v1/payments/{payment['id']}/process", headers=headers).status_code == 200
+
+    status = client.get(f"/api/v1/payments/booking/{booking['id']}/status", headers=headers).json()["data"]
+    assert status["remaining_balance"] == 0 and status["is_fully_paid"]
+    assert status["total_paid"] == total and status["currency"] == "VND"
+
+
+def test_reconcile_statement_streams_report_and_settles_matches(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-04-10", "2038-04-12")
+
+    def pay(amount, method):
+        response = client.post("/api/v1/payments/", json={
+            "booking_id": booking["id"], "amount": amount, "payment_method": method
+        }, headers=headers)
+        assert response.status_code == 201, response.text
+        return response.json()["data"]
+
+    by_txn, by_reference, by_amount = pay(1000, "bank_transfer"), pay(2000, "momo"), pay(3037, "bank_transfer")
+    today = datetime.utcnow().strftime("%d/%m/%Y")
+    statement = "\n".join([
+        "Ngay,So tien,Noi dung",
+        f"{today},\"1,000\",CK {by_txn['transaction_id']} thanh toan",
+        f"{today},2000,MOMO {booking['booking_reference']}",
+        f"{today},3037,chuyen khoan khach san",
+        f"{today},999,{by_txn['transaction_id']}",
+        f"{today},4242,khong ro",
+        "hom qua,abc,loi",
+    ])
+
+    def reconcile(dry_run):
+        response = client.post(
+            "/api/v1/payments/reconcile", params={"dry_run": dry_run},
+            files={"file": ("statement.csv", statement.encode(), "text/csv")}, headers=headers
+        )
+        assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    report = reconcile(True)
+    assert report[-1]["summary"] == {
+        "matched": 3, "mismatch": 1, "unknown": 1, "invalid": 1, "completed": 0, "dry_run": True
+    }
+    assert _balance(client, headers, booking["id"]) == (0, 6037)
+
+    report = reconcile(False)
+    rows = {row["line"]: row for row in report[:-1]}
+    assert [rows[line]["match"] for line in (2, 3, 4)] == ["transaction_id", "booking_reference", "amount_date"]
+    assert [rows[line]["payment_id"] for line in (2, 3, 4)] == [by_txn["id"], by_reference["id"], by_amount["id"]]
+    assert rows[5]["status"] == "mismatch" and rows[6]["status"] == "unknown" and rows[7]["status"] == "invalid"
+    assert report[-1]["summary"]["completed"] == 3
+    assert _balance(client, headers, booking["id"]) == (6037, 0)
+
+    # Nhập lại cùng sao kê: không hoàn thành lần hai, cả ba cách khớp báo giống nhau
+    report = reconcile(False)
+    assert report[-1]["summary"]["completed"] == 0 and report[-1]["summary"]["matched"] == 3
+    rows = {row["line"]: row for row in report[:-1]}
+    assert [(rows[line]["status"], rows[line]["reason"]) for line in (2, 3, 4)] == [
+        ("matched", "đã hoàn thành trước đó")
+    ] * 3
+
+    # Một payment chỉ khớp một dòng trong cả sao kê, kể cả khi hai dòng nằm ở hai lô khác nhau
+    from database import SessionLocal
+    from services.reconciliation_service import ReconciliationService
+    db = SessionLocal()
+    try:
+        report = list(ReconciliationService(db, chunk_size=1).reconcile([
+            {"amount": "1000", "transaction_id": by_txn["transaction_id"]},
+            {"amount": "1000", "transaction_id": by_txn["transaction_id"]},
+        ], dry_run=True))
+    finally:
+        db.close()
+    assert report[0]["status"] == "matched"
+    assert (report[1]["status"], report[1]["reason"]) == ("mismatch", "trùng với dòng 2")
+
+    response = client.post("/api/v1/payments/reconcile", files={"file": ("x.csv", b"foo,bar\n1,2", "text/csv")},
+                           headers=headers)
+    assert response.status_code == 400
+
+
+def test_gateway_webhooks_are_stored_once_and_applied_in_batches(client):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-05-10", "2038-05-12")
+    succeeded, failed = _pay(client, headers, booking["id"], 500), _pay(client, headers, booking["id"], 700)
+
+    def payment(data):
+        return Payment(transaction_id=data["transaction_id"], amount_minor=int(data["amount"]), currency=data["currency"])
+
+    always_twice = SimulatedGateway(failure_rate=0, duplicate_rate=1, rng=random.Random(1))
+    deliveries = always_twice.webhooks(payment(succeeded))
+    deliveries += SimulatedGateway(failure_rate=1, duplicate_rate=0).webhooks(payment(failed))
+    # Sự kiện khác id cho payment đã có kết quả: bị bỏ qua khi xử lý
+    deliveries += always_twice.webhooks(payment(succeeded))[:1]
+    assert len(deliveries) == 4
+
+    forged = client.post("/api/v1/payments/webhooks/simulator", content=deliveries[0][0],
+                         headers={SIGNATURE_HEADER: "sha256=00"})
+    assert forged.status_code == 401
+    for body, webhook_headers in deliveries:
+        response = client.post("/api/v1/payments/webhooks/simulator", content=body, headers=webhook_headers)
+        assert response.status_code == 202 and response.json()["data"]["received"] == 1
+    assert client.post("/api/v1/payments/webhooks/nope", content=b"{}").status_code == 404
+
+    db = SessionLocal()
+    try:
+        events = db.query(PaymentWebhookEvent).filter(
+            PaymentWebhookEvent.transaction_id.in_([succeeded["transaction_id"], failed["transaction_id"]])
+        )
+        assert events.count() == 3  # bản gửi trùng bị bỏ khi nhận
+        assert db.query(Job).filter(Job.kind == PAYMENT_WEBHOOK_JOB, Job.status == JobStatus.QUEUED).count() == 1
+        assert WebhookService(db).process_pending(batch_size=2) >= 3
+        assert sorted(event.status.value for event in events) == ["ignored", "processed", "processed"]
+    finally:
+        db.close()
+
+    assert client.get(f"/api/v1/payments/{succeeded['id']}", headers=headers).json()["data"]["payment_status"] == "completed"
+    assert client.get(f"/api/v1/payments/{failed['id']}", headers=headers).json()["data"]["payment_status"] == "failed"
+    assert _balance(client, headers, booking["id"]) == (500, 0)
+
+
+def test_charge_submits_pending_payment_to_gateway(client, monkeypatch):
+    headers = _admin_headers(client)
+    booking = _confirmed_booking(client, headers, "2038-06-10", "2038-06-12")
+    pending = _pay(client, headers, booking["id"], 300)
+
+    sent = []
+    gateway = get_gateway("simulator")
+    monkeypatch.setattr(gateway, "deliver", lambda body, webhook_headers: sent.append(body))
+    monkeypatch.setattr(gateway, "latency_ms", (0, 0))
+    response = client.post(f"/api/v1/payments/{pending['id']}/charge", headers=headers)
+    assert response.status_code == 202 and response.json()["data"]["payment_status"] == "pending"
+
+    deadline = time.monotonic() + 5
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(sent[0])["events"][0]["transaction_id"] == pending["transaction_id"]
+
+    login = client.post("/api/v1/users/login", json={"username": "guest1", "password": "guest123"})
+    guest = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.post(f"/api/v1/payments/{pending['id']}/charge", headers=guest).status_code == 403
+    # Không cấu hình secret: mọi webhook bị từ chối, kể cả khi chữ ký rỗng khớp
+    unsigned = SimulatedGateway(secret="")
+    body, webhook_headers = unsigned.webhooks(Payment(transaction_id="x", amount_minor=1, currency="VND"))[0]
+    with pytest.raises(HTTPException) as error:
+        unsigned.parse_events(body, webhook_headers[SIGNATURE_HEADER])
+    assert error.value.status_code == 503
+
+
+def test_batch_payment_status_matches_single_lookup(client):
+    headers = _admin_headers(client)
+    paid = _confirmed_booking(client, headers, "2038-07-10", "2038-07-12")
+    unpaid = _confirmed_booking(client, headers, "2038-07-14", "2038-07-16")
+    payment = _pay(client, headers, paid["id"], 400)
+    client.post(f"/api/v1/payments/{payment['id']}/process", headers=headers)
+    _pay(client, headers, paid["id"], 100)
+
+    response = client.post("/api/v1/payments/status/batch", json={
+        "booking_ids": [unpaid["id"], paid["id"], 10 ** 9, paid["id"]]
+    }, headers=headers)
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [item["booking_id"] for item in data["items"]] == [unpaid["id"], paid["id"]]
+    assert data["not_found"] == [10 ** 9]
+    single = client.get(f"/api/v1/payments/booking/{paid['id']}/status", headers=headers).json()["data"]
+    assert data["items"][1] == single
+    assert (single["total_paid"], single["total_pending"], single["payment_count"]) == (400, 100, 2)
+    assert single["remaining_balance"] == paid["total_price"] - 400
+    assert data["items"][0]["payment_count"] == 0 and data["items"][0]["remaining_balance"] == unpaid["total_price"]
+
+    login = client.post("/api/v1/users/login", json={"username": "guest1", "password": "guest123"})
+    guest = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    response = client.post("/api/v1/payments/status/batch", json={"booking_ids": [paid["id"]]}, headers=guest)
+    assert response.json()["data"] == {"items": [], "not_found": [paid["id"]]}
+    assert client.get(f"/api/v1/payments/booking/{paid['id']}/status", headers=guest).status_code == 403
+    too_many = client.post("/api/v1/payments/status/batch", json={"booking_ids": list(range(1, 502))}, headers=headers)
+    assert too_many.status_code == 422
@@ -0,0 +1,67 @@
+import time
+
+from utils.query_cache import QueryCache, query_cache
+
+
+def test_key_ignores_order_and_empty_values():
+    a = QueryCache.make_key("rooms", {"city": " Hà Nội ", "amenities": ["Spa", "WiFi"], "min_price": None})
+    b = QueryCache.make_key("rooms", {"amenities": ["WiFi", "Spa"], "city": "Hà Nội", "search": ""})
+    assert a == b
+    assert a != QueryCache.make_key("hotels", {"city": "Hà Nội", "amenities": ["Spa", "WiFi"]})
+
+
+def test_lru_ttl_and_tags():
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1, tags={"hotel:1"})
+    cache.set("b", 2, tags={"hotel:2"})
+    assert cache.get("a") == 1
+    cache.set("c", 3, tags={"hotel:1"})  # "b" là entry dùng lâu nhất -> bị loại
+    assert cache.get("b") is None
+    assert cache.invalidate("hotel:1") == 2
+    assert cache.get("a") is None and cache.get("c") is None
+
+    cache.ttl_seconds = 0.01
+    cache.set("d", 4)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["evictions"] == 1 and stats["entries"] == 0
+
+
+def test_hotel_list_is_cached_and_invalidated(client):
+    query_cache.clear()
+    params = {"city": "Nha Trang"}
+    first = client.get("/api/v1/hotels/", params=params).json()["data"]
+    hits = query_cache.hits
+    assert client.get("/api/v1/hotels/", params=params).json()["data"] == first
+    assert query_cache.hits == hits + 1
+
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    token = login.json()["access_token"]
+    hotel_id = first[0]["id"]
+    response = client.put(
+        f"/api/v1/hotels/{hotel_id}",
+        json={"description": "Resort mới sửa"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    updated = client.get("/api/v1/hotels/", params=params).json()["data"]
+    assert updated[0]["description"] == "Resort mới sửa"
+
+    health = client.get("/health").json()["data"]["query_cache"]
+    assert health["hits"] >= 1 and 0 <= health["hit_ratio"] <= 1
+
+
+def test_allotment_changes_invalidate_cached_availability(client):
+    login = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    params = {"hotel_id": 3, "check_in": "2042-03-10", "check_out": "2042-03-11"}
+    rooms = client.get("/api/v1/rooms/", params=params).json()["data"]
+    room = rooms[0]
+
+    # Đóng quỹ loại phòng: danh sách đã cache theo ngày phải bỏ phòng đó
+    assert client.put("/api/v1/hotels/3/allotments", json={
+        "room_type": room["room_type"], "start_date": "2042-03-10", "end_date": "2042-03-10", "total": 0
+    }, headers=headers).status_code == 200
+    remaining = client.get("/api/v1/rooms/", params=params).json()["data"]
+    assert room["id"] not in [r["id"] for r in remaining]
@@ -36,3 +36,155 @@ def test_create_and_update_room(client):
 
     delete_resp = client.delete(f"/api/v1/rooms/{room_id}", headers=headers)
     assert delete_resp.status_code == 200
+
+
+def test_room_type_change_moves_upcoming_bookings(client):
+    from database import SessionLocal
+    from models import Booking
+
+    login_resp = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    room_id = client.post("/api/v1/rooms/", json={
+        "hotel_id": 3, "room_number": f"T_{str(uuid.uuid4())[:8]}", "room_type": "deluxe",
+        "capacity": 2, "price_per_night": 500000
+    }, headers=headers).json()["data"]["id"]
+    for room_type in ("deluxe", "single"):
+        assert client.put("/api/v1/hotels/3/allotments", json={
+            "room_type": room_type, "start_date": "2042-05-01", "end_date": "2042-05-31", "total": 2
+        }, headers=headers).status_code == 200
+    booking = client.post("/api/v1/bookings/", json={
+        "room_id": room_id, "check_in_date": "2042-05-10", "check_out_date": "2042-05-11", "guest_count": 1
+    }, headers=headers).json()["data"]
+
+    def sold(room_type):
+        return client.get("/api/v1/hotels/3/allotments", params={
+            "start_date": "2042-05-10", "end_date": "2042-05-10", "room_type": room_type
+        }).json()["data"][0]["sold"]
+
+    assert (sold("deluxe"), sold("single")) == (1, 0)
+    assert client.put(f"/api/v1/rooms/{room_id}", json={"room_type": "single"}, headers=headers).status_code == 200
+    assert (sold("deluxe"), sold("single")) == (0, 1)
+    db = SessionLocal()
+    try:
+        assert db.get(Booking, booking["id"]).room_type.value == "single"
+    finally:
+        db.close()
+
+
+def test_rate_calendar_and_stay_price(client):
+    login_resp = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 3}).json()["data"][0]
+    base = room["price_per_night"]
+
+    # 2032-05-07 là thứ Sáu, 08 thứ Bảy, 09 Chủ nhật
+    resp = client.put(f"/api/v1/rooms/{room['id']}/rates", json={
+        "start_date": "2032-05-01",
+        "end_date": "2032-05-31",
+        "price": base * 2,
+        "weekdays": [5, 6]
+    }, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["data"]["updated_dates"] == 10
+
+    calendar = client.get(f"/api/v1/rooms/{room['id']}/rates", params={
+        "start_date": "2032-05-07", "end_date": "2032-05-09"
+    }).json()["data"]
+    assert [d["price"] for d in calendar] == [base, base * 2, base * 2]
+    assert [d["is_override"] for d in calendar] == [False, True, True]
+
+    booking = client.post("/api/v1/bookings/", json={
+        "room_id": room["id"],
+        "check_in_date": "2032-05-07",
+        "check_out_date": "2032-05-10",
+        "guest_count": 1
+    }, headers=headers).json()["data"]
+    assert booking["total_price"] == base * 5
+
+    resp = client.delete(f"/api/v1/rooms/{room['id']}/rates", params={
+        "start_date": "2032-05-01", "end_date": "2032-05-31"
+    }, headers=headers)
+    # Chỉ 10 ngày cuối tuần có giá riêng
+    assert resp.json()["data"]["cleared_dates"] == 10
+    calendar = client.get(f"/api/v1/rooms/{room['id']}/rates", params={
+        "start_date": "2032-05-08", "end_date": "2032-05-08"
+    }).json()["data"]
+    assert calendar == [{"date": "2032-05-08", "price": base, "is_override": False}]
+
+
+def test_bulk_quotes(client):
+    login_resp = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    rooms = client.get("/api/v1/rooms/", params={"hotel_id": 1}).json()["data"]
+    room, other = rooms[0], rooms[1]
+
+    client.put(f"/api/v1/rooms/{room['id']}/rates", json={
+        "start_date": "2033-01-02", "end_date": "2033-01-02", "price": 1
+    }, headers=headers)
+    booked = client.post("/api/v1/bookings/", json={
+        "room_id": other["id"], "check_in_date": "2033-01-03", "check_out_date": "2033-01-05", "guest_count": 1
+    }, headers=headers)
+    assert booked.status_code == 201
+
+    items = [
+        {"room_id": room["id"], "check_in_date": "2033-01-01", "check_out_date": "2033-01-04"},
+        {"room_id": other["id"], "check_in_date": "2033-01-01", "check_out_date": "2033-01-03"},
+        {"room_id": other["id"], "check_in_date": "2033-01-04", "check_out_date": "2033-01-06"},
+        {"room_id": room["id"], "check_in_date": "2033-01-01", "check_out_date": "2033-01-02", "guests": 99},
+        {"room_id": 999999, "check_in_date": "2033-01-01", "check_out_date": "2033-01-02"},
+        {"room_id": room["id"], "check_in_date": "2033-01-05", "check_out_date": "2033-01-05"},
+    ]
+    resp = client.post("/api/v1/rooms/quotes", json={"items": items})
+    assert resp.status_code == 200
+    quotes = resp.json()["data"]
+    assert len(quotes) == len(items)
+
+    assert quotes[0]["nights"] == 3
+    assert quotes[0]["total_price"] == room["price_per_night"] * 2 + 1
+    assert quotes[0]["available"] is True
+    assert quotes[1]["available"] is True
+    assert quotes[1]["total_price"] == other["price_per_night"] * 2
+    assert quotes[2]["available"] is False
+    assert quotes[3]["available"] is False
+    assert [q["available"] for q in quotes[4:]] == [False, False]
+    assert quotes[4]["total_price"] is None
+
+
+def test_bulk_quote_totals_are_exact(client, monkeypatch):
+    from services import pricing_service
+
+    monkeypatch.setattr(pricing_service, "DEFAULT_CURRENCY", "USD")
+    login_resp = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    room = client.get("/api/v1/rooms/", params={"hotel_id": 3}).json()["data"][0]
+    assert client.put(f"/api/v1/rooms/{room['id']}/rates", json={
+        "start_date": "2042-01-01", "end_date": "2042-01-03", "price": 0.1
+    }, headers=headers).status_code == 200
+
+    # 0.1 + 0.1 + 0.1 bằng float là 0.30000000000000004
+    quote = client.post("/api/v1/rooms/quotes", json={"items": [
+        {"room_id": room["id"], "check_in_date": "2042-01-01", "check_out_date": "2042-01-04"}
+    ]}).json()["data"][0]
+    assert quote["total_price"] == 0.3
+
+
+def test_bulk_quotes_validate_each_item(client):
+    rooms = client.get("/api/v1/rooms/", params={"hotel_id": 1}).json()["data"]
+    room = rooms[0]
+    items = [
+        {"room_id": room["id"], "check_in_date": "2034-04-01", "check_out_date": "2034-04-03"},
+        # Một yêu cầu quá dài không làm hỏng cả lô
+        {"room_id": room["id"], "check_in_date": "2034-04-01", "check_out_date": "2037-04-01"},
+        # Cách xa nhau hơn MAX_RATE_RANGE_DAYS: báo giá theo cửa sổ riêng
+        {"room_id": room["id"], "check_in_date": "2099-04-01", "check_out_date": "2099-04-02"},
+    ]
+    resp = client.post("/api/v1/rooms/quotes", json={"items": items})
+    assert resp.status_code == 200
+    quotes = resp.json()["data"]
+    assert quotes[0]["available"] is True
+    assert quotes[0]["total_price"] == room["price_per_night"] * 2
+    assert quotes[1]["available"] is False
+    assert quotes[1]["total_price"] is None
+    assert "tối đa" in quotes[1]["reason"]
+    assert quotes[2]["available"] is True
+    assert quotes[2]["total_price"] == room["price_per_night"]
@@ -0,0 +1,100 @@
+def test_suggest_city_and_hotel(client):
+    response = client.get("/api/v1/search/suggest", params={"q": "hà"})
+    assert response.status_code == 200
+    suggestions = response.json()["data"]
+    labels = [s["label"] for s in suggestions]
+    assert "Hà Nội" in labels
+    assert suggestions[0]["type"] == "city"
+
+
+def test_suggest_matches_word_inside_name(client):
+    response = client.get("/api/v1/search/suggest", params={"q": "reso"})
+    assert response.status_code == 200
+    assert any(
+        s["type"] == "hotel" and s["label"] == "Beachfront Resort"
+        for s in response.json()["data"]
+    )
+
+
+def test_unified_search_with_facets(client):
+    response = client.post("/api/v1/search/", json={
+        "check_in_date": "2030-01-10",
+        "check_out_date": "2030-01-12",
+        "guests": 2,
+        "page_size": 2
+    })
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["total"] >= len(data["items"])
+    assert len(data["items"]) <= 2
+    prices = [item["min_price"] for item in data["items"]]
+    assert prices == sorted(prices)
+    for item in data["items"]:
+        room = item["cheapest_room"]
+        assert room["price_per_night"] == item["min_price"]
+        assert room["capacity"] >= 2
+        assert room["total_price"] == room["price_per_night"] * 2
+    assert set(data["facets"]) == {"city", "star_rating", "room_type", "price"}
+    assert sum(f["count"] for f in data["facets"]["city"]) == data["total"]
+
+
+def test_unified_search_location_and_stars(client):
+    response = client.post("/api/v1/search/", json={"location": "Nha Trang", "star_ratings": [5]})
+    assert response.status_code == 200
+    items = response.json()["data"]["items"]
+    assert "Beachfront Resort" in [item["name"] for item in items]
+    assert all(item["star_rating"] == 5 for item in items)
+
+
+def test_unified_search_rejects_bad_dates(client):
+    response = client.post("/api/v1/search/", json={
+        "check_in_date": "2030-01-12",
+        "check_out_date": "2030-01-10"
+    })
+    assert response.status_code == 400
+
+
+def test_suggest_without_accents(client):
+    response = client.get("/api/v1/search/suggest", params={"q": "ha noi"})
+    assert response.status_code == 200
+    assert response.json()["data"][0]["label"] == "Hà Nội"
+
+
+def test_unified_search_without_accents(client):
+    response = client.post("/api/v1/search/", json={"location": "ho chi minh", "amenities": ["ho boi"]})
+    assert response.status_code == 200
+    names = [item["name"] for item in response.json()["data"]["items"]]
+    assert "Khách sạn Quê Hương" in names
+    assert "Grand Hotel Hanoi" not in names
+
+
+def test_facets_ignore_their_own_filter(client):
+    response = client.post("/api/v1/search/", json={"star_ratings": [5]})
+    data = response.json()["data"]
+    assert all(item["star_rating"] == 5 for item in data["items"])
+    # Vẫn thấy số khách sạn 4 sao để người dùng chọn thêm
+    stars = {f["value"]: f["count"] for f in data["facets"]["star_rating"]}
+    assert stars.get("4", 0) >= 1
+    assert sum(f["count"] for f in data["facets"]["city"]) == data["total"]
+
+
+def test_price_filter_uses_rate_calendar(client):
+    login_resp = client.post("/api/v1/users/login", json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['access_token']}"}
+    rooms = client.get("/api/v1/rooms/", params={"hotel_id": 1}).json()["data"]
+    room = min(rooms, key=lambda r: r["price_per_night"])
+    client.put(f"/api/v1/rooms/{room['id']}/rates", json={
+        "start_date": "2034-05-01", "end_date": "2034-05-02", "price": 100
+    }, headers=headers)
+
+    response = client.post("/api/v1/search/", json={
+        "check_in_date": "2034-05-01", "check_out_date": "2034-05-03", "max_price": 100
+    })
+    data = response.json()["data"]
+    assert [item["id"] for item in data["items"]] == [1]
+    assert data["items"][0]["min_price"] == 100
+    assert data["items"][0]["cheapest_room"]["total_price"] == 200
+    # Facet giá cùng nguồn giá, và không bị max_price cắt mất các khoảng khác
+    prices = {f["value"]: f["count"] for f in data["facets"]["price"]}
+    assert prices["0-500000"] == 1
+    assert sum(prices.values()) > 1
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+
+from database import SessionLocal
+from models import Room
+from utils import event_broker as broker_module
+from utils.event_broker import EventBroker, StreamMessage, event_broker, sse_events
+
+
+def _parse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_stream_rejects_bad_token_and_unknown_room(client):
+    assert client.get("/api/v1/stream/", params={"token": "nope"}).status_code == 401
+    assert client.get("/api/v1/stream/", params={"room_id": 999999}).status_code == 404
+
+
+def test_committed_room_change_reaches_subscribers_of_its_hotel():
+    db = SessionLocal()
+    try:
+        room = db.query(Room).first()
+        room_id, hotel_id = room.id, room.hotel_id
+    finally:
+        db.close()
+
+    def touch_room():
+        db = SessionLocal()
+        try:
+            room = db.get(Room, room_id)
+            room.description = f"{room.description or ''} "
+            db.commit()
+        finally:
+            db.close()
+
+    async def scenario():
+        mine = sse_events(heartbeat=0.05, hotel_id=hotel_id)
+        other = sse_events(heartbeat=0.05, hotel_id=hotel_id + 1000)
+        assert (await mine.__anext__()).startswith("retry:")
+        await other.__anext__()
+        assert await mine.__anext__() == ": ping\n\n"
+
+        # Commit từ thread khác (như request chạy trong threadpool)
+        await asyncio.get_running_loop().run_in_executor(None, touch_room)
+        event, data = _parse(await mine.__anext__())
+        assert event == "availability" and data["room_id"] == room_id and data["event_type"] == "room.updated"
+        assert await other.__anext__() == ": ping\n\n"
+
+        before = event_broker.subscriber_count()
+        await mine.aclose()
+        await other.aclose()
+        assert event_broker.subscriber_count() == before - 2
+
+    asyncio.run(scenario())
+
+
+def test_admin_only_messages_and_slow_consumer_resync(monkeypatch):
+    monkeypatch.setattr(broker_module, "STREAM_QUEUE_SIZE", 3)
+    broker = EventBroker()
+
+    async def scenario():
+        guest = broker.subscribe(room_id=7, room_type="deluxe")
+        admin = broker.subscribe(is_admin=True)
+        broker.publish([
+            StreamMessage("booking", {"id": 1}, hotel_id=1, room_id=7, admin_only=True),
+            StreamMessage("availability", {"id": 2}, hotel_id=1, room_id=8),
+            StreamMessage("availability", {"id": 3}, hotel_id=1, room_id=None, room_type="deluxe"),
+        ])
+        await asyncio.sleep(0)
+        assert [guest.queue.get_nowait().data["id"] for _ in range(guest.queue.qsize())] == [3]
+
+        # Hàng đợi của admin đã đầy (3 tin): tin thứ 4 bị bỏ cùng các tin cũ, thay bằng resync
+        broker.publish([StreamMessage("payment", {"id": 4}, admin_only=True)])
+        await asyncio.sleep(0)
+        message = admin.queue.get_nowait()
+        assert message.event == "resync" and message.data == {"dropped": 4}
+        assert admin.queue.empty()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+"""Retry of short write transactions aborted by lock conflicts.
+
+Khi hai transaction tranh khóa, MySQL hủy một bên (deadlock 1213, chờ khóa quá
+lâu 1205), PostgreSQL báo deadlock/serialization failure, còn SQLite trả
+"database is locked". Transaction bị hủy được rollback và chạy lại từ đầu với
+backoff ngẫu nhiên; mọi lỗi khác (kể cả HTTPException) được rollback rồi ném tiếp.
+"""
+from __future__ import annotations
+
+import os
+import random
+import time
+from typing import Callable, TypeVar
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+DEADLOCK_RETRIES = int(os.getenv("DEADLOCK_RETRIES", "5"))
+DEADLOCK_BACKOFF_SECONDS = float(os.getenv("DEADLOCK_BACKOFF_SECONDS", "0.02"))
+
+# MySQL: ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK
+_RETRYABLE_MYSQL_CODES = {1205, 1213}
+# PostgreSQL: serialization_failure, deadlock_detected
+_RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+T = TypeVar("T")
+
+
+def is_retryable_error(exc: OperationalError) -> bool:
+    """Whether the database aborted the transaction because of a lock conflict"""
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", ())
+    if args and args[0] in _RETRYABLE_MYSQL_CODES:
+        return True
+    if getattr(orig, "pgcode", None) in _RETRYABLE_SQLSTATES:
+        return True
+    return "database is locked" in str(orig)
+
+
+def run_with_retry(db: Session, work: Callable[[], T], attempts: int = DEADLOCK_RETRIES) -> T:
+    """
+    Run ``work`` (which must take its locks and commit itself) retrying on lock conflicts.
+    ``work`` is re-run from scratch, so it must not depend on state from a failed attempt.
+    """
+    attempts = max(attempts, 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            return work()
+        except OperationalError as exc:
+            db.rollback()
+            if attempt >= attempts or not is_retryable_error(exc):
+                raise
+            time.sleep(random.uniform(0, DEADLOCK_BACKOFF_SECONDS * 2 ** attempt))
+        except Exception:
+            db.rollback()
+            raise
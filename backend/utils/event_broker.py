@@ -0,0 +1,156 @@
+"""In-process pub/sub for the SSE stream (GET /api/v1/stream).
+
+Service commit (thread bất kỳ) gọi ``event_broker.publish``; mỗi event loop có
+subscriber chỉ nhận MỘT callback call_soon_threadsafe cho cả lô tin, rồi phân
+phát vào hàng đợi có giới hạn của từng kết nối. Kết nối đọc chậm bị đầy hàng đợi
+thì bỏ các tin đang chờ và nhận một tin ``resync`` (client tải lại danh sách),
+nên một client chậm không làm phình bộ nhớ hay chặn các client khác.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Comment ": ping" giữ kết nối qua proxy / load balancer khi không có tin
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_RETRY_MS = 3000
+
+
+class StreamMessage:
+    """One SSE event: ``event`` is availability | booking | payment | resync"""
+
+    def __init__(
+        self,
+        event: str,
+        data: dict,
+        hotel_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+        room_type: Optional[str] = None,
+        admin_only: bool = False
+    ):
+        self.event = event
+        self.data = data
+        self.hotel_id = hotel_id
+        self.room_id = room_id
+        self.room_type = room_type
+        self.admin_only = admin_only
+
+
+class Subscription:
+    """One SSE connection: its filters and bounded queue"""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        is_admin: bool = False,
+        hotel_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+        room_type: Optional[str] = None
+    ):
+        self.loop = loop
+        self.is_admin = is_admin
+        self.hotel_id = hotel_id
+        self.room_id = room_id
+        self.room_type = room_type  # Type of the filtered room, to match room-type bookings
+        self.queue: asyncio.Queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        self.dropped = 0
+
+    def matches(self, message: StreamMessage) -> bool:
+        if message.admin_only and not self.is_admin:
+            return False
+        if self.hotel_id is not None and message.hotel_id != self.hotel_id:
+            return False
+        if self.room_id is not None and message.room_id != self.room_id:
+            # Booking theo loại phòng chưa gán phòng: ảnh hưởng mọi phòng cùng loại trong khách sạn
+            return message.room_id is None and message.room_type is not None and message.room_type == self.room_type
+        return True
+
+    def push(self, message: StreamMessage) -> None:
+        """Called on the subscription's loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(StreamMessage("resync", {"dropped": self.dropped}))
+
+
+class EventBroker:
+    """Subscriptions grouped by the event loop serving them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[asyncio.AbstractEventLoop, Set[Subscription]] = {}
+
+    def subscribe(self, **filters) -> Subscription:
+        """Register a subscription on the running event loop"""
+        subscription = Subscription(loop=asyncio.get_running_loop(), **filters)
+        with self._lock:
+            self._subscribers.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.loop)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.loop]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, messages: List[StreamMessage]) -> None:
+        """Deliver messages to matching subscriptions; safe to call from any thread"""
+        if not messages or not self._subscribers:
+            return
+        with self._lock:
+            loops = list(self._subscribers)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, loop, messages)
+            except RuntimeError:
+                # Event loop đã đóng
+                with self._lock:
+                    self._subscribers.pop(loop, None)
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop, messages: List[StreamMessage]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(loop, ()))
+        for subscription in subscribers:
+            for message in messages:
+                if subscription.matches(message):
+                    subscription.push(message)
+
+
+event_broker = EventBroker()
+
+
+async def sse_events(
+    broker: EventBroker = event_broker,
+    heartbeat: float = STREAM_HEARTBEAT_SECONDS,
+    **filters
+) -> AsyncIterator[str]:
+    """
+    Subscribe with ``filters`` and format the messages as text/event-stream.
+    Đăng ký ngay trong generator nên luôn được hủy khi client ngắt kết nối.
+    """
+    subscription = broker.subscribe(**filters)
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            data = json.dumps(message.data, ensure_ascii=False, default=str)
+            yield f"event: {message.event}\ndata: {data}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
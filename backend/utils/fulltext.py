@@ -0,0 +1,182 @@
+"""Full-text search helpers for hotels and rooms.
+
+MySQL dùng FULLTEXT index (MATCH ... AGAINST), SQLite dùng bảng ảo FTS5
+được đồng bộ bằng trigger. Cả hai đều do DB tự cập nhật khi insert/update/delete
+nên service không cần làm gì thêm. Dialect khác rơi về ``ilike``.
+
+Mọi từ khóa đều phải khớp (AND, khớp tiền tố từ): MySQL dùng ``+t*``, FTS5 nối
+các từ bằng khoảng trắng. Từ ngắn hơn ``innodb_ft_min_token_size`` (mặc định 3,
+ví dụ "da", "ho") không có trong FULLTEXT index nên được lọc bằng ``LIKE`` tiền tố
+từ trên các dòng còn lại thay vì bị bỏ qua hay làm rỗng kết quả.
+
+Khách sạn và phòng được index trên các cột đã gấp dấu (``*_search``) và từ khóa
+cũng được gấp dấu, nên "da nang" khớp "Đà Nẵng". Khi danh sách cột thay đổi, index /
+bảng FTS cũ được xóa và tạo lại.
+
+Public API:
+  - ensure_fulltext_schema(conn): tạo index / bảng FTS (gọi từ migrations)
+  - hotel_match(db, term, location_only=False) -> subquery (id, score)
+  - room_match(db, term) -> subquery (id, score)
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import List, Sequence
+
+from sqlalchemy import Float, Integer, bindparam, literal, or_, select, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from models import Hotel, Room
+from utils.textfold import fold
+
+HOTEL_TEXT_COLUMNS = (
+    "name_search", "description_search", "city_search", "country_search", "address_search", "amenities_search"
+)
+HOTEL_LOCATION_COLUMNS = ("name_search", "city_search", "country_search", "address_search")
+ROOM_TEXT_COLUMNS = ("description_search", "amenities_search", "bed_type_search")
+
+# (tên index/bảng FTS, bảng gốc, các cột được index)
+MYSQL_FULLTEXT_INDEXES = (
+    ("ft_hotels_text", "hotels", HOTEL_TEXT_COLUMNS),
+    ("ft_hotels_location", "hotels", HOTEL_LOCATION_COLUMNS),
+    ("ft_rooms_text", "rooms", ROOM_TEXT_COLUMNS),
+)
+
+SQLITE_FTS_TABLES = (
+    ("hotels_fts", "hotels", HOTEL_TEXT_COLUMNS),
+    ("rooms_fts", "rooms", ROOM_TEXT_COLUMNS),
+)
+
+# Phải khớp innodb_ft_min_token_size của server MySQL
+MYSQL_FT_MIN_TOKEN_SIZE = int(os.getenv("MYSQL_FT_MIN_TOKEN_SIZE", "3"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(term: str) -> List[str]:
+    """Split a search string into accent-folded lowercase word tokens."""
+    return _TOKEN_RE.findall(fold(term))
+
+
+# -------- Schema ---------
+
+def _ensure_mysql_indexes(conn) -> None:
+    existing = {}
+    for index_name, column in conn.execute(text(
+        "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND INDEX_TYPE = 'FULLTEXT' "
+        "ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+    )):
+        existing.setdefault(index_name, []).append(column)
+
+    for index_name, table, columns in MYSQL_FULLTEXT_INDEXES:
+        if tuple(existing.get(index_name, ())) == tuple(columns):
+            continue
+        if index_name in existing:
+            conn.execute(text(f"ALTER TABLE {table} DROP INDEX {index_name}"))
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD FULLTEXT INDEX {index_name} ({', '.join(columns)})"
+        ))
+
+
+def _ensure_sqlite_fts(conn) -> None:
+    for fts, table, columns in SQLITE_FTS_TABLES:
+        existing = tuple(row[1] for row in conn.execute(text(f"PRAGMA table_info({fts})")))
+        if existing == tuple(columns):
+            continue
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {fts}_{suffix}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+
+        cols = ", ".join(columns)
+        new_vals = ", ".join(f"new.{c}" for c in columns)
+        old_vals = ", ".join(f"old.{c}" for c in columns)
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+        ))
+        # Index dữ liệu đã có sẵn trong bảng gốc
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def ensure_fulltext_schema(conn) -> None:
+    """Create FULLTEXT indexes (MySQL) or FTS5 tables + triggers (SQLite)."""
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        _ensure_mysql_indexes(conn)
+    elif dialect == "sqlite":
+        _ensure_sqlite_fts(conn)
+
+
+# -------- Queries ---------
+
+def _word_prefix(model, columns: Sequence[str], token: str):
+    """Some column has a word starting with ``token``"""
+    token = token.replace("_", "\\_")
+    return or_(*[
+        or_(getattr(model, c).like(f"{token}%", escape="\\"), getattr(model, c).like(f"% {token}%", escape="\\"))
+        for c in columns
+    ])
+
+
+def _mysql_match(model, columns: Sequence[str], tokens: List[str]):
+    indexed = [t for t in tokens if len(t) >= MYSQL_FT_MIN_TOKEN_SIZE]
+    conditions = [_word_prefix(model, columns, t) for t in tokens if len(t) < MYSQL_FT_MIN_TOKEN_SIZE]
+    if indexed:
+        against = " ".join(f"+{t}*" for t in indexed)
+        score = match(*[getattr(model, c) for c in columns], against=against).in_boolean_mode()
+        conditions.append(score > 0)
+    else:
+        score = literal(1.0)
+    return select(model.id.label("id"), score.label("score")).where(*conditions).subquery()
+
+
+def _sqlite_match(fts: str, columns: Sequence[str], all_columns: Sequence[str], tokens: List[str]):
+    expr = " ".join(f'"{t}"*' for t in tokens)
+    if tuple(columns) != tuple(all_columns):
+        expr = "{" + " ".join(columns) + "} : (" + expr + ")"
+    return text(
+        f"SELECT rowid AS id, -bm25({fts}) AS score FROM {fts} WHERE {fts} MATCH :fts_query"
+    ).bindparams(bindparam("fts_query", expr, unique=True)).columns(id=Integer, score=Float).subquery()
+
+
+def _ilike_match(model, columns: Sequence[str], term: str):
+    pattern = f"%{fold(term)}%"
+    return select(model.id.label("id"), literal(1.0).label("score")).where(
+        or_(*[getattr(model, c).ilike(pattern) for c in columns])
+    ).subquery()
+
+
+def _match(db: Session, model, fts: str, columns, all_columns, term: str):
+    tokens = tokenize(term)
+    dialect = db.get_bind().dialect.name
+    if tokens and dialect == "mysql":
+        return _mysql_match(model, columns, tokens)
+    if tokens and dialect == "sqlite":
+        return _sqlite_match(fts, columns, all_columns, tokens)
+    return _ilike_match(model, columns, term)
+
+
+def hotel_match(db: Session, term: str, location_only: bool = False):
+    """Return a subquery of (id, score) for hotels matching ``term``, higher score = more relevant."""
+    columns = HOTEL_LOCATION_COLUMNS if location_only else HOTEL_TEXT_COLUMNS
+    return _match(db, Hotel, "hotels_fts", columns, HOTEL_TEXT_COLUMNS, term)
+
+
+def room_match(db: Session, term: str):
+    """Return a subquery of (id, score) for rooms matching ``term``, higher score = more relevant."""
+    return _match(db, Room, "rooms_fts", ROOM_TEXT_COLUMNS, ROOM_TEXT_COLUMNS, term)
@@ -0,0 +1,131 @@
+"""Geohash helpers for "hotels near a point" search.
+
+Khách sạn lưu geohash (độ chính xác GEOHASH_PRECISION) trong cột có index.
+Tìm theo bán kính = chọn độ chính xác sao cho một ô geohash lớn hơn bán kính,
+lấy ô chứa điểm + 8 ô xung quanh, rồi range scan ``geohash LIKE 'prefix%'``
+trên index. Khoảng cách chính xác được tính lại bằng haversine.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Tuple
+
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate into a geohash string"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (lat_min, lat_max, lon_min, lon_max) of a geohash cell"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell_size_km(precision: int, latitude: float) -> Tuple[float, float]:
+    """(height_km, width_km) of a geohash cell at a given latitude"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    height = 180.0 / (2 ** lat_bits) * 111.32
+    width = 360.0 / (2 ** lon_bits) * 111.32 * max(math.cos(math.radians(latitude)), 0.01)
+    return height, width
+
+
+def covering_prefixes(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """
+    Geohash prefixes whose cells together cover the circle (latitude, longitude, radius_km).
+
+    Trả về ô chứa điểm và các ô lân cận ở độ chính xác lớn nhất mà mỗi ô vẫn rộng
+    hơn bán kính, nên vòng tròn luôn nằm trong 3x3 ô.
+    """
+    precision = 1
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size_km(p, latitude)
+        if min(height, width) >= radius_km:
+            precision = p
+            break
+
+    center = encode(latitude, longitude, precision)
+    if precision == 1 and min(_cell_size_km(1, latitude)) < radius_km:
+        return [""]  # Bán kính quá lớn: quét toàn bộ
+
+    lat_lo, lat_hi, lon_lo, lon_hi = decode_bbox(center)
+    dlat = lat_hi - lat_lo
+    dlon = lon_hi - lon_lo
+    mid_lat = (lat_lo + lat_hi) / 2
+    mid_lon = (lon_lo + lon_hi) / 2
+
+    prefixes = []
+    for i in (-1, 0, 1):
+        lat = mid_lat + i * dlat
+        if lat < -90 or lat > 90:
+            continue
+        for j in (-1, 0, 1):
+            lon = (mid_lon + j * dlon + 180) % 360 - 180
+            cell = encode(lat, lon, precision)
+            if cell not in prefixes:
+                prefixes.append(cell)
+    return prefixes
@@ -0,0 +1,289 @@
+"""Idempotency-Key support for mutating requests (POST/PUT/PATCH/DELETE).
+
+Request đầu tiên với một key giành dòng trong bảng idempotency_keys (INSERT,
+khóa chính là sha256 của user + key), chạy bình thường rồi lưu status + body
+phản hồi. Request lặp lại với cùng key được trả lại phản hồi đã lưu (header
+``Idempotent-Replayed: true``) mà không chạy lại service; nếu request đầu còn
+đang chạy thì request sau chờ kết quả, tối đa IDEMPOTENCY_WAIT_SECONDS giây.
+
+  - Cùng key nhưng khác method/path/body: 422
+  - Phản hồi 5xx (hoặc exception) không được lưu: key được giải phóng để thử lại
+  - Key hết hạn sau IDEMPOTENCY_TTL_SECONDS giây
+  - Request đầu gia hạn key (locked_at) mỗi IDEMPOTENCY_LOCK_SECONDS / 3 giây khi còn
+    chạy; key chỉ bị lấy lại khi không được gia hạn quá IDEMPOTENCY_LOCK_SECONDS (worker chết)
+  - Body được đệm để tính dấu vân tay nên tối đa IDEMPOTENCY_MAX_BODY_BYTES (413);
+    request multipart (upload file) bỏ qua idempotency thay vì đệm cả file
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import Headers
+
+from auth import ALGORITHM, SECRET_KEY
+from database import SessionLocal
+from models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Request đầu không gia hạn key lâu hơn ngưỡng này coi như đã chết (worker bị kill)
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_HEARTBEAT_SECONDS = IDEMPOTENCY_LOCK_SECONDS / 3
+IDEMPOTENCY_MAX_BODY_BYTES = 1024 * 1024
+_POLL_SECONDS = 0.05
+_MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Kết quả của IdempotencyStore.claim
+CLAIMED, COMPLETED, IN_PROGRESS, MISMATCH = "claimed", "completed", "in_progress", "mismatch"
+
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _principal(headers: Headers) -> str:
+    """Who sent the request: keys are scoped per user so one user cannot replay another's response"""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    try:
+        subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        subject = None
+    return f"user:{subject}" if subject else "token:" + _sha256(token.encode())
+
+
+class IdempotencyStore:
+    """Claim / complete / release of idempotency keys in the idempotency_keys table"""
+
+    def claim(self, key_hash: str, request_hash: str) -> Tuple[str, Optional[IdempotencyKey]]:
+        """Take the key for this request, or report what the first request with it did"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            row = db.get(IdempotencyKey, key_hash)
+            stale = row is not None and (
+                row.expires_at <= now
+                or (
+                    row.status_code is None
+                    and (row.locked_at or row.created_at) <= now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+                )
+            )
+            if row is None or stale:
+                if stale:
+                    db.delete(row)
+                    db.flush()
+                db.add(IdempotencyKey(
+                    key_hash=key_hash,
+                    request_hash=request_hash,
+                    created_at=now,
+                    locked_at=now,
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+                ))
+                try:
+                    db.commit()
+                    return CLAIMED, None
+                except IntegrityError:
+                    # Request trùng khác vừa giành được key
+                    db.rollback()
+                    row = db.get(IdempotencyKey, key_hash)
+                    if row is None:
+                        return IN_PROGRESS, None
+
+            if row.request_hash != request_hash:
+                return MISMATCH, None
+            if row.status_code is None:
+                return IN_PROGRESS, None
+            db.expunge(row)
+            return COMPLETED, row
+        finally:
+            db.close()
+
+    def heartbeat(self, key_hash: str) -> None:
+        """Keep the claim of a request that is still running"""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.key_hash == key_hash, IdempotencyKey.status_code.is_(None)
+            ).update({"locked_at": datetime.utcnow()})
+            db.commit()
+        finally:
+            db.close()
+
+    def complete(self, key_hash: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).update({
+                "status_code": status_code,
+                "content_type": content_type,
+                "response_body": body,
+            })
+            db.commit()
+        finally:
+            db.close()
+
+    def release(self, key_hash: str) -> None:
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self, batch_size: int = 1000) -> int:
+        """Delete expired keys through the expires_at index. Returns the number deleted."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            deleted = 0
+            while True:
+                keys = [key for (key,) in db.query(IdempotencyKey.key_hash).filter(
+                    IdempotencyKey.expires_at <= now
+                ).limit(batch_size)]
+                if not keys:
+                    return deleted
+                deleted += db.query(IdempotencyKey).filter(
+                    IdempotencyKey.key_hash.in_(keys)
+                ).delete(synchronize_session=False)
+                db.commit()
+        finally:
+            db.close()
+
+
+idempotency_store = IdempotencyStore()
+
+
+async def _send_json(send, status_code: int, content: dict) -> None:
+    body = json.dumps(content, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying stored responses for repeated Idempotency-Key requests"""
+
+    def __init__(self, app, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in _MUTATING_METHODS:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return await self.app(scope, receive, send)
+        if len(key) > 255:
+            return await _send_json(send, 400, {"detail": "Idempotency-Key tối đa 255 ký tự"})
+        if headers.get("content-type", "").lower().startswith("multipart/"):
+            # Upload file: không đệm cả file vào bộ nhớ
+            return await self.app(scope, receive, send)
+        too_large = {"detail": f"Request có Idempotency-Key tối đa {IDEMPOTENCY_MAX_BODY_BYTES} byte"}
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > IDEMPOTENCY_MAX_BODY_BYTES:
+            return await _send_json(send, 413, too_large)
+
+        # Đọc hết body để tính dấu vân tay rồi phát lại cho ứng dụng
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > IDEMPOTENCY_MAX_BODY_BYTES:
+                return await _send_json(send, 413, too_large)
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        key_hash = _sha256(_principal(headers).encode(), key.encode())
+        request_hash = _sha256(
+            scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body
+        )
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            outcome, stored = await run_in_threadpool(self.store.claim, key_hash, request_hash)
+            if outcome != IN_PROGRESS or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(_POLL_SECONDS)
+
+        if outcome == MISMATCH:
+            return await _send_json(send, 422, {"detail": "Idempotency-Key đã được dùng cho một request khác"})
+        if outcome == IN_PROGRESS:
+            return await _send_json(send, 409, {"detail": "Request với Idempotency-Key này đang được xử lý"})
+        if outcome == COMPLETED:
+            response_headers = [
+                (b"content-length", str(len(stored.response_body or b"")).encode()),
+                (b"idempotent-replayed", b"true"),
+            ]
+            if stored.content_type:
+                response_headers.append((b"content-type", stored.content_type.encode()))
+            await send({"type": "http.response.start", "status": stored.status_code, "headers": response_headers})
+            await send({"type": "http.response.body", "body": stored.response_body or b""})
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "content_type": None, "body": [], "size": 0}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["content_type"] = Headers(raw=message.get("headers", [])).get("content-type")
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+                if response["size"] <= IDEMPOTENCY_MAX_BODY_BYTES:
+                    response["body"].append(message.get("body", b""))
+            await send(message)
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(IDEMPOTENCY_HEARTBEAT_SECONDS)
+                try:
+                    await run_in_threadpool(self.store.heartbeat, key_hash)
+                except Exception as e:
+                    print(f"⚠️ Không gia hạn được Idempotency-Key: {e}")
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key_hash)
+            raise
+        finally:
+            beat.cancel()
+
+        if response["status"] is None or response["status"] >= 500 or response["size"] > IDEMPOTENCY_MAX_BODY_BYTES:
+            await run_in_threadpool(self.store.release, key_hash)
+        else:
+            await run_in_threadpool(
+                self.store.complete, key_hash, response["status"], response["content_type"], b"".join(response["body"])
+            )
@@ -0,0 +1,146 @@
+"""Short, time-ordered, collision-free IDs (booking references, transaction IDs).
+
+Mỗi ID là một số 63 bit mã hóa Crockford base32 độ dài cố định (13 ký tự,
+không có I, L, O, U nên dễ đọc qua điện thoại):
+
+    | 41 bit: ms kể từ ID_EPOCH | 10 bit: worker id | 12 bit: sequence |
+
+Hai worker khác worker id không bao giờ sinh trùng nhau, trong một worker
+sequence tăng trong cùng một ms (tối đa 4096/ms, vượt thì mượn ms kế tiếp) nên
+không cần hỏi DB. ID tăng dần theo thời gian nên so sánh chuỗi = so sánh thời
+điểm, và INSERT luôn rơi vào cuối index unique.
+
+Worker id của tiến trình: ID_WORKER_ID nếu đặt (mỗi tiến trình một giá trị riêng),
+nếu không thì thuê từ DB lúc khởi động (services.worker_lease_service, gọi
+``use_worker_id``). Băm host/pid chỉ 10 bit nên có thể trùng, chỉ dùng khi dev
+với ID_HASHED_WORKER_ID=true.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ID_LENGTH = 13
+
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# 2024-01-01T00:00:00Z; 41 bit ms đủ tới năm 2093
+ID_EPOCH_MS = 1704067200000
+
+
+# Chỉ cho dev: worker id băm từ host/pid (10 bit, có thể trùng giữa các tiến trình)
+ID_HASHED_WORKER_ID = os.getenv("ID_HASHED_WORKER_ID", "false").lower() == "true"
+
+
+def configured_worker_id() -> int | None:
+    """ID_WORKER_ID if set (must be unique per process)"""
+    configured = os.getenv("ID_WORKER_ID")
+    if configured is None:
+        return None
+    worker_id = int(configured)
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"ID_WORKER_ID phải trong khoảng 0..{MAX_WORKER_ID}")
+    return worker_id
+
+
+def _default_worker_id() -> int:
+    """ID_WORKER_ID, else the id leased by this process, else (dev only) a hash of host name and pid"""
+    configured = configured_worker_id()
+    if configured is not None:
+        return configured
+    if _leased is not None and _leased[0] == os.getpid():
+        return _leased[1]
+    if ID_HASHED_WORKER_ID:
+        seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+        return int.from_bytes(hashlib.sha256(seed).digest()[:4], "big") & MAX_WORKER_ID
+    raise RuntimeError("Chưa có worker id: đặt ID_WORKER_ID hoặc thuê worker id từ DB khi khởi động")
+
+
+def encode_base32(value: int, length: int = ID_LENGTH) -> str:
+    """Fixed-width Crockford base32 (so string order equals numeric order)"""
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD_ALPHABET[value & 31])
+        value >>= 5
+    if value:
+        raise ValueError("Giá trị quá lớn cho độ dài ID")
+    return "".join(reversed(chars))
+
+
+def decode_base32(text: str) -> int:
+    """Inverse of encode_base32; accepts lowercase and the usual O->0, I/L->1 typos"""
+    value = 0
+    for char in text.upper().replace("O", "0").replace("I", "1").replace("L", "1"):
+        value = value * 32 + CROCKFORD_ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    """Thread-safe generator of time-ordered 63-bit IDs for one worker"""
+
+    def __init__(self, worker_id: int, epoch_ms: int = ID_EPOCH_MS):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id phải trong khoảng 0..{MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_int(self) -> int:
+        with self._lock:
+            now_ms = int(time.time() * 1000) - self.epoch_ms
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Cùng ms hoặc đồng hồ bị lùi: tiếp tục từ ms cuối để không bao giờ trùng
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_id(self) -> str:
+        return encode_base32(self.next_int())
+
+    def timestamp_of(self, generated_id: str) -> datetime:
+        """When an ID was generated (UTC)"""
+        ms = (decode_base32(generated_id) >> (WORKER_BITS + SEQUENCE_BITS)) + self.epoch_ms
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+_generator: IdGenerator | None = None
+_generator_pid: int | None = None
+_leased: tuple[int, int] | None = None  # (pid, worker id) thuê từ DB
+
+
+def use_worker_id(worker_id: int | None) -> None:
+    """Generate this process's IDs with ``worker_id`` leased from the DB (None: lease released)"""
+    global _generator, _generator_pid, _leased
+    _leased = (os.getpid(), worker_id) if worker_id is not None else None
+    _generator = None
+    _generator_pid = None
+
+
+def get_id_generator() -> IdGenerator:
+    """Generator of this process (recreated after fork: a forked child must not reuse the parent's lease)"""
+    global _generator, _generator_pid
+    if _generator is None or _generator_pid != os.getpid():
+        _generator = IdGenerator(_default_worker_id())
+        _generator_pid = os.getpid()
+    return _generator
+
+
+def new_id() -> str:
+    """Next 13-character ID of this process"""
+    return get_id_generator().next_id()
@@ -0,0 +1,109 @@
+"""Exact money: integer minor units + ISO 4217 currency.
+
+DB lưu số tiền là BIGINT đơn vị nhỏ nhất của tiền tệ (đồng với VND, cent với
+USD) nên SUM/so sánh chính xác, không cần làm tròn. Chỉ khi nhận từ request
+(``Money.from_major``) hoặc trả ra API (``to_major``) mới đổi sang đơn vị lớn.
+"""
+from __future__ import annotations
+
+import os
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+
+# Số chữ số thập phân của đơn vị nhỏ nhất; tiền tệ không có trong bảng dùng 2
+CURRENCY_EXPONENTS = {
+    "VND": 0,
+    "JPY": 0,
+    "KRW": 0,
+    "USD": 2,
+    "EUR": 2,
+    "GBP": 2,
+    "SGD": 2,
+    "THB": 2,
+}
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "VND")
+
+Number = Union[int, float, Decimal, str]
+
+
+def currency_exponent(currency: str) -> int:
+    return CURRENCY_EXPONENTS.get(currency.upper(), 2)
+
+
+def to_minor(amount: Number, currency: str) -> int:
+    """Major units (800000, 12.34) to integer minor units, rounding half up"""
+    if isinstance(amount, float):
+        amount = repr(amount)  # 0.1 -> "0.1", không phải 0.1000000000000000055...
+    scaled = Decimal(amount).scaleb(currency_exponent(currency))
+    return int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_major(minor: int, currency: str) -> Decimal:
+    return Decimal(minor).scaleb(-currency_exponent(currency))
+
+
+class Money:
+    """Immutable amount of one currency; arithmetic and comparison only within the same currency"""
+
+    __slots__ = ("minor", "currency")
+
+    def __init__(self, minor: int, currency: str = DEFAULT_CURRENCY):
+        object.__setattr__(self, "minor", int(minor or 0))
+        object.__setattr__(self, "currency", currency.upper())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money là bất biến")
+
+    @classmethod
+    def from_major(cls, amount: Number, currency: str = DEFAULT_CURRENCY) -> "Money":
+        return cls(to_minor(amount, currency), currency)
+
+    @property
+    def major(self) -> Decimal:
+        return to_major(self.minor, self.currency)
+
+    def _same_currency(self, other: "Money") -> "Money":
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Không thể tính {self.currency} với {other.currency}")
+        return other
+
+    def __add__(self, other: "Money") -> "Money":
+        other = self._same_currency(other)
+        if other is NotImplemented:
+            return other
+        return Money(self.minor + other.minor, self.currency)
+
+    def __sub__(self, other: "Money") -> "Money":
+        other = self._same_currency(other)
+        if other is NotImplemented:
+            return other
+        return Money(self.minor - other.minor, self.currency)
+
+    def __neg__(self) -> "Money":
+        return Money(-self.minor, self.currency)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Money) and (self.minor, self.currency) == (other.minor, other.currency)
+
+    def __hash__(self) -> int:
+        return hash((self.minor, self.currency))
+
+    def __lt__(self, other: "Money") -> bool:
+        return self.minor < self._same_currency(other).minor
+
+    def __le__(self, other: "Money") -> bool:
+        return self.minor <= self._same_currency(other).minor
+
+    def __gt__(self, other: "Money") -> bool:
+        return self.minor > self._same_currency(other).minor
+
+    def __ge__(self, other: "Money") -> bool:
+        return self.minor >= self._same_currency(other).minor
+
+    def __repr__(self) -> str:
+        return f"Money({self.minor}, {self.currency!r})"
+
+    def __str__(self) -> str:
+        return f"{self.major} {self.currency}"
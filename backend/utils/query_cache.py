@@ -0,0 +1,168 @@
+"""In-process result cache for public catalog queries.
+
+Kết quả (đã serialize, gồm cả link ảnh Drive) được lưu theo khóa là tham số
+truy vấn đã chuẩn hóa, giới hạn bởi TTL và số entry tối đa (LRU).
+
+Mỗi entry gắn các tag; service gọi ``invalidate_*`` ngay sau khi commit:
+  - "hotels"                      : mọi danh sách khách sạn
+  - "rooms"                       : danh sách phòng không giới hạn theo khách sạn
+  - "hotel:<id>" / "room:<id>"    : entry chứa / giới hạn theo khách sạn, phòng đó
+  - "availability", "availability:hotel:<id>" : entry có lọc theo ngày (phụ thuộc booking)
+
+Cache nằm trong từng worker, worker khác thấy thay đổi muộn nhất sau
+QUERY_CACHE_TTL_SECONDS giây.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "60"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        return sorted((v for v in items if v is not None), key=str) or None
+    if isinstance(value, dict):
+        items = {k: _normalize(v) for k, v in value.items()}
+        return {k: v for k, v in items.items() if v is not None} or None
+    return value
+
+
+class QueryCache:
+    """TTL + LRU cache with tag based invalidation and hit/miss counters"""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value, tags)
+        self._entries: "OrderedDict[str, Tuple[float, Any, Set[str]]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def make_key(namespace: str, params: dict) -> str:
+        """Build a cache key from query parameters, ignoring empty values and order"""
+        normalized = _normalize(params) or {}
+        return namespace + ":" + json.dumps(normalized, sort_keys=True, default=str, ensure_ascii=False)
+
+    def _drop_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value or None on miss/expiry"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop_locked(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()) -> None:
+        """Store a value with its invalidation tags, evicting least recently used entries"""
+        if not self.enabled:
+            return
+        tags = set(tags)
+        with self._lock:
+            self._drop_locked(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop_locked(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry carrying one of the tags. Returns the number of entries dropped."""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._by_tag.get(tag, set())
+            for key in keys:
+                self._drop_locked(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self) -> dict:
+        """Hit ratio and size metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+query_cache = QueryCache()
+
+
+def room_list_tags(rooms, hotel_id: Optional[int] = None, by_dates: bool = False) -> Set[str]:
+    """Tags of a cached room list: its scope, its rows and availability if filtered by dates"""
+    scope = f"hotel:{hotel_id}" if hotel_id else "rooms"
+    tags = {scope}
+    if by_dates:
+        tags.add(f"availability:{scope}" if hotel_id else "availability")
+    for room in rooms:
+        tags.add(f"room:{room.id}")
+        tags.add(f"hotel:{room.hotel_id}")
+    return tags
+
+
+def invalidate_hotel(hotel_id: int) -> None:
+    """A hotel was created, changed or deleted (room lists embed hotel data and filter by location)"""
+    query_cache.invalidate("hotels", "rooms", f"hotel:{hotel_id}")
+
+
+def invalidate_room(hotel_id: int, room_id: Optional[int] = None) -> None:
+    """A room was created, changed or deleted"""
+    tags = ["rooms", f"hotel:{hotel_id}"]
+    if room_id is not None:
+        tags.append(f"room:{room_id}")
+    query_cache.invalidate(*tags)
+
+
+def invalidate_availability(hotel_id: int) -> None:
+    """A booking or room allotment changed which rooms are free for some dates"""
+    query_cache.invalidate("availability", f"availability:hotel:{hotel_id}")
@@ -0,0 +1,153 @@
+"""In-memory prefix index for search-box autocomplete.
+
+Index là một mảng đã sắp xếp các khóa (chuỗi chuẩn hóa) và dùng bisect để tìm
+theo tiền tố, nên mỗi truy vấn là O(log n + k) và không chạm tới DB.
+Khóa được gấp dấu (utils.textfold) nên gõ không dấu vẫn khớp.
+Mỗi tên được index theo từng hậu tố từ ("grand hotel hanoi", "hotel hanoi",
+"hanoi") để gõ giữa tên vẫn gợi ý được.
+
+HotelService cập nhật index ngay sau khi ghi (upsert_hotel / remove_hotel).
+Các worker khác tự dựng lại index sau SUGGEST_REFRESH_SECONDS giây.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Hotel
+from utils.textfold import fold
+
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "300"))
+
+# Thứ tự ưu tiên khi hiển thị gợi ý
+_KIND_PRIORITY = {"city": 0, "hotel": 1, "country": 2, "address": 3}
+_MAX_SCAN = 500
+
+# (key, kind, label, subtitle, hotel_id)
+Entry = Tuple[str, str, str, Optional[str], Optional[int]]
+
+
+def normalize(value: str) -> str:
+    """Normalize text for prefix matching (accent-folded, so "ha noi" finds "Hà Nội")"""
+    return fold(value)
+
+
+def _word_suffixes(value: str) -> List[str]:
+    words = normalize(value).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _hotel_entries(hotel: Hotel) -> List[Entry]:
+    fields = (
+        ("hotel", hotel.name, hotel.city, hotel.id),
+        ("city", hotel.city, hotel.country, None),
+        ("country", hotel.country, None, None),
+        ("address", hotel.address, hotel.city, hotel.id),
+    )
+    entries = []
+    for kind, label, subtitle, hotel_id in fields:
+        if not label:
+            continue
+        for key in _word_suffixes(label):
+            entries.append((key, kind, label, subtitle, hotel_id))
+    return entries
+
+
+class SuggestIndex:
+    """Sorted-array prefix index over hotel names, cities, countries and addresses"""
+
+    def __init__(self):
+        self._entries: List[Entry] = []
+        self._by_hotel: Dict[int, List[Entry]] = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def rebuild(self, db: Session) -> None:
+        """Rebuild the whole index from the hotels table"""
+        by_hotel = {}
+        entries = []
+        for hotel in db.query(Hotel).all():
+            hotel_entries = _hotel_entries(hotel)
+            by_hotel[hotel.id] = hotel_entries
+            entries.extend(hotel_entries)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._by_hotel = by_hotel
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session) -> None:
+        """Build on first use and after SUGGEST_REFRESH_SECONDS"""
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > SUGGEST_REFRESH_SECONDS:
+            self.rebuild(db)
+
+    def _remove_locked(self, hotel_id: int) -> None:
+        for entry in self._by_hotel.pop(hotel_id, []):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def upsert_hotel(self, hotel: Hotel) -> None:
+        """Replace the entries of one hotel"""
+        if self._built_at is None:
+            return  # Chưa dựng index, lần truy vấn đầu sẽ dựng từ DB
+        entries = _hotel_entries(hotel)
+        with self._lock:
+            self._remove_locked(hotel.id)
+            for entry in entries:
+                insort(self._entries, entry)
+            self._by_hotel[hotel.id] = entries
+
+    def remove_hotel(self, hotel_id: int) -> None:
+        """Drop the entries of one hotel"""
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove_locked(hotel_id)
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """Return up to ``limit`` suggestions whose words start with ``query``"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (prefix,))
+            matches = []
+            while i < len(entries) and len(matches) < _MAX_SCAN and entries[i][0].startswith(prefix):
+                matches.append(entries[i])
+                i += 1
+
+        seen = set()
+        results = []
+        # Khớp từ đầu chuỗi được ưu tiên hơn khớp giữa chuỗi
+        matches.sort(key=lambda e: (
+            _KIND_PRIORITY[e[1]],
+            not normalize(e[2]).startswith(prefix),
+            len(e[2]),
+            e[2],
+        ))
+        for _, kind, label, subtitle, hotel_id in matches:
+            dedupe_key = (kind, label, hotel_id)
+            if dedupe_key in seen:
+                continue
+            seen.add(dedupe_key)
+            results.append({
+                "type": kind,
+                "label": label,
+                "subtitle": subtitle,
+                "hotel_id": hotel_id,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+suggest_index = SuggestIndex()
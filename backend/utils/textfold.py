@@ -0,0 +1,62 @@
+"""Accent folding for Vietnamese search.
+
+"Đà Nẵng" -> "da nang", "Hà Nội" -> "ha noi". Khách sạn và phòng lưu bản đã gấp
+dấu trong các cột ``*_search`` (ghi lúc tạo/sửa), truy vấn cũng được gấp dấu
+cùng cách nên so khớp dùng thẳng index thay vì gọi hàm trên từng dòng. Lọc theo
+cột dùng tiền tố (``LIKE 'x%'``, xem ``prefix_pattern``) để B-tree index còn dùng được.
+"""
+from __future__ import annotations
+
+import unicodedata
+from typing import Optional
+
+# Cột gốc -> cột đã gấp dấu trên bảng hotels
+HOTEL_SEARCH_COLUMNS = {
+    "name": "name_search",
+    "city": "city_search",
+    "country": "country_search",
+    "address": "address_search",
+    "description": "description_search",
+    "amenities": "amenities_search",
+}
+
+# Cột gốc -> cột đã gấp dấu trên bảng rooms
+ROOM_SEARCH_COLUMNS = {
+    "description": "description_search",
+    "amenities": "amenities_search",
+    "bed_type": "bed_type_search",
+}
+
+# đ/Đ không tách được bằng NFD nên thay trực tiếp
+_TRANSLATE = str.maketrans({"đ": "d", "Đ": "d"})
+
+
+def fold(value: Optional[str]) -> str:
+    """Lowercase, strip Vietnamese diacritics and collapse whitespace"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFD", value.translate(_TRANSLATE))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
+
+
+def prefix_pattern(value: Optional[str]) -> str:
+    """``LIKE`` pattern matching folded values that start with ``value`` (escape ``\\``)"""
+    folded = fold(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return folded + "%"
+
+
+def _fill_search_columns(obj, columns: dict) -> None:
+    for column, search_column in columns.items():
+        value = getattr(obj, column)
+        setattr(obj, search_column, fold(value) if value is not None else None)
+
+
+def fill_hotel_search_columns(hotel) -> None:
+    """Recompute the folded ``*_search`` columns of a hotel from its text fields"""
+    _fill_search_columns(hotel, HOTEL_SEARCH_COLUMNS)
+
+
+def fill_room_search_columns(room) -> None:
+    """Recompute the folded ``*_search`` columns of a room from its text fields"""
+    _fill_search_columns(room, ROOM_SEARCH_COLUMNS)
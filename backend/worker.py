@@ -0,0 +1,57 @@
+"""Background job worker.
+
+Chạy từ thư mục gốc repo:   python -m backend.worker
+hoặc trong backend/:         python worker.py
+
+Có thể chạy nhiều worker song song (job được lấy bằng FOR UPDATE SKIP LOCKED).
+Worker cũng chạy scheduler chuyển trạng thái booking mỗi BOOKING_LIFECYCLE_SECONDS giây.
+"""
+import os
+import signal
+import sys
+import threading
+
+# Các module backend import tuyệt đối (from database import ...) như khi chạy main.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal, engine  # noqa: E402
+from models import Base  # noqa: E402
+from services.job_service import JobWorker  # noqa: E402
+from services.scheduler import BOOKING_LIFECYCLE_SECONDS, LifecycleScheduler  # noqa: E402
+from services.worker_lease_service import WorkerIdLease  # noqa: E402
+from utils.ids import configured_worker_id  # noqa: E402
+import services.job_handlers  # noqa: E402,F401  (đăng ký handler)
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        print("🛑 Đang dừng job worker...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    id_lease = None
+    if configured_worker_id() is None:
+        id_lease = WorkerIdLease(SessionLocal)
+        id_lease.acquire()
+        threading.Thread(target=id_lease.run_forever, args=(stop,), name="id-worker-lease", daemon=True).start()
+
+    if BOOKING_LIFECYCLE_SECONDS > 0:
+        scheduler = LifecycleScheduler(SessionLocal)
+        threading.Thread(target=scheduler.run_forever, args=(stop,), name="booking-lifecycle", daemon=True).start()
+
+    worker = JobWorker(SessionLocal)
+    print(f"👷 Job worker {worker.worker_id} đang chạy")
+    try:
+        worker.run_forever(stop)
+    finally:
+        if id_lease:
+            id_lease.release()
+
+
+if __name__ == "__main__":
+    main()
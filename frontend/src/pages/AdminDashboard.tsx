@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from 'react-query';
 import { useAuth } from '../contexts/AuthContext';
-import { adminAPI, uploadHotelImages, getMediaUrl } from '../services/api';
+import { adminAPI, uploadHotelImages, waitForImageUpload, getMediaUrl } from '../services/api';
 import { User, Hotel, Room, Booking } from '../types';
 import AdminModal from '../components/AdminModals';
 
@@ -160,7 +160,8 @@ const AdminDashboard: React.FC = () => {
     if (selectedFiles.length === 0) return;
     
     try {
-      const imageUrls = await uploadHotelImages(hotelId, selectedFiles);
+      const uploads = await uploadHotelImages(hotelId, selectedFiles);
+      const imageUrls = await Promise.all(uploads.map((upload) => waitForImageUpload(upload)));
       setUploadedImages(prev => [...prev, ...imageUrls]);
       setSelectedFiles([]);
       alert('Upload ảnh thành công!');
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { hotelsAPI, roomsAPI, getMediaUrl } from '../services/api';
+import { hotelsAPI, roomsAPI, searchAPI, getMediaUrl } from '../services/api';
 import { Hotel, Room } from '../types';
 
 const HomePage: React.FC = () => {
@@ -9,6 +9,7 @@ const HomePage: React.FC = () => {
   const [featuredRooms, setFeaturedRooms] = useState<any[]>([]);
   const [loading, setLoading] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
+  const [suggestions, setSuggestions] = useState<any[]>([]);
   const [bookingForm, setBookingForm] = useState({
     destination: '',
     checkIn: '',
@@ -43,6 +44,23 @@ const HomePage: React.FC = () => {
     fetchData();
   }, []);
 
+  // Autocomplete điểm đến (debounce 200ms)
+  useEffect(() => {
+    const q = bookingForm.destination.trim();
+    if (!q) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        setSuggestions(await searchAPI.suggest(q));
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [bookingForm.destination]);
+
   const handleSearch = () => {
     const params = new URLSearchParams();
     if (bookingForm.destination) params.set('destination', bookingForm.destination);
@@ -111,8 +129,16 @@ const HomePage: React.FC = () => {
                     value={bookingForm.destination}
                     onChange={(e) => setBookingForm(prev => ({ ...prev, destination: e.target.value }))}
                     placeholder="Hồ Chí Minh, Hà Nội, Đà Nẵng..."
+                    list="destination-suggestions"
                     className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:ring-2 focus:ring-blue-500 focus:border-transparent transition-all duration-200"
                   />
+                  <datalist id="destination-suggestions">
+                    {suggestions.map((s) => (
+                      <option key={`${s.type}-${s.label}-${s.hotel_id ?? ''}`} value={s.label}>
+                        {s.subtitle || ''}
+                      </option>
+                    ))}
+                  </datalist>
                 </div>
                 
                 <div>
@@ -1,6 +1,6 @@
 import axios from 'axios';
 import { 
-  User, Hotel, Room, Booking, Payment,
+  User, Hotel, Room, Booking, Payment, Job, UploadJob,
   CreateUserData, CreateHotelData, CreateRoomData, CreateBookingData, CreatePaymentData,
   UpdateUserData, UpdateHotelData, UpdateRoomData, UpdateBookingData, UpdatePaymentData
 } from '../types';
@@ -128,6 +128,15 @@ export const hotelsAPI = {
   },
 };
 
+// ========== SEARCH API ==========
+export const searchAPI = {
+  // Gợi ý điểm đến / tên khách sạn khi gõ
+  suggest: async (q: string, limit: number = 8) => {
+    const response = await api.get('/search/suggest', { params: { q, limit } });
+    return response.data.data; // Backend returns {code, message, data}
+  },
+};
+
 // ========== ROOMS API ==========
 export const roomsAPI = {
   // Lấy danh sách phòng
@@ -216,6 +225,12 @@ export const paymentsAPI = {
     const response = await api.get(`/payments/${paymentId}`);
     return response.data;
   },
+
+  // Trạng thái thanh toán của nhiều booking (tối đa 500 id mỗi lần)
+  getStatusBatch: async (bookingIds: number[]) => {
+    const response = await api.post('/payments/status/batch', { booking_ids: bookingIds });
+    return response.data;
+  },
 };
 
 // ========== ADMIN API ==========
@@ -402,7 +417,7 @@ export const utilsAPI = {
 };
 
 // Upload images for hotels
-export const uploadHotelImages = async (hotelId: number, files: File[]): Promise<string[]> => {
+export const uploadHotelImages = async (hotelId: number, files: File[]): Promise<UploadJob[]> => {
   const formData = new FormData();
   files.forEach((file) => {
     formData.append('files', file);
@@ -425,7 +440,7 @@ export const uploadHotelImages = async (hotelId: number, files: File[]): Promise
 };
 
 // Upload images for rooms
-export const uploadRoomImages = async (roomId: number, files: File[]): Promise<string[]> => {
+export const uploadRoomImages = async (roomId: number, files: File[]): Promise<UploadJob[]> => {
   const formData = new FormData();
   files.forEach((file) => {
     formData.append('files', file);
@@ -447,4 +462,21 @@ export const uploadRoomImages = async (roomId: number, files: File[]): Promise<s
   return data.data;
 };
 
+// Wait for an image upload job and return the Drive link of the image
+export const waitForImageUpload = async (upload: UploadJob, timeoutMs = 60000): Promise<string> => {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const response = await api.get(`/jobs/${upload.job_id}`);
+    const job: Job = response.data.data;
+    if (job.status === 'done' && job.result?.link) {
+      return job.result.link;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.last_error || 'Upload failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+  throw new Error('Upload timeout');
+};
+
 export default api; 
\ No newline at end of file
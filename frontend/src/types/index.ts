@@ -215,6 +215,25 @@ export interface PaymentUpdate {
   payment_date?: string;
 }
 
+// Background job types
+export interface UploadJob {
+  job_id: number;
+  filename: string;
+  status_url: string;
+}
+
+export interface Job {
+  id: number;
+  kind: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  attempts: number;
+  max_attempts: number;
+  last_error?: string | null;
+  result?: { link?: string } | null;
+  created_at?: string;
+  finished_at?: string | null;
+}
+
 // API Response types
 export interface ApiResponse<T> {
   data: T;